@@ -0,0 +1,185 @@
+"""
+Throughput of the webhook and signed URL endpoints.
+
+    python benchmarks/bench_endpoints.py [--videos 200] [--batch-size 100] [--storage s3]
+
+Measures, one request at a time:
+- webhook_receiver, with a "processing" and a "completed" event per job;
+- webhook_batch_receiver, with the same events in batches of --batch-size;
+- get_video_signed_url, with a cold and then a warm signed URL cache;
+- get_video_signed_urls, with --batch-size items per request.
+
+Views are called directly with requests built beforehand, so only the server side is timed.
+Results are printed as JSON, see benchmarks/compare.py.
+"""
+import argparse
+import contextlib
+import json
+import os
+import time
+import uuid
+
+import harness
+
+QUALITIES = ["original", "720p", "480p", "360p"]
+
+
+def create_fixtures(video_count):
+    """
+    Creates videos with their renditions and a processing request per rendition, without triggering processing.
+    Returns the processing requests.
+    """
+    from benchapp.models import Video
+
+    from contentor_video_processor.models import get_video_processing_request_model
+
+    request_model = get_video_processing_request_model()
+    Video.objects.bulk_create([
+        Video(
+            title=f"clip {i}",
+            video=f"videos/original/clip-{i}.mp4",
+            **{f"video_{quality}": f"videos/{quality}/clip-{i}.mp4" for quality in QUALITIES[1:]},
+        )
+        for i in range(video_count)
+    ])
+    request_model.objects.bulk_create([
+        request_model(
+            video=video,
+            uuid=uuid.uuid4(),
+            resolution=quality,
+            status="queued",
+            upload_url=f"https://bucket.invalid/videos/{quality}/clip-{video.pk}.mp4",
+        )
+        for video in Video.objects.all()
+        for quality in QUALITIES[1:]
+    ])
+    return list(request_model.objects.all())
+
+
+def build_webhook_payloads(processing_requests, started_at):
+    payloads = []
+    for i, processing_request in enumerate(processing_requests):
+        for offset, status in enumerate(["processing", "completed"]):
+            payload = {"uuid": str(processing_request.uuid), "status": status, "timestamp": started_at + i + offset}
+            if status == "completed":
+                payload.update({"video_duration": 60.0, "output_file_size_mb": 12.5, "metadata": {"height": 720}})
+            payloads.append(payload)
+    return payloads
+
+
+def time_requests(view, requests, expected_status=200):
+    """
+    Calls `view` with each request. Returns the latency summary and the request rate.
+    """
+    samples = []
+    failures = 0
+    start = time.perf_counter()
+    for request, args in requests:
+        request_start = time.perf_counter()
+        response = view(request, *args)
+        samples.append(time.perf_counter() - request_start)
+        failures += response.status_code != expected_status
+    elapsed = time.perf_counter() - start
+    return {"latency": harness.summarize(samples), "requests_per_s": len(samples) / elapsed, "failures": failures}
+
+
+def bench_webhooks(processing_requests, batch_size):
+    from django.test import RequestFactory
+
+    from contentor_video_processor.views import webhook_batch_receiver, webhook_receiver
+    from contentor_video_processor.webhooks import sign_webhook_batch, sign_webhook_payload
+
+    factory = RequestFactory()
+    started_at = int(time.time()) - 10 * len(processing_requests)
+    half = len(processing_requests) // 2
+
+    # Each endpoint gets its own jobs, so every event is applied rather than dropped as a duplicate
+    payloads = build_webhook_payloads(processing_requests[:half], started_at)
+    requests = [
+        (factory.post("/webhook/", sign_webhook_payload(payload), content_type="application/json"), ())
+        for payload in payloads
+    ]
+    single = time_requests(webhook_receiver, requests)
+    single["events_per_s"] = single["requests_per_s"]
+
+    payloads = build_webhook_payloads(processing_requests[half:], started_at)
+    requests = []
+    for index in range(0, len(payloads), batch_size):
+        body, signature = sign_webhook_batch(payloads[index:index + batch_size])
+        request = factory.post(
+            "/webhook/batch/", body, content_type="application/json", HTTP_X_CONTENTOR_SIGNATURE=signature
+        )
+        requests.append((request, ()))
+    batch = time_requests(webhook_batch_receiver, requests)
+    batch["events_per_s"] = len(payloads) / (len(requests) / batch["requests_per_s"])
+    return single, batch
+
+
+def bench_signed_urls(user, batch_size):
+    from django.core.cache import caches
+    from django.test import RequestFactory
+
+    from benchapp.models import Video
+    from contentor_video_processor.views import get_video_signed_url, get_video_signed_urls
+
+    factory = RequestFactory()
+    video_ids = list(Video.objects.values_list("pk", flat=True))
+
+    def single_requests():
+        requests = []
+        for video_id in video_ids:
+            for quality in QUALITIES:
+                request = factory.get(f"/videos/{video_id}/signed-url/{quality}/")
+                request.user = user
+                requests.append((request, (video_id, quality)))
+        return requests
+
+    caches["default"].clear()
+    cold = time_requests(get_video_signed_url, single_requests())
+    warm = time_requests(get_video_signed_url, single_requests())
+
+    items = [{"video_id": video_id, "quality": quality} for video_id in video_ids for quality in QUALITIES]
+    requests = []
+    for index in range(0, len(items), batch_size):
+        body = json.dumps({"items": items[index:index + batch_size]})
+        request = factory.post("/videos/signed-urls/", body, content_type="application/json")
+        request.user = user
+        requests.append((request, ()))
+    caches["default"].clear()
+    batch = time_requests(get_video_signed_urls, requests)
+    batch["urls_per_s"] = len(items) / (len(requests) / batch["requests_per_s"])
+    return cold, warm, batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=100)
+    harness.add_storage_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = harness.setup_django(args.storage, args.s3_endpoint_url, args.workdir)
+    from django.contrib.auth.models import User
+
+    user = User.objects.create_user("bench")
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        processing_requests = create_fixtures(args.videos)
+        webhook, webhook_batch = bench_webhooks(processing_requests, args.batch_size)
+        signed_url_cold, signed_url_warm, signed_urls_batch = bench_signed_urls(user, args.batch_size)
+
+    harness.cleanup(workdir, keep=bool(args.workdir))
+    harness.write_results({
+        "benchmark": "endpoints",
+        "meta": harness.run_metadata(args),
+        "videos": args.videos,
+        "batch_size": args.batch_size,
+        "webhook": webhook,
+        "webhook_batch": webhook_batch,
+        "signed_url_cold_cache": signed_url_cold,
+        "signed_url_warm_cache": signed_url_warm,
+        "signed_urls_batch": signed_urls_batch,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Benchmarks of the resumable upload path.
+
+    python benchmarks/bench_upload.py chunks [--concurrency 1,4,16] [--stored-chunks 0,1000,10000]
+    python benchmarks/bench_upload.py collect [--sizes 16,64,256] [--faststart]
+
+`chunks` measures the latency of UploadView.post per chunk against the number of uploads running
+at the same time and against the number of chunks of other uploads already in chunk storage
+(chunks are looked up by listing the chunk storage). The last chunk of an upload also merges it,
+its latency is reported separately.
+
+`collect` measures ResumableFile.collect() time and peak RSS against the file size (in MB). Each
+size runs in its own process so peak RSS isn't carried over from the previous one. moto keeps
+the objects it stores in memory, so measure RSS on S3 against an external endpoint.
+
+Add `--storage s3` to run against moto's S3 mock (or `--s3-endpoint-url` for MinIO and the like)
+instead of FileSystemStorage. Results are printed as JSON, see benchmarks/compare.py.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import harness
+
+MB = 1024 * 1024
+
+
+def int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, kilobytes elsewhere
+
+
+def get_upload_field():
+    from benchapp.models import Video
+
+    return Video._meta.get_field("video")
+
+
+def upload_params(filename, total_size, chunk_number, chunk_size):
+    from django.contrib.contenttypes.models import ContentType
+    from benchapp.models import Video
+
+    return {
+        "content_type_id": str(ContentType.objects.get_for_model(Video).id),
+        "field_name": "video",
+        "resumableChunkNumber": str(chunk_number),
+        "resumableChunkSize": str(chunk_size),
+        "resumableCurrentChunkSize": str(chunk_size),
+        "resumableTotalSize": str(total_size),
+        "resumableFilename": filename,
+    }
+
+
+def upload_file(path, filename, chunk_size, user, latencies):
+    """
+    Posts the file to UploadView chunk by chunk, appending (is_last_chunk, seconds) to `latencies`.
+    Only the view call is timed, the multipart body is encoded beforehand.
+    """
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import RequestFactory
+
+    from contentor_video_processor.views import contentor_video
+
+    factory = RequestFactory()
+    total_size = os.path.getsize(path)
+    chunk_count = max(1, total_size // chunk_size)
+    with open(path, "rb") as f:
+        for number in range(1, chunk_count + 1):
+            # Like resumable.js, the last chunk takes the remainder
+            data = f.read(chunk_size if number < chunk_count else total_size)
+            params = upload_params(filename, total_size, number, chunk_size)
+            params["resumableCurrentChunkSize"] = str(len(data))
+            request = factory.post("/contentor/upload/", {**params, "file": SimpleUploadedFile("blob", data)})
+            request.user = user
+
+            start = time.perf_counter()
+            response = contentor_video(request)
+            latencies.append((number == chunk_count, time.perf_counter() - start))
+            if response.status_code != 200:
+                raise RuntimeError(f"Chunk {number} of {filename} failed: {response.status_code} {response.content!r}")
+
+
+def fill_chunk_storage(count):
+    """
+    Stores `count` small chunks of other, unfinished uploads. Returns their names.
+    """
+    from django.core.files.base import ContentFile
+
+    from contentor_video_processor.storage import ResumableStorage
+
+    storage = ResumableStorage().get_chunk_storage()
+    names = []
+    for i in range(count):
+        names.append(storage.save(f"4096_stale-{i // 4}.mp4_part_{i % 4 * 1024:012d}", ContentFile(b"\0" * 1024)))
+    return names
+
+
+def clear_chunk_storage(names):
+    from contentor_video_processor.storage import ResumableStorage
+
+    storage = ResumableStorage().get_chunk_storage()
+    for name in names:
+        storage.delete(name)
+
+
+def run_uploads(concurrency, chunks_per_upload, chunk_size, user, workdir, label):
+    """
+    Runs `concurrency` uploads at the same time, each from its own thread.
+    """
+    from django.db import connections
+
+    path = os.path.join(workdir, "source.mp4")
+    if not os.path.exists(path):
+        harness.write_mp4(path, chunks_per_upload * chunk_size)
+
+    latencies = []
+    errors = []
+    barrier = threading.Barrier(concurrency)
+
+    def worker(index):
+        try:
+            barrier.wait()
+            upload_file(path, f"{label}-{index}.mp4", chunk_size, user, latencies)
+        except Exception as e:  # reported in the results
+            errors.append(repr(e))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    uploaded = concurrency * os.path.getsize(path)
+    return {
+        "chunk": harness.summarize([seconds for last, seconds in latencies if not last]),
+        "final_chunk": harness.summarize([seconds for last, seconds in latencies if last]),
+        "elapsed_s": elapsed,
+        "throughput_mb_s": uploaded / MB / elapsed,
+        "errors": errors,
+    }
+
+
+def bench_chunks(args):
+    workdir = harness.setup_django(args.storage, args.s3_endpoint_url, args.workdir)
+    from django.contrib.auth.models import User
+
+    user = User.objects.create_user("bench")
+    chunk_size = args.chunk_size * 1024
+
+    results = {"benchmark": "upload_chunks", "meta": harness.run_metadata(args), "chunk_size": chunk_size,
+               "chunks_per_upload": args.chunks_per_upload, "by_concurrency": [], "by_stored_chunks": []}
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for concurrency in args.concurrency:
+            result = run_uploads(concurrency, args.chunks_per_upload, chunk_size, user, workdir, f"c{concurrency}")
+            results["by_concurrency"].append({"concurrency": concurrency, **result})
+
+        for stored in args.stored_chunks:
+            names = fill_chunk_storage(stored)
+            try:
+                result = run_uploads(1, args.chunks_per_upload, chunk_size, user, workdir, f"s{stored}")
+            finally:
+                clear_chunk_storage(names)
+            results["by_stored_chunks"].append({"stored_chunks": stored, **result})
+
+    harness.cleanup(workdir, keep=bool(args.workdir))
+    harness.write_results(results, args.output)
+
+
+def collect_once(args):
+    """
+    Child process of `collect`: stores the chunks of a file of `--size` MB, then times collect().
+    """
+    overrides = {"CONTENTOR_FASTSTART_ON_UPLOAD": args.faststart}
+    workdir = harness.setup_django(args.storage, args.s3_endpoint_url, args.workdir, **overrides)
+    from django.core.files.base import ContentFile
+
+    from contentor_video_processor.files import ResumableFile
+
+    path = os.path.join(workdir, "source.mp4")
+    total_size = harness.write_mp4(path, args.size * MB, faststart=False)
+    chunk_size = args.chunk_size * 1024
+    chunk_count = max(1, total_size // chunk_size)
+
+    resumable = ResumableFile(get_upload_field(), None, upload_params("source.mp4", total_size, 1, chunk_size))
+    with open(path, "rb") as f:
+        for number in range(1, chunk_count + 1):
+            offset = f.tell()
+            data = f.read(chunk_size if number < chunk_count else total_size)
+            resumable.chunk_storage.save(resumable.get_chunk_name(offset), ContentFile(data))
+
+    rss_before = peak_rss_kb()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        start = time.perf_counter()
+        name = resumable.collect()
+        elapsed = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+
+    stored_size = resumable.persistent_storage.size(name)
+    harness.cleanup(workdir, keep=bool(args.workdir))
+    sys.__stdout__.write(json.dumps({
+        "size_bytes": total_size,
+        "chunks": chunk_count,
+        "collect_s": elapsed,
+        "throughput_mb_s": total_size / MB / elapsed,
+        "peak_rss_kb_before": rss_before,
+        "peak_rss_kb": rss_after,
+        "peak_rss_growth_kb": rss_after - rss_before,
+        "stored_size_bytes": stored_size,
+    }) + "\n")
+
+
+def bench_collect(args):
+    results = {"benchmark": "upload_collect", "meta": None, "faststart": args.faststart,
+               "chunk_size": args.chunk_size * 1024, "by_size": []}
+    for size in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), "collect-once", "--size", str(size),
+                   "--chunk-size", str(args.chunk_size), "--storage", args.storage]
+        if args.s3_endpoint_url:
+            command += ["--s3-endpoint-url", args.s3_endpoint_url]
+        if args.faststart:
+            command.append("--faststart")
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode:
+            sys.exit(f"collect of {size} MB failed:\n{process.stderr}")
+        output = process.stdout
+        results["by_size"].append({"size_mb": size, **json.loads(output.strip().splitlines()[-1])})
+
+    results["meta"] = harness.run_metadata(args)
+    harness.write_results(results, args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    chunks = subparsers.add_parser("chunks")
+    chunks.add_argument("--concurrency", type=int_list, default=[1, 4, 16])
+    chunks.add_argument("--stored-chunks", type=int_list, default=[0, 1000, 10000])
+    chunks.add_argument("--chunks-per-upload", type=int, default=8)
+    chunks.add_argument("--chunk-size", type=int, default=1024, help="KB")
+    chunks.set_defaults(func=bench_chunks)
+
+    collect = subparsers.add_parser("collect")
+    collect.add_argument("--sizes", type=int_list, default=[16, 64, 256], help="MB")
+    collect.add_argument("--chunk-size", type=int, default=1024, help="KB")
+    collect.add_argument("--faststart", action="store_true", help="Enable CONTENTOR_FASTSTART_ON_UPLOAD")
+    collect.set_defaults(func=bench_collect)
+
+    collect_child = subparsers.add_parser("collect-once")
+    collect_child.add_argument("--size", type=int, required=True, help="MB")
+    collect_child.add_argument("--chunk-size", type=int, default=1024, help="KB")
+    collect_child.add_argument("--faststart", action="store_true")
+    collect_child.set_defaults(func=collect_once)
+
+    for subparser in (chunks, collect, collect_child):
+        harness.add_storage_arguments(subparser)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark of presigned rendition URLs: boto3 (through django-storages) vs S3UrlSigner.
+
+    python benchmarks/bench_url_signer.py [--iterations 20000]
+
+Requires boto3 and django-storages. No network access is needed, signing is local.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+
+settings.configure()
+django.setup()
+
+from storages.backends.s3 import S3Storage  # noqa: E402
+
+from contentor_video_processor.signers import S3UrlSigner  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    storage = S3Storage(
+        access_key="AKIAEXAMPLE",
+        secret_key="secret",
+        bucket_name="bucket",
+        endpoint_url="https://s3.example.com",
+        region_name="eu-central-1",
+        signature_version="s3v4",
+        location="customers/org/media",
+    )
+    signer = S3UrlSigner()
+    name = "videos/720p/clip.mp4"
+
+    # Both embed the current second, retry in case the clock ticks between the two calls
+    assert any(
+        signer.url(storage, name, 3600) == storage.url(name) for _ in range(3)
+    ), "signer output differs from boto3"
+
+    boto3_seconds = timeit.timeit(lambda: storage.url(name), number=args.iterations)
+    signer_seconds = timeit.timeit(lambda: signer.url(storage, name, 3600), number=args.iterations)
+
+    result = {
+        "benchmark": "url_signer",
+        "iterations": args.iterations,
+        "boto3_us_per_url": boto3_seconds / args.iterations * 1e6,
+        "signer_us_per_url": signer_seconds / args.iterations * 1e6,
+        "speedup": boto3_seconds / signer_seconds,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+from django.db import models
+
+from contentor_video_processor.models import ContentorVideoField, ContentorVideoModel
+
+
+class Video(ContentorVideoModel):
+    title = models.CharField(max_length=100, blank=True)
+    video = ContentorVideoField(null=True, blank=True, upload_to="videos/original/")
@@ -0,0 +1,5 @@
+from django.urls import include, path
+
+urlpatterns = [
+    path("contentor/", include("contentor_video_processor.urls")),
+]
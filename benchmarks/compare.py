@@ -0,0 +1,71 @@
+"""
+Compares two benchmark results written by the bench_*.py scripts.
+
+    python benchmarks/compare.py baseline.json current.json [--threshold 10] [--fail-on-regression]
+
+Prints the relative change of every timing, rate and memory figure. Rates (`*_per_s`,
+`throughput_*`) are better when higher, the others when lower. Changes worse than --threshold
+percent are marked as regressions.
+"""
+import argparse
+import json
+import sys
+
+# Keys identifying the entries of a list of runs, e.g. {"concurrency": 4, ...}
+ENTRY_KEYS = ("concurrency", "stored_chunks", "size_mb")
+# Parameters of the run rather than measurements
+SKIPPED_KEYS = {"meta", "count", "size_bytes", "stored_size_bytes", "chunks", "chunk_size", "chunks_per_upload",
+                "videos", "batch_size", "iterations", "failures", "peak_rss_kb_before", *ENTRY_KEYS}
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in SKIPPED_KEYS:
+                yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            label = next((f"{key}={item[key]}" for key in ENTRY_KEYS if isinstance(item, dict) and key in item), index)
+            yield from flatten(item, f"{prefix}[{label}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def higher_is_better(path):
+    name = path.rsplit(".", 1)[-1]
+    return name.endswith("_per_s") or name.startswith("throughput") or name.endswith("speedup")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = dict(flatten(json.load(f)))
+    with open(args.current) as f:
+        current = dict(flatten(json.load(f)))
+
+    regressions = 0
+    width = max((len(path) for path in current), default=0)
+    for path, value in current.items():
+        if path not in baseline:
+            continue
+        before = baseline[path]
+        if not before:
+            continue
+        change = (value - before) / before * 100
+        worse = -change if higher_is_better(path) else change
+        marker = "REGRESSION" if worse > args.threshold else ""
+        regressions += bool(marker)
+        print(f"{path:<{width}}  {before:>14.3f}  {value:>14.3f}  {change:>+8.1f}%  {marker}")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(f"{regressions} figure(s) regressed by more than {args.threshold}%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Shared setup of the benchmarks: a throwaway Django project (benchapp) on FileSystemStorage or on
+a local S3 stand-in, a synthetic MP4 writer and the JSON result format.
+
+The S3 stand-in is moto's in-process mock when moto is installed (`--storage s3`), or any
+S3-compatible server such as MinIO or `moto_server` (`--storage s3 --s3-endpoint-url http://...`).
+"""
+import json
+import os
+import platform
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+BUCKET_NAME = "contentor-bench"
+ACCESS_TOKEN = "bench-token"
+
+_s3_mock = None
+
+
+def add_storage_arguments(parser):
+    parser.add_argument("--storage", choices=["fs", "s3"], default="fs")
+    parser.add_argument(
+        "--s3-endpoint-url",
+        default=os.environ.get("CONTENTOR_BENCH_S3_ENDPOINT_URL"),
+        help="S3-compatible server to use instead of moto's in-process mock",
+    )
+    parser.add_argument("--workdir", help="Directory for the database and stored files (default: a temp dir)")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+
+
+def setup_django(storage="fs", s3_endpoint_url=None, workdir=None, **settings_overrides):
+    """
+    Configures and sets up the benchmark project, creating its tables.
+    Returns the working directory holding the database and the stored files.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="contentor-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    storage_settings = {}
+    if storage == "s3":
+        start_s3(s3_endpoint_url)
+        storage_settings = {
+            "ADMIN_RESUMABLE_STORAGE": "storages.backends.s3.S3Storage",
+            "ADMIN_RESUMABLE_CHUNK_STORAGE": "storages.backends.s3.S3Storage",
+            "DEFAULT_FILE_STORAGE": "storages.backends.s3.S3Storage",
+            "AWS_S3_ENDPOINT_URL": s3_endpoint_url,
+            "AWS_S3_REGION_NAME": "us-east-1",
+            "AWS_QUERYSTRING_AUTH": True,
+        }
+
+    import django
+    from django.conf import settings
+
+    settings.configure(**{
+        "DEBUG": False,
+        "SECRET_KEY": "contentor-bench",
+        "ALLOWED_HOSTS": ["*"],
+        "INSTALLED_APPS": [
+            "django.contrib.admin",
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "benchapp",
+            "contentor_video_processor",
+        ],
+        "DATABASES": {
+            "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(workdir, "bench.sqlite3")}
+        },
+        "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        "ROOT_URLCONF": "benchapp.urls",
+        "MEDIA_ROOT": os.path.join(workdir, "media"),
+        "MEDIA_URL": "/media/",
+        "USE_TZ": True,
+        "DEFAULT_AUTO_FIELD": "django.db.models.AutoField",
+        "BASE_URL": "http://bench.invalid",
+        "AWS_ACCESS_KEY_ID": "AKIABENCHMARK",
+        "AWS_SECRET_ACCESS_KEY": "bench-secret",
+        "AWS_STORAGE_BUCKET_NAME": BUCKET_NAME,
+        "CONTENTOR_VIDEO_MODEL": "benchapp.Video",
+        "CONTENTOR_VIDEO_PROCESSING_REQUESTS_APP": "benchapp",
+        "CONTENTOR_VIDEO_PROCESSING_ACCESS_KEY": "bench-key",
+        "CONTENTOR_VIDEO_PROCESSING_ACCESS_TOKEN": ACCESS_TOKEN,
+        "CONTENTOR_VIDEO_PROCESSING_CONFIG": {
+            # Nothing listens there, jobs are never submitted during a benchmark
+            "api_url": "http://127.0.0.1:9/",
+            "resolutions": ["original", "720p", "480p", "360p"],
+        },
+        **storage_settings,
+        **settings_overrides,
+    })
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", run_syncdb=True, skip_checks=True, verbosity=0)
+    return workdir
+
+
+def start_s3(endpoint_url=None):
+    """
+    Starts moto's S3 mock unless an endpoint is given, and creates the benchmark bucket.
+    """
+    global _s3_mock
+    import boto3
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIABENCHMARK")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench-secret")
+    if endpoint_url is None:
+        try:
+            from moto import mock_aws
+        except ImportError:
+            sys.exit("--storage s3 needs moto installed, or --s3-endpoint-url pointing to an S3-compatible server.")
+        _s3_mock = mock_aws()
+        _s3_mock.start()
+
+    client = boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name="us-east-1",
+        aws_access_key_id="AKIABENCHMARK",
+        aws_secret_access_key="bench-secret",
+    )
+    try:
+        client.create_bucket(Bucket=BUCKET_NAME)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+
+def cleanup(workdir, keep=False):
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _full_box(box_type, payload):
+    return _box(box_type, b"\0\0\0\0" + payload)
+
+
+def write_mp4(path, size, width=1920, height=1080, duration=60.0, faststart=False, block_size=1024 * 1024):
+    """
+    Writes a synthetic MP4 of about `size` bytes: a single video track whose media data is filler,
+    with its moov atom after the media data unless `faststart`. The media data is written in
+    blocks, so large files don't need to fit in memory.
+    """
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2avc1mp41")
+
+    def moov(mdat_payload_offset):
+        offsets = [mdat_payload_offset + i * 4096 for i in range(16)]
+        timescale = 1000
+        mvhd = _full_box(b"mvhd", struct.pack(">IIII", 0, 0, timescale, int(duration * timescale)) + b"\0" * 80)
+        matrix = struct.pack(">9i", 65536, 0, 0, 0, 65536, 0, 0, 0, 1 << 30)
+        tkhd = _full_box(
+            b"tkhd",
+            struct.pack(">IIIII", 0, 0, 1, 0, int(duration * timescale)) + b"\0" * 16 + matrix
+            + struct.pack(">II", width << 16, height << 16),
+        )
+        mdhd = _full_box(b"mdhd", struct.pack(">IIII", 0, 0, timescale, int(duration * timescale)) + b"\0" * 4)
+        hdlr = _full_box(b"hdlr", b"\0" * 4 + b"vide" + b"\0" * 12 + b"bench\0")
+        avc1 = _box(b"avc1", b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 16 + struct.pack(">HH", width, height) + b"\0" * 50)
+        stsd = _full_box(b"stsd", struct.pack(">I", 1) + avc1)
+        stco = _full_box(b"stco", struct.pack(">I", len(offsets)) + b"".join(struct.pack(">I", o) for o in offsets))
+        stbl = _box(b"stbl", stsd + stco)
+        trak = _box(b"trak", tkhd + _box(b"mdia", mdhd + hdlr + _box(b"minf", stbl)))
+        return _box(b"moov", mvhd + trak)
+
+    moov_size = len(moov(0))
+    mdat_payload_size = max(size - len(ftyp) - moov_size - 8, 64 * 1024)
+    mdat_header = struct.pack(">I4s", 8 + mdat_payload_size, b"mdat")
+    block = bytes((i * 7) % 251 for i in range(block_size))
+
+    with open(path, "wb") as f:
+        f.write(ftyp)
+        if faststart:
+            f.write(moov(len(ftyp) + moov_size + len(mdat_header)))
+        f.write(mdat_header)
+        remaining = mdat_payload_size
+        while remaining:
+            f.write(block[:min(remaining, block_size)])
+            remaining -= min(remaining, block_size)
+        if not faststart:
+            f.write(moov(len(ftyp) + len(mdat_header)))
+    return os.path.getsize(path)
+
+
+def summarize(samples):
+    """
+    Latency summary in milliseconds of a list of durations in seconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_metadata(args):
+    import django
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "platform": platform.platform(),
+        "storage": args.storage,
+        "s3_endpoint_url": getattr(args, "s3_endpoint_url", None),
+    }
+
+
+def write_results(results, output=None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.__stdout__.write(text + "\n")
@@ -0,0 +1,168 @@
+import datetime
+import math
+
+from django.db import connections
+from django.db.models import Aggregate, Avg, Count, DurationField, F, Max, Min, OuterRef, Subquery
+from django.utils import timezone
+
+from contentor_video_processor.models import get_video_processing_event_model, get_video_processing_request_model
+
+PERCENTILES = (50, 95, 99)
+# Windows offered by the admin latency view, in days
+LATENCY_WINDOWS = (1, 7, 30, 90)
+# Latency of each pipeline stage: name -> (label, start field, end field) of the processing requests
+STAGES = {
+    "queue": ("Submit → processing", "submitted_at", "processing_at"),
+    "processing": ("Processing → completed", "processing_at", "completed_at"),
+    "end_to_end": ("Created → completed", "created_at", "completed_at"),
+}
+
+
+class PercentileCont(Aggregate):
+    """
+    Continuous percentile of an expression, PostgreSQL only.
+    """
+
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), output_field=DurationField(), **extra)
+
+
+def supports_percentile_cont(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def duration_percentiles(queryset, percentiles=PERCENTILES):
+    """
+    Count, mean, max and percentiles of the `duration` annotation of a queryset, as timedeltas.
+
+    Computed by the database: with PERCENTILE_CONT on PostgreSQL, elsewhere by counting the rows
+    and fetching the nearest-rank row of each percentile with an ordered query.
+    """
+    if supports_percentile_cont(queryset):
+        stats = queryset.aggregate(
+            count=Count("duration"),
+            mean=Avg("duration"),
+            max=Max("duration"),
+            **{f"p{p}": PercentileCont("duration", p / 100) for p in percentiles},
+        )
+        return stats if stats["count"] else {"count": 0}
+
+    stats = queryset.aggregate(count=Count("duration"), mean=Avg("duration"), max=Max("duration"))
+    if not stats["count"]:
+        return {"count": 0}
+    ordered = queryset.order_by("duration").values_list("duration", flat=True)
+    for p in percentiles:
+        stats[f"p{p}"] = ordered[max(math.ceil(p / 100 * stats["count"]) - 1, 0)]
+    return stats
+
+
+def get_window(days=None, start=None, end=None):
+    """
+    Returns the (start, end) of a time window: the last `days` days, or the given bounds.
+    """
+    end = end or timezone.now()
+    if start is None and days:
+        start = end - datetime.timedelta(days=days)
+    return start, end
+
+
+def get_stage_latencies(stage, start=None, end=None, resolution=None):
+    """
+    Latency percentiles of a pipeline stage (see STAGES) per resolution, for the jobs created in
+    the window. Returns a list of dicts with the resolution and its stats, see `duration_percentiles`.
+    """
+    _, start_field, end_field = STAGES[stage]
+    queryset = get_video_processing_request_model().objects.filter(
+        **{f"{start_field}__isnull": False, f"{end_field}__isnull": False}
+    )
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lt=end)
+    if resolution:
+        queryset = queryset.filter(resolution=resolution)
+
+    resolutions = queryset.order_by("resolution").values_list("resolution", flat=True).distinct()
+    queryset = queryset.annotate(duration=F(end_field) - F(start_field))
+    return [
+        dict(duration_percentiles(queryset.filter(resolution=value)), resolution=value)
+        for value in resolutions
+    ]
+
+
+def get_playable_latencies(start=None, end=None):
+    """
+    Upload -> playable latency percentiles: from the creation of a video's first processing
+    request, right after its upload is saved, to the completion of its first rendition.
+    Counts the videos uploaded in the window.
+    """
+    queryset = (
+        get_video_processing_request_model().objects
+        .order_by()
+        .values("video")
+        .annotate(uploaded_at=Min("created_at"), playable_at=Min("completed_at"))
+        .filter(playable_at__isnull=False)
+    )
+    if start:
+        queryset = queryset.filter(uploaded_at__gte=start)
+    if end:
+        queryset = queryset.filter(uploaded_at__lt=end)
+    return duration_percentiles(queryset.annotate(duration=F("playable_at") - F("uploaded_at")))
+
+
+def get_latency_report(days=None, start=None, end=None):
+    """
+    Latencies of every stage per resolution, and upload -> playable, for the jobs created in the window.
+    """
+    start, end = get_window(days, start, end)
+    return {
+        "start": start,
+        "end": end,
+        "stages": {
+            stage: {"label": label, "resolutions": get_stage_latencies(stage, start, end)}
+            for stage, (label, _, _) in STAGES.items()
+        },
+        "playable": get_playable_latencies(start, end),
+    }
+
+
+def backfill_transition_timestamps():
+    """
+    Fills the transition timestamps of the jobs processed before they were recorded, from their
+    processing events, with one UPDATE per field. The submission time of those jobs isn't known,
+    their creation time is used instead. Returns the number of rows updated per field.
+    """
+    request_model = get_video_processing_request_model()
+    event_model = get_video_processing_event_model()
+    updated = {}
+    for status, field in request_model.TRANSITION_FIELDS.items():
+        events = event_model.objects.filter(status=status, occurred_at__isnull=False)
+        first_event = events.filter(request=OuterRef("pk")).order_by("occurred_at").values("occurred_at")[:1]
+        updated[field] = (
+            request_model.objects
+            .filter(**{f"{field}__isnull": True}, pk__in=events.values("request"))
+            .update(**{field: Subquery(first_event)})
+        )
+    updated["submitted_at"] = (
+        request_model.objects.filter(submitted_at__isnull=True, uuid__isnull=False).update(submitted_at=F("created_at"))
+    )
+    return updated
+
+
+def format_duration(value):
+    """
+    Short human readable form of a timedelta, e.g. "850ms", "42.1s", "12.5m", "3.2h".
+    """
+    if value is None:
+        return "-"
+    seconds = value.total_seconds()
+    if abs(seconds) < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if abs(seconds) < 120:
+        return f"{seconds:.1f}s"
+    if abs(seconds) < 7200:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
@@ -1,5 +1,9 @@
+import logging
+
 from django.apps import AppConfig
-from django.conf import settings
+from django.core.signals import setting_changed
+
+logger = logging.getLogger(__name__)
 
 
 class ContentorVideoProcessorConfig(AppConfig):
@@ -9,15 +13,87 @@ class ContentorVideoProcessorConfig(AppConfig):
         from django.contrib import admin
         from django.apps import apps
 
+        from contentor_video_processor.conf import get_config, reset_config
+
+        # Validate the settings at startup and rebuild the configuration when tests override them
+        config = get_config()
+        setting_changed.connect(reset_config, dispatch_uid="contentor_video_processor_reset_config")
+
         try:
-            app_label = settings.CONTENTOR_VIDEO_PROCESSING_REQUESTS_APP
+            app_label = config.requests_app
             model = apps.get_model(app_label, "VideoProcessingRequest")
+            event_model = apps.get_model(app_label, "VideoProcessingEvent")
+
+            class VideoProcessingEventInline(admin.TabularInline):
+                model = event_model
+                fields = ("status", "timestamp", "occurred_at", "created_at")
+                readonly_fields = fields
+                ordering = ("occurred_at", "id")
+                extra = 0
+                can_delete = False
+
+                def has_add_permission(self, request, obj=None):
+                    return False
 
             class DynamicVideoProcessingRequestAdmin(admin.ModelAdmin):
-                list_display = ("video", "resolution", "status", "upload_provider", "download_provider")
-                list_filter = ("status", "resolution")
+                list_display = ("video", "resolution", "status", "priority", "upload_provider", "download_provider")
+                list_filter = ("status", "resolution", "priority")
+                readonly_fields = ("legacy_history",)
+                inlines = [VideoProcessingEventInline]
+                change_list_template = "contentor_video_processor/admin/request_change_list.html"
+
+                def get_urls(self):
+                    from django.urls import path
+
+                    opts = self.model._meta
+                    return [
+                        path(
+                            "latency/",
+                            self.admin_site.admin_view(self.latency_view),
+                            name=f"{opts.app_label}_{opts.model_name}_latency",
+                        ),
+                    ] + super().get_urls()
+
+                def latency_view(self, request):
+                    from django.core.exceptions import PermissionDenied
+                    from django.template.response import TemplateResponse
+
+                    from contentor_video_processor.analytics import LATENCY_WINDOWS, get_latency_report
+
+                    if not self.has_view_permission(request):
+                        raise PermissionDenied
+                    try:
+                        days = int(request.GET.get("days", 7))
+                    except ValueError:
+                        days = 7
+                    if days not in LATENCY_WINDOWS:
+                        days = 7
+                    context = {
+                        **self.admin_site.each_context(request),
+                        "opts": self.model._meta,
+                        "title": "Processing latency",
+                        "days": days,
+                        "windows": LATENCY_WINDOWS,
+                        "report": get_latency_report(days=days),
+                    }
+                    return TemplateResponse(request, "contentor_video_processor/admin/latency.html", context)
 
             admin.site.register(model, DynamicVideoProcessingRequestAdmin)
+
+            class ReprocessingCampaignAdmin(admin.ModelAdmin):
+                list_display = ("name", "status", "videos_done", "jobs_submitted", "jobs_skipped", "created_at")
+                list_filter = ("status",)
+                readonly_fields = ("cursor", "videos_done", "jobs_submitted", "jobs_skipped", "completed_at")
+                actions = ["pause_campaigns", "resume_campaigns"]
+
+                @admin.action(description="Pause selected campaigns")
+                def pause_campaigns(self, request, queryset):
+                    queryset.filter(status="active").update(status="paused")
+
+                @admin.action(description="Resume selected campaigns")
+                def resume_campaigns(self, request, queryset):
+                    queryset.filter(status="paused").update(status="active")
+
+            admin.site.register(apps.get_model(app_label, "ReprocessingCampaign"), ReprocessingCampaignAdmin)
         except Exception as e:
-            # You might want to log this
-            print(f"Admin registration failed: {e}")
+            logger.warning("Admin registration failed: %s", e)
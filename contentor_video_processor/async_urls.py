@@ -0,0 +1,20 @@
+from django.urls import path, re_path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# The async views under the URLs and names of their sync versions, the other views stay sync
+async_urlpatterns = [
+    re_path(r"^upload/$", async_views.contentor_video, name="contentor_video_processor"),
+    re_path(r"^file-exists/$", async_views.contentor_file_exists, name="contentor_file_exists"),
+    path(
+        "videos/<int:video_id>/signed-url/<str:quality>/",
+        async_views.get_video_signed_url,
+        name="video_signed_url",
+    ),
+    path("video-processing/webhook/", async_views.webhook_receiver, name="webhook_receiver"),
+]
+
+urlpatterns = async_urlpatterns + [
+    pattern for pattern in sync_urlpatterns if pattern.name not in {p.name for p in async_urlpatterns}
+]
@@ -0,0 +1,263 @@
+"""
+Async variants of the upload, file-exists, signed URL and webhook views, for projects served by ASGI.
+
+They hold no thread while a request waits: queries go through the async ORM, caches through their
+async methods, and the blocking storage and S3 calls of a request are run in the thread pool, where
+uploads are stored in parallel. Include `contentor_video_processor.async_urls` instead of
+`contentor_video_processor.urls` to serve them under the same URLs and names.
+"""
+import functools
+import json
+import logging
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import resolve_url
+
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.files import ResumableFile
+from contentor_video_processor.models import get_video_model
+from contentor_video_processor.profiling import profiled
+from contentor_video_processor.renditions import aget_rendition_state, get_video_quality_file, pick_quality
+from contentor_video_processor.signed_urls import aget_signed_url
+from contentor_video_processor.uploads import aget_active_chunks, atrack_chunk_request
+from contentor_video_processor.views import (
+    FileExistsView,
+    UploadView,
+    read_webhook_payload,
+    reject_upload,
+    signed_url_response,
+    store_chunk,
+    webhook_response,
+    with_upload_concurrency,
+)
+from contentor_video_processor.webhooks import (
+    apply_pending_webhook_events,
+    apply_webhook_events,
+    arecord_webhook_event,
+    is_webhook_processing_queued,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Runs blocking storage, S3 or file work in the thread pool, so the event loop keeps serving
+    other requests meanwhile. Each call may run in another thread: group the calls using one
+    storage instance, whose S3 connection belongs to the thread that opened it.
+    """
+    return await sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+def async_login_required(view):
+    """
+    `login_required` for async views: the user is loaded from the session in the request's
+    sync thread, then the request is redirected to LOGIN_URL unless it's authenticated.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await sync_to_async(lambda: request.user.is_authenticated)():
+            return await view(request, *args, **kwargs)
+        path = request.build_absolute_uri()
+        login_url = resolve_url(settings.LOGIN_URL)
+        login_scheme, login_netloc = urlparse(login_url)[:2]
+        current_scheme, current_netloc = urlparse(path)[:2]
+        if (not login_scheme or login_scheme == current_scheme) and (
+            not login_netloc or login_netloc == current_netloc
+        ):
+            path = request.get_full_path()
+        return redirect_to_login(path, login_url, REDIRECT_FIELD_NAME)
+
+    return wrapper
+
+
+def async_csrf_exempt(view):
+    """
+    `csrf_exempt` for async views, whose wrapper must stay a coroutine function.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        return await view(*args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def aget_upload_field(request_data):
+    """
+    The model field an upload is stored in, from the content type and field name sent by the widget.
+    """
+    content_type = await sync_to_async(ContentType.objects.get_for_id)(request_data["content_type_id"])
+    return content_type.model_class()._meta.get_field(request_data["field_name"])
+
+
+async def awith_upload_concurrency(response):
+    return with_upload_concurrency(response, await aget_active_chunks())
+
+
+class AsyncFileExistsView(FileExistsView):
+    """
+    Async version of FileExistsView, with the S3 HEAD request run in the thread pool.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        r = ResumableFile(await aget_upload_field(request.GET), user=request.user, params=request.GET)
+
+        try:
+            r.validate_upload()
+        except ValidationError as e:
+            return reject_upload(e)
+
+        if await run_blocking(r.file_already_exists):
+            logger.info("File already exists with same size, skipping upload: %s", r.filename)
+            return HttpResponse(r.storage_filename)
+
+        return JsonResponse({"exists": False, "message": "File not found"})
+
+
+contentor_file_exists = profiled(async_login_required(async_csrf_exempt(AsyncFileExistsView.as_view())))
+
+
+def check_chunk(r):
+    """
+    Returns (chunk_exists, name of the merged file or None) for a resumable.js test request.
+    """
+    if not r.chunk_exists:
+        return False, None
+    if r.is_complete:
+        return True, r.collect()
+    return True, None
+
+
+class AsyncUploadView(UploadView):
+    """
+    Async version of UploadView. The multipart body is parsed, and the chunk stored and merged,
+    in the thread pool, while the upload load is counted through the cache's async methods.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        files = await run_blocking(getattr, request, "FILES")
+        chunk = files.get("file")
+        if chunk is None:
+            return HttpResponse("Missing chunk", status=400)
+
+        r = ResumableFile(await aget_upload_field(request.POST), user=request.user, params=request.POST)
+
+        try:
+            r.validate_chunk(chunk.size)
+            # The first chunk is sniffed, reading the uploaded file
+            await run_blocking(r.validate_upload, chunk if r.chunk_offset == 0 else None)
+        except ValidationError as e:
+            if e.code == "content_type":
+                await run_blocking(r.delete_chunks)  # not a video, drop the chunks uploaded alongside the first one
+            return reject_upload(e)
+
+        async with atrack_chunk_request():
+            response = HttpResponse(await run_blocking(store_chunk, r, chunk))
+        return await awith_upload_concurrency(response)
+
+    async def get(self, request, *args, **kwargs):
+        r = ResumableFile(await aget_upload_field(request.GET), user=request.user, params=request.GET)
+
+        try:
+            r.validate_upload()
+        except ValidationError as e:
+            return reject_upload(e)
+
+        exists, filename = await run_blocking(check_chunk, r)
+        if not exists:
+            return await awith_upload_concurrency(HttpResponse("chunk not found", status=404))
+        if filename is not None:
+            return HttpResponse(filename)
+        return await awith_upload_concurrency(HttpResponse("chunk exists"))
+
+
+contentor_video = profiled(async_login_required(async_csrf_exempt(AsyncUploadView.as_view())))
+
+
+@profiled
+@async_login_required
+async def get_video_signed_url(request, video_id, quality):
+    """
+    Async version of `views.get_video_signed_url`.
+    """
+    if request.method != "GET":
+        return JsonResponse(
+            {"success": False, "message": "Method not allowed"}, status=405
+        )
+
+    VideoModel = get_video_model()
+    try:
+        video = await VideoModel.objects.aget(id=video_id)
+    except VideoModel.DoesNotExist:
+        raise Http404(f"No {VideoModel._meta.object_name} matches the given query.")
+
+    state = await aget_rendition_state(video)
+    served_quality = quality
+    if quality in get_config().qualities and request.GET.get("fallback") != "0":
+        served_quality = pick_quality(state, quality)
+    video_field = get_video_quality_file(video, served_quality) if served_quality else None
+
+    if not video_field:
+        return JsonResponse(
+            {
+                "success": False,
+                "message": f"Video quality {quality} not available for this video",
+                "pending": state["pending"],
+            },
+            status=404,
+        )
+
+    try:
+        url, expires_at = await aget_signed_url(video_field, served_quality)
+    except Exception as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+    return signed_url_response(request, url, expires_at, served_quality, state)
+
+
+@profiled
+@async_csrf_exempt
+@instrumentation.timed("webhook_seconds", endpoint="single")
+async def webhook_receiver(request):
+    """
+    Async version of `views.webhook_receiver`. The event is recorded with the async ORM; applying it
+    takes a transaction, so it runs in the request's sync thread.
+    """
+    try:
+        payload = read_webhook_payload(request.body)
+        if isinstance(payload, HttpResponse):
+            return payload
+
+        event, created = await arecord_webhook_event(payload)
+        if event is None:
+            return JsonResponse(
+                {"status": "error", "message": "Missing uuid or status"}, status=400
+            )
+
+        if not created:
+            instrumentation.increment("webhook_events", outcome="duplicate")
+            if not is_webhook_processing_queued():
+                await sync_to_async(apply_pending_webhook_events)(uuids={event.uuid}, include_orphaned=True)
+        elif not is_webhook_processing_queued():
+            await sync_to_async(apply_webhook_events)([event])
+
+        return webhook_response(event, created, payload)
+
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+    except Exception as e:
+        logger.exception("Error handling a webhook")
+        return JsonResponse(
+            {"status": "error", "message": f"Unexpected error: {str(e)}"}, status=500
+        )
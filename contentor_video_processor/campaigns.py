@@ -0,0 +1,203 @@
+import logging
+import posixpath
+import re
+from urllib.parse import urlparse, urlunparse
+
+from django.utils import timezone
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.functions import get_encoding_params, get_webhook_url, replace_file_format
+from contentor_video_processor.models import (
+    get_reprocessing_campaign_model,
+    get_video_model,
+    get_video_processing_request_model,
+)
+from contentor_video_processor.reconcile import ACTIVE_STATUSES
+from contentor_video_processor.renditions import sort_qualities
+
+logger = logging.getLogger(__name__)
+
+# Directory a campaign writes its renditions to, next to the ones they replace
+CAMPAIGN_DIR = "campaign-{pk}"
+CAMPAIGN_DIR_RE = re.compile(r"^campaign-\d+$")
+
+
+def get_campaign_url(url, campaign):
+    """
+    Moves a rendition URL to the campaign's directory, e.g. .../720p/clip.mp4 -> .../720p/campaign-3/clip.mp4,
+    replacing the directory of an earlier campaign.
+    """
+    parsed = urlparse(url)
+    directory, name = posixpath.split(parsed.path)
+    if CAMPAIGN_DIR_RE.match(posixpath.basename(directory)):
+        directory = posixpath.dirname(directory)
+    path = posixpath.join(directory, CAMPAIGN_DIR.format(pk=campaign.pk), name)
+    return urlunparse(parsed._replace(path=path))
+
+
+def get_campaign_videos(campaign):
+    return get_video_model().objects.filter(**campaign.video_filter).order_by("pk")
+
+
+def get_campaign_qualities(campaign, video):
+    """
+    Qualities of a video the campaign re-encodes: its own, or every processed one, within the
+    video's rendition ladder.
+    """
+    qualities = list(campaign.resolutions or get_config().resolutions)
+    if video.rendition_ladder:
+        qualities = [quality for quality in qualities if quality in video.rendition_ladder]
+    return sort_qualities(qualities)
+
+
+def get_in_flight(campaign):
+    """
+    Number of the campaign's jobs that haven't finished yet.
+    """
+    return (
+        get_video_processing_request_model().objects
+        .filter(campaign=campaign, status__in=ACTIVE_STATUSES)
+        .count()
+    )
+
+
+def get_latest_encoding_params(videos):
+    """
+    Encoding options of the latest job that didn't fail of each (video id, resolution), with one query.
+    """
+    latest = {}
+    rows = (
+        get_video_processing_request_model().objects
+        .filter(video__in=videos)
+        .exclude(status="failed")
+        .order_by("video", "resolution", "-id")
+        .values_list("video_id", "resolution", "encoding_params")
+    )
+    for video_id, resolution, encoding_params in rows:
+        latest.setdefault((video_id, resolution), encoding_params)
+    return latest
+
+
+def plan_campaign_jobs(campaign, video, encoding_params, latest_encoding_params):
+    """
+    Returns the unsaved processing requests re-encoding a video with `encoding_params`, and the
+    number of renditions skipped because their latest job (completed or not) already uses them.
+    """
+    video_field_name = video.get_video_file_field()
+    video_field = getattr(video, video_field_name) if video_field_name else None
+    if not video_field:
+        return [], 0
+
+    config = get_config()
+    request_model = get_video_processing_request_model()
+    download_url = video.get_download_url(video_field)
+    source_metadata = {"source": video.source_metadata} if video.source_metadata else {}
+
+    jobs = []
+    skipped = 0
+    for quality in get_campaign_qualities(campaign, video):
+        resolution = config.quality_resolutions.get(quality, quality)
+        if latest_encoding_params.get((video.pk, resolution)) == encoding_params:
+            skipped += 1
+            continue
+
+        upload_url = download_url if quality == "original" else download_url.replace("original", quality)
+        # A new file, the current rendition is served until the webhook points the video to this one
+        upload_url = replace_file_format(get_campaign_url(upload_url, campaign), "mp4")
+        jobs.append(
+            request_model(
+                video=video,
+                resolution=resolution,
+                download_url=download_url,
+                upload_url=upload_url,
+                download_provider=config.download_provider,
+                upload_provider=config.upload_provider,
+                webhook_url=get_webhook_url(),
+                video_duration=video.source_metadata.get("duration"),
+                metadata=source_metadata,
+                encoding_params=encoding_params,
+                campaign=campaign,
+                priority=request_model.PRIORITY_BACKFILL,
+            )
+        )
+    return jobs, skipped
+
+
+def run_campaign_batch(campaign):
+    """
+    Submits the jobs of the next `batch_size` videos of a campaign, as far as `max_in_flight`
+    allows, then saves the cursor. The renditions of a video are submitted together; a video
+    with more renditions than the cap waits until nothing else is in flight.
+    Returns the number of jobs submitted.
+
+    The campaign is completed once all its videos were submitted and their jobs have finished.
+    """
+    in_flight = get_in_flight(campaign)
+    videos = get_campaign_videos(campaign)
+    if campaign.cursor:
+        videos = videos.filter(pk__gt=campaign.cursor)
+    videos = list(videos[:campaign.batch_size])
+
+    if not videos:
+        if not in_flight:
+            campaign.status = "completed"
+            campaign.completed_at = timezone.now()
+            campaign.save(update_fields=["status", "completed_at", "updated_at"])
+            logger.info("%s completed", campaign)
+        return 0
+
+    free = campaign.max_in_flight - in_flight
+    if free <= 0:
+        return 0
+
+    encoding_params = get_encoding_params(campaign.encoding_params)
+    latest_encoding_params = get_latest_encoding_params(videos)
+    submitted = 0
+    for video in videos:
+        jobs, skipped = plan_campaign_jobs(campaign, video, encoding_params, latest_encoding_params)
+        if len(jobs) > free and (submitted or in_flight):
+            break
+        for job in jobs:
+            job.save()  # Submits the job, or queues it for the scheduler
+        submitted += len(jobs)
+        free -= len(jobs)
+        campaign.cursor = str(video.pk)
+        campaign.videos_done += 1
+        campaign.jobs_submitted += len(jobs)
+        campaign.jobs_skipped += skipped
+        if free <= 0:
+            break
+
+    campaign.save(update_fields=["cursor", "videos_done", "jobs_submitted", "jobs_skipped", "updated_at"])
+    logger.info("%s submitted %s jobs, up to video %s", campaign, submitted, campaign.cursor)
+    return submitted
+
+
+def run_campaign(campaign, max_batches=None):
+    """
+    Runs batches of an active campaign while they make progress, until its in-flight cap is
+    reached, it runs out of videos or it's paused (checked between batches).
+    Returns the number of jobs submitted.
+    """
+    submitted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        campaign.refresh_from_db()
+        if campaign.status != "active":
+            break
+        cursor = campaign.cursor
+        submitted += run_campaign_batch(campaign)
+        batches += 1
+        if campaign.cursor == cursor:
+            break
+    return submitted
+
+
+def run_campaigns(ids=None):
+    """
+    Runs the active campaigns, or those among `ids`. Returns the jobs submitted per campaign.
+    """
+    campaigns = get_reprocessing_campaign_model().objects.filter(status="active").order_by("pk")
+    if ids:
+        campaigns = campaigns.filter(pk__in=ids)
+    return {campaign: run_campaign(campaign) for campaign in campaigns}
@@ -0,0 +1,381 @@
+import re
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import NoReverseMatch, reverse
+
+RESOLUTION_RE = re.compile(r"^\d+p$")
+MEDIA_SERVERS = (None, "nginx", "sendfile")
+# Bitrate (bits per second) a rendition of each resolution is expected to have, see plan_rendition_ladder
+DEFAULT_LADDER_BITRATES = {
+    "2160p": 12_000_000,
+    "1440p": 8_000_000,
+    "1080p": 4_500_000,
+    "720p": 2_500_000,
+    "480p": 1_000_000,
+    "360p": 600_000,
+    "240p": 300_000,
+}
+# Bounds of the chunk size negotiated by the upload widget, see uploads.py
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Receivers of the package's metrics, see instrumentation.py
+DEFAULT_INSTRUMENTATION = ("contentor_video_processor.instrumentation.PrometheusInstrumentation",)
+# Settings the configuration is built from, a change to any of them rebuilds it
+SETTING_PREFIXES = ("CONTENTOR_", "AWS_", "ADMIN_RESUMABLE_")
+SETTING_NAMES = ("ADMIN_SIMULTANEOUS_UPLOADS", "BASE_URL", "DEFAULT_FILE_STORAGE", "ROOT_URLCONF")
+
+_config = None
+
+
+@dataclass(frozen=True)
+class ContentorConfig:
+    """
+    Validated, read-only view of the CONTENTOR_* (and related AWS/ADMIN_RESUMABLE_*) settings.
+
+    Built once by `get_config()` and rebuilt when a setting changes, so hot paths read
+    attributes instead of looking settings up and re-applying defaults on every call.
+    """
+
+    video_model: str
+    requests_app: str
+    request_verbose_name: str
+    request_verbose_name_plural: str
+
+    # Contentor API
+    access_key: str
+    access_token: str
+    api_url: str
+    status_url: str
+    base_url: str
+    webhook_url_setting: str
+    processing_options: MappingProxyType
+    download_provider: str
+    upload_provider: str
+
+    # Resolutions. `resolutions` are submitted for processing ('original' included),
+    # `qualities` are the ones offered to viewers.
+    original_resolution: str
+    resolutions: tuple
+    qualities: tuple
+    quality_fields: MappingProxyType
+    quality_resolutions: MappingProxyType
+    resolution_fields: MappingProxyType
+    ladder_planning: bool
+    ladder_bitrates: MappingProxyType
+
+    # Webhooks
+    webhook_queued: bool
+    webhook_batch_max_events: int
+
+    # Reconciler of stalled jobs and submission retries
+    reconcile_after: int
+    reconcile_batch_size: int
+    submit_max_attempts: int
+    submit_retry_delay: int
+    submit_retry_max_delay: int
+
+    # Priority scheduler of job submissions
+    scheduler: bool
+    scheduler_max_in_flight: int
+    scheduler_reserved: int
+    scheduler_aging: int
+
+    # Signed URLs, manifests and players
+    signed_url_cache: str
+    signed_url_expiry_margin: int
+    signed_url_batch_max_items: int
+    url_signer: str
+    querystring_expire: int
+    rendition_poll_interval: int
+    probe_cache: str
+    faststart_on_upload: bool
+    manifest_cache: str
+    manifest_cache_timeout: int
+    adaptive_streaming: bool
+
+    # Instrumentation
+    instrumentation: tuple
+    metrics_token: str
+    profile_sample_rate: float
+    profile_slow_threshold: float
+    profile_dir: str
+    profile_top: int
+
+    # Protected media
+    media_permission: str
+    media_server: str
+    media_accel_prefix: str
+
+    # Storage
+    aws_access_key_id: str
+    aws_secret_access_key: str
+    aws_storage_bucket_name: str
+    aws_s3_endpoint_url: str
+    aws_location: str
+    persistent_storage: str
+    chunk_storage: str
+
+    # Upload widget
+    chunk_size: str
+    show_thumb: bool
+    simultaneous_uploads: int
+    upload_sniff: bool
+    adaptive_uploads: bool
+    chunk_size_bytes: int
+    min_chunk_size: int
+    max_chunk_size: int
+    max_simultaneous_uploads: int
+    upload_capacity: int
+    upload_load_cache: str
+
+    @cached_property
+    def url_templates(self):
+        """
+        Paths of the app's views with `{video_id}`, `{quality}` and `{resolution}` placeholders,
+        resolved once from the URLconf. Views the project doesn't route are left out.
+        """
+        names = {
+            "signed_url": ("video_signed_url", ["{video_id}", "{quality}"]),
+            "renditions": ("video_renditions", ["{video_id}"]),
+            "media": ("video_media", ["{video_id}", "{quality}"]),
+            "manifest": ("video_manifest", ["{video_id}"]),
+            "media_playlist": ("video_media_playlist", ["{video_id}", "{quality}"]),
+            "signed_urls": ("video_signed_urls", []),
+            "webhook": ("webhook_receiver", []),
+            "webhook_batch": ("webhook_batch_receiver", []),
+        }
+        templates = {}
+        for key, (name, placeholders) in names.items():
+            # Reverse with sentinels the converters accept, then swap in the placeholders
+            sentinels = [str(900000001 + i) if "video_id" in p else f"__{i}__" for i, p in enumerate(placeholders)]
+            try:
+                path = reverse(name, args=sentinels)
+            except NoReverseMatch:
+                continue
+            for sentinel, placeholder in zip(sentinels, placeholders):
+                path = path.replace(sentinel, placeholder, 1)
+            templates[key] = path
+        return MappingProxyType(templates)
+
+    @cached_property
+    def webhook_url(self):
+        """
+        URL Contentor posts status updates to: CONTENTOR_WEBHOOK_URL, or BASE_URL joined with the webhook route.
+        """
+        if self.webhook_url_setting:
+            return self.webhook_url_setting
+        if not self.base_url or "webhook" not in self.url_templates:
+            return None
+        return f"{self.base_url}{self.url_templates['webhook']}"
+
+    def get_quality_field(self, quality):
+        return self.quality_fields.get(quality)
+
+    def get_resolution_field(self, resolution):
+        return self.resolution_fields.get(resolution, f"video_{resolution}")
+
+
+def _positive_int(name, default):
+    value = getattr(settings, name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ImproperlyConfigured(f"{name} must be a non-negative integer, got {value!r}.")
+    return value
+
+
+def _parse_chunk_size(value):
+    """
+    ADMIN_RESUMABLE_CHUNKSIZE is rendered into the widget's JavaScript, so it may be a product like "5*1024*1024".
+    """
+    try:
+        size = 1
+        for factor in str(value).split("*"):
+            size *= int(factor)
+    except ValueError:
+        raise ImproperlyConfigured(
+            f"ADMIN_RESUMABLE_CHUNKSIZE must be a number of bytes or a product like '5*1024*1024', got {value!r}."
+        )
+    if size <= 0:
+        raise ImproperlyConfigured(f"ADMIN_RESUMABLE_CHUNKSIZE must be positive, got {value!r}.")
+    return size
+
+
+def _required(name):
+    value = getattr(settings, name, None)
+    if not value:
+        raise ImproperlyConfigured(f"The {name} setting is required by contentor_video_processor.")
+    return value
+
+
+def build_config():
+    """
+    Reads and validates the settings. Raises ImproperlyConfigured for invalid values.
+    """
+    options = dict(getattr(settings, "CONTENTOR_VIDEO_PROCESSING_CONFIG", None) or {})
+
+    original_resolution = options.get("original_resolution", "1080p")
+    if not RESOLUTION_RE.match(str(original_resolution)):
+        raise ImproperlyConfigured(
+            f"CONTENTOR_VIDEO_PROCESSING_CONFIG['original_resolution'] must look like '1080p', got {original_resolution!r}."
+        )
+
+    resolutions = tuple(options.get("resolutions", ["original"]))
+    qualities = tuple(getattr(settings, "CONTENTOR_VIDEO_RESOLUTIONS", None) or resolutions)
+    for name, values in (("CONTENTOR_VIDEO_PROCESSING_CONFIG['resolutions']", resolutions),
+                         ("CONTENTOR_VIDEO_RESOLUTIONS", qualities)):
+        invalid = [value for value in values if value != "original" and not RESOLUTION_RE.match(str(value))]
+        if invalid:
+            raise ImproperlyConfigured(f"{name} contains invalid resolutions: {invalid!r}.")
+
+    all_qualities = tuple(dict.fromkeys(resolutions + qualities))
+    quality_fields = {q: "video" if q == "original" else f"video_{q}" for q in all_qualities}
+    quality_resolutions = {q: original_resolution if q == "original" else q for q in all_qualities}
+    resolution_fields = {quality_resolutions[q]: quality_fields[q] for q in all_qualities}
+    resolution_fields[original_resolution] = "video"
+
+    media_server = getattr(settings, "CONTENTOR_MEDIA_SERVER", None)
+    if media_server not in MEDIA_SERVERS:
+        raise ImproperlyConfigured(f"CONTENTOR_MEDIA_SERVER must be one of {MEDIA_SERVERS!r}, got {media_server!r}.")
+
+    profile_sample_rate = getattr(settings, "CONTENTOR_PROFILE_SAMPLE_RATE", 0)
+    if not isinstance(profile_sample_rate, (int, float)) or not 0 <= profile_sample_rate <= 1:
+        raise ImproperlyConfigured(
+            f"CONTENTOR_PROFILE_SAMPLE_RATE must be a number between 0 and 1, got {profile_sample_rate!r}."
+        )
+    profile_slow_threshold = getattr(settings, "CONTENTOR_PROFILE_SLOW_THRESHOLD", None)
+    if profile_slow_threshold is not None and (
+        not isinstance(profile_slow_threshold, (int, float)) or profile_slow_threshold < 0
+    ):
+        raise ImproperlyConfigured(
+            f"CONTENTOR_PROFILE_SLOW_THRESHOLD must be a number of seconds, got {profile_slow_threshold!r}."
+        )
+
+    chunk_size = getattr(settings, "ADMIN_RESUMABLE_CHUNKSIZE", "1*1024*1024")
+    chunk_size_bytes = _parse_chunk_size(chunk_size)
+    # Fixed-size clients send a last chunk of up to twice the chunk size
+    min_chunk_size = _positive_int("CONTENTOR_UPLOAD_MIN_CHUNK_SIZE", min(MIN_CHUNK_SIZE, chunk_size_bytes))
+    max_chunk_size = _positive_int("CONTENTOR_UPLOAD_MAX_CHUNK_SIZE", max(MAX_CHUNK_SIZE, 2 * chunk_size_bytes))
+    if not 0 < min_chunk_size <= chunk_size_bytes <= max_chunk_size:
+        raise ImproperlyConfigured(
+            "CONTENTOR_UPLOAD_MIN_CHUNK_SIZE <= ADMIN_RESUMABLE_CHUNKSIZE <= CONTENTOR_UPLOAD_MAX_CHUNK_SIZE "
+            f"doesn't hold: {min_chunk_size}, {chunk_size_bytes}, {max_chunk_size}."
+        )
+    simultaneous_uploads = _positive_int("ADMIN_SIMULTANEOUS_UPLOADS", 1)
+    max_simultaneous_uploads = _positive_int("CONTENTOR_UPLOAD_MAX_SIMULTANEOUS", max(simultaneous_uploads, 4))
+    scheduler_max_in_flight = max(_positive_int("CONTENTOR_SCHEDULER_MAX_IN_FLIGHT", 10), 1)
+    scheduler_reserved = _positive_int("CONTENTOR_SCHEDULER_RESERVED", min(2, scheduler_max_in_flight - 1))
+    if scheduler_reserved >= scheduler_max_in_flight:
+        raise ImproperlyConfigured(
+            "CONTENTOR_SCHEDULER_RESERVED must be lower than CONTENTOR_SCHEDULER_MAX_IN_FLIGHT, "
+            f"got {scheduler_reserved} and {scheduler_max_in_flight}."
+        )
+    upload_capacity = getattr(settings, "CONTENTOR_UPLOAD_CAPACITY", None)
+    if upload_capacity is not None:
+        upload_capacity = _positive_int("CONTENTOR_UPLOAD_CAPACITY", None)
+
+    return ContentorConfig(
+        video_model=_required("CONTENTOR_VIDEO_MODEL"),
+        requests_app=_required("CONTENTOR_VIDEO_PROCESSING_REQUESTS_APP"),
+        request_verbose_name=getattr(
+            settings, "CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME", "Video processing request"
+        ),
+        request_verbose_name_plural=getattr(
+            settings, "CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME_PLURAL", "Video processing requests"
+        ),
+        access_key=getattr(settings, "CONTENTOR_VIDEO_PROCESSING_ACCESS_KEY", None),
+        access_token=getattr(settings, "CONTENTOR_VIDEO_PROCESSING_ACCESS_TOKEN", None),
+        api_url=options.get("api_url", "https://process.contentor.app/api/process-video/"),
+        status_url=options.get("status_url"),
+        base_url=getattr(settings, "BASE_URL", ""),
+        webhook_url_setting=getattr(settings, "CONTENTOR_WEBHOOK_URL", None),
+        processing_options=MappingProxyType(options),
+        download_provider=options.get("download_provider", "aws"),
+        upload_provider=options.get("upload_provider", "aws"),
+        original_resolution=original_resolution,
+        resolutions=resolutions,
+        qualities=qualities,
+        quality_fields=MappingProxyType(quality_fields),
+        quality_resolutions=MappingProxyType(quality_resolutions),
+        resolution_fields=MappingProxyType(resolution_fields),
+        ladder_planning=bool(getattr(settings, "CONTENTOR_LADDER_PLANNING", True)),
+        ladder_bitrates=MappingProxyType(
+            {**DEFAULT_LADDER_BITRATES, **(getattr(settings, "CONTENTOR_LADDER_BITRATES", None) or {})}
+        ),
+        webhook_queued=bool(getattr(settings, "CONTENTOR_WEBHOOK_QUEUED", False)),
+        webhook_batch_max_events=_positive_int("CONTENTOR_WEBHOOK_BATCH_MAX_EVENTS", 1000),
+        reconcile_after=_positive_int("CONTENTOR_RECONCILE_AFTER", 15 * 60),
+        reconcile_batch_size=max(_positive_int("CONTENTOR_RECONCILE_BATCH_SIZE", 100), 1),
+        submit_max_attempts=_positive_int("CONTENTOR_SUBMIT_MAX_ATTEMPTS", 8),
+        submit_retry_delay=_positive_int("CONTENTOR_SUBMIT_RETRY_DELAY", 60),
+        submit_retry_max_delay=_positive_int("CONTENTOR_SUBMIT_RETRY_MAX_DELAY", 6 * 60 * 60),
+        scheduler=bool(getattr(settings, "CONTENTOR_SCHEDULER", False)),
+        scheduler_max_in_flight=scheduler_max_in_flight,
+        scheduler_reserved=scheduler_reserved,
+        scheduler_aging=_positive_int("CONTENTOR_SCHEDULER_AGING", 60),
+        signed_url_cache=getattr(settings, "CONTENTOR_SIGNED_URL_CACHE", "default"),
+        signed_url_expiry_margin=_positive_int("CONTENTOR_SIGNED_URL_EXPIRY_MARGIN", 300),
+        signed_url_batch_max_items=_positive_int("CONTENTOR_SIGNED_URL_BATCH_MAX_ITEMS", 500),
+        url_signer=getattr(settings, "CONTENTOR_URL_SIGNER", None),
+        querystring_expire=_positive_int("AWS_QUERYSTRING_EXPIRE", 3600),
+        rendition_poll_interval=_positive_int("CONTENTOR_RENDITION_POLL_INTERVAL", 15),
+        probe_cache=getattr(settings, "CONTENTOR_PROBE_CACHE", "default"),
+        faststart_on_upload=bool(getattr(settings, "CONTENTOR_FASTSTART_ON_UPLOAD", False)),
+        manifest_cache=getattr(settings, "CONTENTOR_MANIFEST_CACHE", "default"),
+        manifest_cache_timeout=_positive_int("CONTENTOR_MANIFEST_CACHE_TIMEOUT", 24 * 60 * 60),
+        adaptive_streaming=bool(getattr(settings, "CONTENTOR_ADAPTIVE_STREAMING", False)),
+        instrumentation=tuple(getattr(settings, "CONTENTOR_INSTRUMENTATION", DEFAULT_INSTRUMENTATION) or ()),
+        metrics_token=getattr(settings, "CONTENTOR_METRICS_TOKEN", None),
+        profile_sample_rate=profile_sample_rate,
+        profile_slow_threshold=profile_slow_threshold,
+        profile_dir=getattr(settings, "CONTENTOR_PROFILE_DIR", None),
+        profile_top=_positive_int("CONTENTOR_PROFILE_TOP", 25),
+        media_permission=getattr(settings, "CONTENTOR_MEDIA_PERMISSION", None),
+        media_server=media_server,
+        media_accel_prefix=getattr(settings, "CONTENTOR_MEDIA_ACCEL_PREFIX", "/protected-media/"),
+        aws_access_key_id=getattr(settings, "AWS_ACCESS_KEY_ID", None),
+        aws_secret_access_key=getattr(settings, "AWS_SECRET_ACCESS_KEY", None),
+        aws_storage_bucket_name=getattr(settings, "AWS_STORAGE_BUCKET_NAME", None),
+        aws_s3_endpoint_url=getattr(settings, "AWS_S3_ENDPOINT_URL", None),
+        aws_location=getattr(settings, "AWS_LOCATION", None),
+        persistent_storage=(
+            getattr(settings, "ADMIN_RESUMABLE_STORAGE", None)
+            or getattr(settings, "DEFAULT_FILE_STORAGE", "django.core.files.storage.FileSystemStorage")
+        ),
+        chunk_storage=getattr(
+            settings, "ADMIN_RESUMABLE_CHUNK_STORAGE", "django.core.files.storage.FileSystemStorage"
+        ),
+        chunk_size=chunk_size,
+        show_thumb=bool(getattr(settings, "ADMIN_RESUMABLE_SHOW_THUMB", False)),
+        simultaneous_uploads=simultaneous_uploads,
+        upload_sniff=bool(getattr(settings, "CONTENTOR_UPLOAD_SNIFF", True)),
+        adaptive_uploads=bool(getattr(settings, "CONTENTOR_ADAPTIVE_UPLOADS", False)),
+        chunk_size_bytes=chunk_size_bytes,
+        min_chunk_size=min_chunk_size,
+        max_chunk_size=max_chunk_size,
+        max_simultaneous_uploads=max(max_simultaneous_uploads, 1),
+        upload_capacity=upload_capacity,
+        upload_load_cache=getattr(settings, "CONTENTOR_UPLOAD_LOAD_CACHE", "default"),
+    )
+
+
+def get_config():
+    """
+    Returns the current configuration, building it on first use.
+    """
+    global _config
+    if _config is None:
+        _config = build_config()
+    return _config
+
+
+def reset_config(**kwargs):
+    """
+    `setting_changed` receiver: drops the configuration so the next read rebuilds it.
+    """
+    global _config
+    setting = kwargs["setting"]
+    if setting.startswith(SETTING_PREFIXES) or setting in SETTING_NAMES:
+        _config = None
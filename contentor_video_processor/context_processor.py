@@ -1,7 +1,11 @@
-from django.conf import settings
+from contentor_video_processor.conf import get_config
 
 
 def video_resolutions(request):
+    config = get_config()
     return {
-        'AVAILABLE_VIDEO_RESOLUTIONS': settings.CONTENTOR_VIDEO_PROCESSING_CONFIG.get('resolutions', []),
+        'AVAILABLE_VIDEO_RESOLUTIONS': config.resolutions,
+        'CONTENTOR_RENDITION_POLL_INTERVAL': config.rendition_poll_interval,
+        'CONTENTOR_URL_TEMPLATES': config.url_templates,
+        'CONTENTOR_ADAPTIVE_STREAMING': config.adaptive_streaming,
     }
\ No newline at end of file
@@ -1,18 +1,66 @@
 # -*- coding: utf-8 -*-
-import fnmatch
 import logging
 import os
 import shutil
 import tempfile
 import time
 
-from django.conf import settings
-
-from contentor_video_processor.models import get_s3_client
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.models import ContentorVideoField, get_s3_client
+from contentor_video_processor.mp4 import MP4Error, RangeReader, open_range_reader, probe, write_faststart
+from contentor_video_processor.renditions import cache_source_metadata
+from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.utils.functional import cached_property
 
 from contentor_video_processor.storage import ResumableStorage
+from contentor_video_processor.validators import SNIFF_SIZE, StorageFileValidator, sniff_video_container
+
+logger = logging.getLogger(__name__)
+
+# Digits of the byte offset ending chunk names, zero padded so names also sort by offset
+CHUNK_OFFSET_DIGITS = 12
+
+
+class ChunkRangeReader(RangeReader):
+    """
+    Reads byte ranges of an upload across its stored chunks, without merging them.
+    """
+
+    def __init__(self, storage, layout):
+        # (offset, name, size) of the chunks, see ResumableFile.chunk_layout
+        self.storage = storage
+        self.chunks = list(layout)
+        # (name, RangeReader) of the chunk read last
+        self._open_chunk = None
+        super().__init__(sum(size for _, _, size in self.chunks))
+
+    def open_chunk(self, name, size):
+        """
+        Returns a RangeReader of a chunk (see mp4.open_range_reader): its local file, or ranged GETs
+        on S3, so probing doesn't download whole chunks. The chunk read last stays open, so a chunk
+        streamed in several buffers is opened once.
+        """
+        if self._open_chunk is None or self._open_chunk[0] != name:
+            self.close()
+            self._open_chunk = (name, open_range_reader(self.storage, name, size))
+        return self._open_chunk[1]
+
+    def read_range(self, offset, length):
+        end = offset + length
+        parts = []
+        for start, name, size in self.chunks:
+            if start + size <= offset or start >= end:
+                continue
+            chunk_start = max(offset - start, 0)
+            parts.append(self.open_chunk(name, size).read_range(chunk_start, min(end - start, size) - chunk_start))
+        return b"".join(parts)
+
+    def close(self):
+        if self._open_chunk is not None:
+            self._open_chunk[1].close()
+            self._open_chunk = None
 
 
 class ResumableFile(object):
@@ -38,11 +86,11 @@ class ResumableFile(object):
 
     @cached_property
     def persistent_storage(self):
-        return self.resumable_storage.get_persistent_storage()
+        return instrumentation.instrument_storage(self.resumable_storage.get_persistent_storage())
 
     @cached_property
     def chunk_storage(self):
-        return ResumableStorage().get_chunk_storage()
+        return instrumentation.instrument_storage(ResumableStorage().get_chunk_storage())
 
     @property
     def storage_filename(self):
@@ -55,44 +103,117 @@ class ResumableFile(object):
     @property
     def chunk_exists(self):
         """
-        Checks if the requested chunk exists.
+        Checks if the requested chunk exists, under its offset or, for fixed-size chunks, under
+        its number as uploads started before chunks were named by offset stored it.
         """
-        return self.chunk_storage.exists(
-            self.current_chunk_name
-        ) and self.chunk_storage.size(self.current_chunk_name) == int(
-            self.params.get("resumableCurrentChunkSize")
-        )
+        names = [self.current_chunk_name]
+        if self.legacy_chunk_size:
+            names.append(self.get_legacy_chunk_name(int(self.params.get("resumableChunkNumber"))))
+        size = int(self.params.get("resumableCurrentChunkSize"))
+        return any(self.chunk_storage.exists(name) and self.chunk_storage.size(name) == size for name in names)
 
     @property
-    def chunk_names(self):
+    def legacy_chunk_size(self):
         """
-        Iterates over all stored chunks.
+        Size of the numbered chunks of uploads started before chunks were named by offset, when the
+        widget sends fixed-size chunks, else None: their offsets are only known from the fixed
+        chunk size. Chunks are fixed-size unless CONTENTOR_ADAPTIVE_UPLOADS is on, and the offset the
+        widget sends must then match the chunk number.
         """
-        chunks = []
-        files = sorted(self.chunk_storage.listdir("")[1])
-        for file in files:
-            if fnmatch.fnmatch(file, "%s%s*" % (self.filename, self.chunk_suffix)):
-                chunks.append(file)
-        return chunks
+        if get_config().adaptive_uploads or not self.params.get("resumableChunkSize"):
+            return None
+        chunk_size = int(self.params.get("resumableChunkSize"))
+        number = self.params.get("resumableChunkNumber")
+        if number and self.chunk_offset != (int(number) - 1) * chunk_size:
+            return None
+        return chunk_size
 
     @property
-    def current_chunk_name(self):
+    def chunk_offset(self):
+        """
+        Byte offset of the current chunk: resumableChunkOffset, sent by the widget, or derived from
+        the chunk number and the fixed chunk size for clients that don't send it.
+        """
+        offset = self.params.get("resumableChunkOffset")
+        if offset is not None:
+            return int(offset)
+        return (int(self.params.get("resumableChunkNumber")) - 1) * int(self.params.get("resumableChunkSize"))
+
+    def get_chunk_name(self, offset):
         # TODO: add user identifier to chunk name
-        return "%s%s%s" % (
-            self.filename,
-            self.chunk_suffix,
-            self.params.get("resumableChunkNumber").zfill(4),
-        )
+        return "%s%s%0*d" % (self.filename, self.chunk_suffix, CHUNK_OFFSET_DIGITS, offset)
+
+    def get_legacy_chunk_name(self, number):
+        return "%s%s%04d" % (self.filename, self.chunk_suffix, number)
+
+    @property
+    def current_chunk_name(self):
+        return self.get_chunk_name(self.chunk_offset)
+
+    def stored_chunks(self):
+        """
+        Returns the (offset, name) of the stored chunks of the upload, by offset. Numbered chunks
+        of uploads started before chunks were named by offset are included when their offset is
+        known (see `legacy_chunk_size`).
+        """
+        prefix = self.filename + self.chunk_suffix
+        legacy_chunk_size = self.legacy_chunk_size
+        chunks = []
+        for name in self.chunk_storage.listdir("")[1]:
+            suffix = name[len(prefix):]
+            if not name.startswith(prefix) or not suffix.isdigit():
+                continue
+            if len(suffix) == CHUNK_OFFSET_DIGITS:
+                chunks.append((int(suffix), name))
+            elif legacy_chunk_size:
+                chunks.append(((int(suffix) - 1) * legacy_chunk_size, name))
+        return sorted(chunks)
+
+    @property
+    def chunk_names(self):
+        """
+        Names of all stored chunks, by offset.
+        """
+        return [name for _, name in self.stored_chunks()]
+
+    @cached_property
+    def chunk_layout(self):
+        """
+        The (offset, name, size) of stored chunks covering the whole upload without gaps, or None
+        while bytes are missing. Computed once, after the request's chunk is stored.
+
+        Chunks may differ in size. Chunks overlapping the ones before them, left by an attempt
+        with other chunk sizes, are skipped: they hold the same bytes of the same file.
+        """
+        total_size = int(self.params.get("resumableTotalSize"))
+        chunks = self.stored_chunks()
+        if not chunks:
+            return [] if total_size == 0 else None
+
+        # Usually decided by the size of the last chunk alone: it must end the file
+        last_offset, last_name = chunks[-1]
+        last_size = self.chunk_storage.size(last_name)
+        if last_offset + last_size != total_size:
+            return None
+
+        layout = []
+        end = 0
+        for offset, name in chunks:
+            if offset > end:
+                return None
+            if offset < end:
+                continue
+            size = last_size if name == last_name else self.chunk_storage.size(name)
+            layout.append((offset, name, size))
+            end += size
+        return layout if end == total_size else None
 
     def chunks(self):
         """
-        Iterates over all stored chunks.
+        Iterates over the content of the chunks making up the upload.
         """
-        # TODO: add user identifier to chunk name
-        files = sorted(self.chunk_storage.listdir("")[1])
-        for file in files:
-            if fnmatch.fnmatch(file, "%s%s*" % (self.filename, self.chunk_suffix)):
-                yield self.chunk_storage.open(file, "rb").read()
+        for _, name, _ in self.chunk_layout or []:
+            yield self.chunk_storage.open(name, "rb").read()
 
     def delete_chunks(self):
         [self.chunk_storage.delete(chunk) for chunk in self.chunk_names]
@@ -105,48 +226,66 @@ class ResumableFile(object):
         if not self.is_complete:
             raise Exception("Chunk(s) still missing")
 
-        # Create logging for monitoring large file operations
-        logger = logging.getLogger('resumable_uploads')
         start_time = time.time()
-        logger.info(f"Starting to merge {len(self.chunk_names)} chunks for file {self.filename}")
+        chunk_names = [name for _, name, _ in self.chunk_layout]
+        logger.info("Merging %d chunks of %s", len(chunk_names), self.filename)
 
         # Use a larger buffer size (8MB) for better performance, especially on Windows
         buffer_size = 8 * 1024 * 1024  # 8MB buffer
 
         outfile = tempfile.NamedTemporaryFile("w+b")
 
-        for i, chunk in enumerate(self.chunk_names):
+        for i, chunk in enumerate(chunk_names):
             chunk_start = time.time()
-            logger.info(f"Processing chunk {i + 1}/{len(self.chunk_names)}: {chunk}")
 
             with self.chunk_storage.open(chunk, 'rb') as chunk_file:
                 # Use optimized copy with larger buffer
                 shutil.copyfileobj(chunk_file, outfile, buffer_size)
 
-            logger.info(f"Chunk {i + 1} processed in {time.time() - chunk_start:.2f} seconds")
+            logger.debug("Merged chunk %d/%d of %s in %.2f seconds", i + 1, len(chunk_names), self.filename,
+                         time.time() - chunk_start)
 
         # Reset file pointer to beginning for reading
         outfile.seek(0)
-        logger.info(f"All chunks merged in {time.time() - start_time:.2f} seconds")
+        logger.info("Merged %s in %.2f seconds", self.filename, time.time() - start_time)
+        return outfile
+
+    def faststart_file(self):
+        """
+        Merges the chunks with the moov atom moved in front of the media data, in a single
+        streaming pass like `file`. Returns None when the upload can't be remuxed.
+        """
+        outfile = tempfile.NamedTemporaryFile("w+b")
+        reader = ChunkRangeReader(self.chunk_storage, self.chunk_layout)
+        try:
+            write_faststart(reader, outfile)
+        except MP4Error as e:
+            logger.warning("Could not remux %s for faststart: %s", self.filename, e)
+            outfile.close()
+            return None
+        finally:
+            reader.close()
+        outfile.seek(0)
         return outfile
 
     def file_already_exists(self):
         """
         Checks if a file with the same name and size already exists in S3 storage.
         """
+        config = get_config()
         try:
             # Get S3 client
             client = get_s3_client(
-                access_key=settings.__getattr__("AWS_ACCESS_KEY_ID"),
-                secret_key=settings.__getattr__("AWS_SECRET_ACCESS_KEY"),
-                endpoint_url=settings.__getattr__("AWS_S3_ENDPOINT_URL"),
+                access_key=config.aws_access_key_id,
+                secret_key=config.aws_secret_access_key,
+                endpoint_url=config.aws_s3_endpoint_url,
             )
 
             # Extract bucket name and key from storage filename
-            bucket_name = settings.__getattr__("AWS_STORAGE_BUCKET_NAME")
+            bucket_name = config.aws_storage_bucket_name
 
             # Apply AWS location prefix to the key if configured
-            aws_location = settings.__getattr__("AWS_LOCATION")
+            aws_location = config.aws_location
 
             # Combine location prefix with storage filename to get the full key
             if aws_location and not self.storage_filename.startswith(aws_location):
@@ -160,7 +299,7 @@ class ResumableFile(object):
             # Extract the expected file size
             total_size = int(self.params.get("resumableTotalSize"))
 
-            print(f"Checking if file exists in S3: bucket={bucket_name}, key={key}")
+            logger.debug("Checking if file exists in S3: bucket=%s, key=%s", bucket_name, key)
 
             try:
                 # Check if object exists and get its metadata
@@ -169,7 +308,7 @@ class ResumableFile(object):
                 # Get content length from response
                 file_size = response.get('ContentLength', 0)
 
-                print(f"Existing file found in S3: {key}, size: {file_size}, expected: {total_size}")
+                logger.debug("Existing file found in S3: %s, size: %s, expected: %s", key, file_size, total_size)
 
                 # Compare sizes
                 return file_size == total_size
@@ -177,17 +316,76 @@ class ResumableFile(object):
             except client.exceptions.ClientError as e:
                 # If the error code is 404, the object does not exist
                 if e.response['Error']['Code'] == '404':
-                    print(f"File does not exist in S3: {key}")
+                    logger.debug("File does not exist in S3: %s", key)
                     return False
                 else:
                     # Other errors
-                    print(f"Error checking file existence in S3: {str(e)}")
+                    logger.warning("Error checking file existence in S3: %s", e)
                     return False
 
         except Exception as e:
-            print(f"Error in file_already_exists: {str(e)}")
+            logger.warning("Error in file_already_exists: %s", e)
             return False
 
+    def probe(self):
+        """
+        Reads the container metadata of the upload from its chunks (see mp4.probe), touching only
+        the box headers and the moov atom, usually in the first or the last chunk.
+        Returns an empty dict for files that aren't MP4/MOV.
+        """
+        reader = ChunkRangeReader(self.chunk_storage, self.chunk_layout or [])
+        try:
+            return probe(reader)
+        except MP4Error as e:
+            logger.info("Could not probe %s: %s", self.filename, e)
+            return {}
+        finally:
+            reader.close()
+
+    def validate_upload(self, first_chunk=None):
+        """
+        Applies the field's StorageFileValidator rules and allowed formats to the upload's name and
+        declared total size, and sniffs the container of `first_chunk`, before anything is stored.
+        Raises ValidationError with the code of the failed rule ("extension", "max_size",
+        "min_size" or "content_type").
+        """
+        name = self.params.get("resumableFilename")
+        total_size = int(self.params.get("resumableTotalSize"))
+        for validator in self.field.validators:
+            if isinstance(validator, StorageFileValidator):
+                validator.validate_upload(name, total_size)
+
+        if not isinstance(self.field, ContentorVideoField):
+            return
+        allowed_formats = self.field.allowed_formats
+        if allowed_formats and name.split(".")[-1].lower() not in allowed_formats:
+            raise ValidationError(
+                f"Only files with extensions {', '.join(allowed_formats)} are allowed.", code="extension"
+            )
+
+        # Only fields restricted to some formats are sniffed, any file is accepted otherwise
+        if allowed_formats and first_chunk is not None and get_config().upload_sniff:
+            head = first_chunk.read(SNIFF_SIZE)
+            first_chunk.seek(0)
+            if sniff_video_container(head) is None:
+                raise ValidationError(f"{name} is not a video file.", code="content_type")
+
+    def validate_chunk(self, size):
+        """
+        Checks that the current chunk, of `size` bytes, fits in the upload and within
+        CONTENTOR_UPLOAD_MAX_CHUNK_SIZE. Raises ValidationError with the code "chunk_size" or "chunk".
+        """
+        max_chunk_size = get_config().max_chunk_size
+        if size > max_chunk_size:
+            raise ValidationError(f"Chunks can't be larger than {max_chunk_size} bytes.", code="chunk_size")
+        try:
+            offset = self.chunk_offset
+            total_size = int(self.params.get("resumableTotalSize"))
+        except (TypeError, ValueError):
+            raise ValidationError("Missing or invalid chunk parameters.", code="chunk")
+        if offset < 0 or offset + size > total_size:
+            raise ValidationError("The chunk is outside of the file.", code="chunk")
+
     @property
     def filename(self):
         """
@@ -203,20 +401,22 @@ class ResumableFile(object):
     @property
     def is_complete(self):
         """
-        Checks if all chunks are already stored.
+        Checks if the stored chunks cover the whole upload.
         """
-        return int(self.params.get("resumableTotalSize")) == self.size
+        return self.chunk_layout is not None
 
     def process_chunk(self, file):
         """
         Saves chunk to chunk storage.
         """
-        print(f"Processing chunk: {self.current_chunk_name}")
         if self.chunk_storage.exists(self.current_chunk_name):
-            print(f"Chunk already exists, deleting: {self.current_chunk_name}")
+            logger.debug("Chunk already exists, deleting: %s", self.current_chunk_name)
             self.chunk_storage.delete(self.current_chunk_name)
+        started_at = time.perf_counter()
         self.chunk_storage.save(self.current_chunk_name, file)
-        print(f"Chunk saved: {self.current_chunk_name}")
+        instrumentation.observe("chunk_write_seconds", time.perf_counter() - started_at)
+        instrumentation.increment("chunk_bytes", file.size)
+        logger.debug("Chunk saved: %s", self.current_chunk_name)
 
     @property
     def size(self):
@@ -229,34 +429,39 @@ class ResumableFile(object):
         return size
 
     def collect(self):
-        print(f"Starting file collection for {self.filename}")
-        print(f"Total chunk count: {len(self.chunk_names)}")
-        print(f"Chunk names: {self.chunk_names}")
+        logger.info("Collecting %s", self.filename)
+        started_at = time.perf_counter()
 
         try:
+            metadata = self.probe()
+
+            merged_file = None
+            if get_config().faststart_on_upload and metadata and not metadata.get("faststart"):
+                logger.info("Moving the moov atom of %s to the front while merging chunks", self.filename)
+                merged_file = self.faststart_file()
+                if merged_file is not None:
+                    metadata = dict(metadata, faststart=True, remuxed=True)
+
             # Create a file object that uses our streaming property
-            print("Calling file property to merge chunks...")
-            file_obj = File(self.file)
-            print(
-                f"File object created successfully, size: {file_obj.size if hasattr(file_obj, 'size') else 'unknown'}")
+            file_obj = File(merged_file or self.file)
 
             # Save to persistent storage with streaming
-            print(f"Saving to persistent storage at path: {self.storage_filename}")
             actual_filename = self.persistent_storage.save(
                 self.storage_filename, file_obj
             )
-            print(f"File saved successfully as: {actual_filename}")
+            cache_source_metadata(actual_filename, metadata)
 
             # Clean up chunks after successful save
-            print("Starting chunk cleanup...")
             self.delete_chunks()
-            print("Chunk cleanup completed")
 
-            print(f"Collection process completed successfully for {self.filename}")
+            elapsed = time.perf_counter() - started_at
+            size = int(self.params.get("resumableTotalSize"))
+            instrumentation.observe("merge_seconds", elapsed)
+            instrumentation.increment("merge_bytes", size)
+            if elapsed > 0:
+                instrumentation.observe("merge_throughput_bytes_per_second", size / elapsed)
+            logger.info("Collected %s as %s in %.2f seconds", self.filename, actual_filename, elapsed)
             return actual_filename
-        except Exception as e:
-            print(f"Error during file collection: {str(e)}")
-            print(f"Exception type: {type(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise  # Re-raise the exception after logging
+        except Exception:
+            logger.exception("Error during file collection of %s", self.filename)
+            raise
@@ -1,10 +1,28 @@
+import contextlib
+import contextvars
+import datetime
+import logging
 import os
+import random
+import time
+import uuid
 from urllib.parse import urlparse, urlunparse
 
 import requests
-from django.conf import settings
-from django.urls import reverse
 
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the Contentor API before giving up on a request
+API_TIMEOUT = 30
+
+# Processing options that change the encoded renditions, and their defaults
+ENCODING_DEFAULTS = {"crf": "30", "preset": "ultrafast", "optimise_for_web": True}
+
+# Priority of the jobs created in the current context, None for interactive uploads
+_processing_priority = contextvars.ContextVar("contentor_processing_priority", default=None)
 
 
 def replace_file_format(url, new_ext):
@@ -29,65 +47,186 @@ def replace_file_format(url, new_ext):
     # Return the full URL with updated path
     return urlunparse(parsed._replace(path=new_path))
 
+
+def get_rendition_field_name(resolution):
+    return get_config().get_resolution_field(resolution)
+
+
+def get_rendition_relative_path(upload_url):
+    parsed_path = urlparse(upload_url).path  # e.g. "/media/videos/720p/clip.mp4"
+    path_parts = parsed_path.split("videos/", 1)
+    if len(path_parts) != 2:
+        return None
+    return "videos/" + path_parts[1]  # e.g. "videos/720p/clip.mp4"
+
+
 def get_webhook_url():
-    base_url = getattr(settings, "BASE_URL", "")
-    if not base_url:
+    return get_config().webhook_url
+
+
+def get_processing_priority():
+    return _processing_priority.get()
+
+
+@contextlib.contextmanager
+def processing_priority(priority):
+    """
+    Gives the processing jobs created in the block a priority, e.g. for a bulk import:
+
+        with processing_priority(VideoProcessingRequest.PRIORITY_BACKFILL):
+            import_videos()
+    """
+    token = _processing_priority.set(priority)
+    try:
+        yield
+    finally:
+        _processing_priority.reset(token)
+
+
+def get_encoding_params(overrides=None):
+    """
+    The encoding options of CONTENTOR_VIDEO_PROCESSING_CONFIG sent with each job, with `overrides` applied.
+    Recorded on the processing requests, so renditions made with other options can be told apart.
+    """
+    options = get_config().processing_options
+    params = {name: options.get(name, default) for name, default in ENCODING_DEFAULTS.items()}
+    params.update(overrides or {})
+    return params
+
+
+def get_submit_retry_delay(attempts):
+    """
+    Time to wait before submitting a job again after `attempts` failed submissions: doubles from
+    CONTENTOR_SUBMIT_RETRY_DELAY up to CONTENTOR_SUBMIT_RETRY_MAX_DELAY, with jitter so jobs that
+    failed together during an outage aren't all retried at once.
+    """
+    contentor_config = get_config()
+    delay = min(contentor_config.submit_retry_delay * 2 ** max(attempts - 1, 0), contentor_config.submit_retry_max_delay)
+    return datetime.timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def get_api_headers():
+    contentor_config = get_config()
+    return {
+        "Content-Type": "application/json",
+        "X-User-Access-Key": contentor_config.access_key,
+        "X-User-Access-Token": contentor_config.access_token,
+    }
+
+
+def fetch_job_statuses(uuids):
+    """
+    Queries the current status of many jobs with one request to the `status_url` of
+    CONTENTOR_VIDEO_PROCESSING_CONFIG.
+
+    Returns a tuple of ({uuid: payload} of the jobs Contentor reported, payloads having the fields of
+    a webhook event (uuid, status, timestamp...), set of the uuids it reported as not found).
+    Jobs it didn't mention are in neither. Returns None when the query fails or its answer isn't
+    understood, so nothing is concluded from it.
+    """
+    contentor_config = get_config()
+    started_at = time.perf_counter()
+    try:
+        response = requests.post(
+            contentor_config.status_url,
+            headers=get_api_headers(),
+            json={"ids": [str(job_uuid) for job_uuid in uuids]},
+            timeout=API_TIMEOUT,
+        )
+        if response.status_code != 200:
+            instrumentation.increment("status_queries", outcome="rejected")
+            logger.error("Error querying the status of %s jobs: %s - %s", len(uuids), response.status_code, response.text)
+            return None
+        result = response.json()
+    except Exception as e:
+        instrumentation.increment("status_queries", outcome="error")
+        logger.error("Exception while querying the status of %s jobs: %s", len(uuids), e)
+        return None
+    finally:
+        instrumentation.observe("status_query_seconds", time.perf_counter() - started_at)
+
+    # Either a list of jobs or {"jobs": [...], "not_found": [uuid, ...]}, jobs identified by "uuid" or "id"
+    if isinstance(result, list):
+        jobs, not_found = result, []
+    elif isinstance(result, dict) and isinstance(result.get("jobs"), list):
+        jobs, not_found = result["jobs"], result.get("not_found") or []
+    else:
+        jobs = not_found = None
+    if not isinstance(not_found, list):
+        jobs = None
+    if jobs is None:
+        instrumentation.increment("status_queries", outcome="invalid")
+        logger.error("Unexpected answer to the status query of %s jobs: %.200s", len(uuids), response.text)
         return None
-    return f"{base_url}{reverse('webhook_receiver')}"
+
+    instrumentation.increment("status_queries", outcome="answered")
+    statuses = {}
+    for job in jobs:
+        try:
+            job_uuid = uuid.UUID(str(job.get("uuid") or job.get("id")))
+        except (AttributeError, ValueError):
+            continue
+        if job.get("status"):
+            statuses[job_uuid] = {**job, "uuid": str(job_uuid)}
+    missing = set()
+    for value in not_found:
+        try:
+            missing.add(uuid.UUID(str(value)))
+        except ValueError:
+            continue
+    return statuses, missing - set(statuses)
 
 
 def process_video(
     download_url,
     upload_url,
     resolution=None,
+    encoding_params=None,
 ):
 
-    headers = {
-        "Content-Type": "application/json",
-        "X-User-Access-Key": settings.CONTENTOR_VIDEO_PROCESSING_ACCESS_KEY,
-        "X-User-Access-Token": settings.CONTENTOR_VIDEO_PROCESSING_ACCESS_TOKEN,
-    }
-
-    contentor_config = getattr(settings, "CONTENTOR_VIDEO_PROCESSING_CONFIG", {})
+    contentor_config = get_config()
+    headers = get_api_headers()
 
     config = {
         # contentor settings
-        "download_provider": contentor_config.get("download_provider", "aws"),
-        "upload_provider": contentor_config.get("upload_provider", "aws"),
+        "download_provider": contentor_config.download_provider,
+        "upload_provider": contentor_config.upload_provider,
         "download_url": download_url,
         "upload_url": upload_url,
-        "webhook_url": getattr(settings, "CONTENTOR_WEBHOOK_URL", get_webhook_url()),
+        "webhook_url": contentor_config.webhook_url,
 
         # video settings
-        "crf": contentor_config.get("crf", "30"),
-        "preset": contentor_config.get("preset", "ultrafast"),
-        "optimise_for_web": contentor_config.get("optimise_for_web", True),
+        **(encoding_params or get_encoding_params()),
 
         # access keys
-        "download_access_key": settings.AWS_ACCESS_KEY_ID,
-        "download_access_secret": settings.AWS_SECRET_ACCESS_KEY,
-        "upload_access_key": settings.AWS_ACCESS_KEY_ID,
-        "upload_access_secret": settings.AWS_SECRET_ACCESS_KEY
+        "download_access_key": contentor_config.aws_access_key_id,
+        "download_access_secret": contentor_config.aws_secret_access_key,
+        "upload_access_key": contentor_config.aws_access_key_id,
+        "upload_access_secret": contentor_config.aws_secret_access_key
     }
 
     if resolution:
         config["resolution"] = resolution
 
+    started_at = time.perf_counter()
     try:
         response = requests.post(
-            contentor_config.get("api_url", "https://process.contentor.app/api/process-video/"), headers=headers, json=config
+            contentor_config.api_url, headers=headers, json=config, timeout=API_TIMEOUT
         )
 
         if response.status_code == 200:
             result = response.json()
-            print(f"✅ Video processing for {resolution} submitted successfully!")
-            print(f"Job ID: {result.get('id')}")
-            print(f"Status: {result.get('status')}")
+            instrumentation.increment("submits", outcome="submitted")
+            logger.info(
+                "Video processing for %s submitted, job %s (%s)", resolution, result.get("id"), result.get("status")
+            )
             return result.get("id")
         else:
-            print(
-                f"❌ Error processing {resolution}: {response.status_code} - {response.text}"
-            )
+            instrumentation.increment("submits", outcome="rejected")
+            logger.error("Error processing %s: %s - %s", resolution, response.status_code, response.text)
 
     except Exception as e:
-        print(f"🔥 Exception while processing video at {resolution}: {str(e)}")
\ No newline at end of file
+        instrumentation.increment("submits", outcome="error")
+        logger.error("Exception while processing video at %s: %s", resolution, e)
+    finally:
+        instrumentation.observe("submit_seconds", time.perf_counter() - started_at)
\ No newline at end of file
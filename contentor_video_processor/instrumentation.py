@@ -0,0 +1,254 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.module_loading import import_string
+
+from contentor_video_processor import profiling
+from contentor_video_processor.conf import get_config
+
+logger = logging.getLogger(__name__)
+
+# Metrics reported by the package: name -> (type, help, histogram buckets).
+# Labels are listed where the metric is reported.
+MB = 1024 * 1024
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS = {
+    # Upload chunks, per storage save
+    "chunk_write_seconds": ("histogram", "Time to store an upload chunk.", LATENCY_BUCKETS),
+    "chunk_bytes": ("counter", "Bytes of upload chunks stored.", None),
+    # Merging the chunks of a finished upload and saving it to persistent storage
+    "merge_seconds": ("histogram", "Time to merge an upload and save it.", LATENCY_BUCKETS),
+    "merge_bytes": ("counter", "Bytes of uploads merged.", None),
+    "merge_throughput_bytes_per_second": (
+        "histogram",
+        "Merge throughput of uploads.",
+        tuple(value * MB for value in (1, 5, 10, 25, 50, 100, 250, 500, 1000)),
+    ),
+    # S3 API calls made by the package (labels: operation, outcome)
+    "s3_requests": ("counter", "S3 API calls.", None),
+    "s3_request_seconds": ("histogram", "Latency of S3 API calls.", LATENCY_BUCKETS),
+    # Jobs submitted to the Contentor API (label: outcome = submitted, rejected or error)
+    "submits": ("counter", "Processing jobs submitted to Contentor.", None),
+    "submit_seconds": ("histogram", "Latency of Contentor job submissions.", LATENCY_BUCKETS),
+    # Job status queries of the reconciler (label: outcome = answered, rejected, invalid or error)
+    "status_queries": ("counter", "Job status queries made to Contentor.", None),
+    "status_query_seconds": ("histogram", "Latency of Contentor job status queries.", LATENCY_BUCKETS),
+    # Stalled or unsubmitted jobs handled by the reconciler (label: action)
+    "reconciled_jobs": ("counter", "Jobs handled by the reconciler, by action.", None),
+    # Webhook deliveries (label: endpoint = single or batch) and their events (label: outcome)
+    "webhook_seconds": ("histogram", "Time to handle a webhook delivery.", LATENCY_BUCKETS),
+    "webhook_events": ("counter", "Webhook events received, by outcome.", None),
+}
+
+
+class BaseInstrumentation:
+    """
+    Receives the package's measurements. List subclasses in CONTENTOR_INSTRUMENTATION to
+    forward them elsewhere (StatsD, OpenTelemetry, logs...).
+    """
+
+    def observe(self, name, value, labels):
+        """
+        Records a sample of a histogram, e.g. a duration in seconds.
+        """
+
+    def increment(self, name, amount, labels):
+        """
+        Increases a counter.
+        """
+
+
+class PrometheusInstrumentation(BaseInstrumentation):
+    """
+    Keeps the metrics in memory and renders them in the Prometheus text format, see `metrics_view`.
+
+    Values are per process: with several worker processes each one is scraped separately,
+    or forward the measurements to a multi-process aware client with your own instrumentation.
+    """
+
+    namespace = "contentor"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def observe(self, name, value, labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def increment(self, name, amount, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: ([*counts], total, count) for key, (counts, total, count) in self.histograms.items()}
+
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            full_name = f"{self.namespace}_{name}"
+            if metric_type == "counter":
+                series = [(labels, value) for (key, labels), value in sorted(counters.items()) if key == name]
+                full_name += "_total"
+            else:
+                series = [(labels, value) for (key, labels), value in sorted(histograms.items()) if key == name]
+            if not series:
+                continue
+
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for labels, value in series:
+                if metric_type == "counter":
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_instrumentation(paths):
+    return tuple(import_string(path)() for path in paths)
+
+
+def get_instrumentation():
+    """
+    Returns the instances of the classes listed in CONTENTOR_INSTRUMENTATION, created once.
+    An empty tuple when instrumentation is disabled.
+    """
+    return _load_instrumentation(get_config().instrumentation)
+
+
+def observe(name, value, **labels):
+    for instrumentation in get_instrumentation():
+        instrumentation.observe(name, value, labels)
+
+
+def increment(name, amount=1, **labels):
+    for instrumentation in get_instrumentation():
+        instrumentation.increment(name, amount, labels)
+
+
+def timed(name, **labels):
+    """
+    Decorator observing the duration of each call of the decorated function in the histogram `name`.
+    Coroutine functions are timed until they return.
+    """
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not get_instrumentation():
+                    return await func(*args, **kwargs)
+                started_at = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(name, time.perf_counter() - started_at, **labels)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not get_instrumentation():
+                return func(*args, **kwargs)
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started_at, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+def _before_s3_call(context, **kwargs):
+    context["contentor_started_at"] = time.perf_counter()
+
+
+def _after_s3_call(context, outcome, model=None, event_name="", **kwargs):
+    # after-call passes the operation model, after-call-error only the event name
+    # ("after-call-error.s3.<Operation>"). A handler raising would replace the call's own result.
+    try:
+        operation = model.name if model is not None else event_name.rsplit(".", 1)[-1]
+        started_at = context.get("contentor_started_at")
+        increment("s3_requests", operation=operation, outcome=outcome)
+        if started_at is not None:
+            seconds = time.perf_counter() - started_at
+            observe("s3_request_seconds", seconds, operation=operation)
+            profiling.record_s3_call(operation, seconds)
+    except Exception:
+        logger.exception("Could not report an S3 call")
+
+
+def _after_s3_call_succeeded(context, http_response=None, **kwargs):
+    # Error responses (4xx, 5xx) are emitted as after-call too, before botocore raises them
+    status_code = getattr(http_response, "status_code", 200)
+    _after_s3_call(context, "success" if status_code < 300 else "error", **kwargs)
+
+
+def _after_s3_call_failed(context, **kwargs):
+    _after_s3_call(context, "error", **kwargs)
+
+
+def instrument_s3_client(client):
+    """
+    Reports the calls of a boto3 S3 client. Does nothing when instrumentation and profiling are disabled.
+    """
+    if not get_instrumentation() and not profiling.is_profiling_enabled():
+        return client
+    events = client.meta.events
+    events.register("before-call.s3", _before_s3_call, unique_id="contentor-before-call")
+    events.register("after-call.s3", _after_s3_call_succeeded, unique_id="contentor-after-call")
+    events.register("after-call-error.s3", _after_s3_call_failed, unique_id="contentor-after-call-error")
+    return client
+
+
+def instrument_storage(storage):
+    """
+    Reports the S3 calls of a django-storages S3 storage (made from the current thread, where
+    its connection lives), and times the storage's calls when the current request is profiled.
+    """
+    if hasattr(storage, "bucket_name") and hasattr(storage, "connection"):
+        if get_instrumentation() or profiling.is_profiling_enabled():
+            instrument_s3_client(storage.connection.meta.client)
+    return profiling.instrument_storage(storage)
@@ -0,0 +1,110 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contentor_video_processor.campaigns import get_campaign_videos, get_in_flight, run_campaigns
+from contentor_video_processor.models import get_reprocessing_campaign_model
+
+
+def parse_assignments(values, option):
+    """
+    Parses "name=value" arguments into a dict, values read as JSON when they can be (28, true, "x").
+    """
+    parsed = {}
+    for value in values or []:
+        name, separator, raw = value.partition("=")
+        if not separator or not name:
+            raise CommandError(f"{option} expects name=value, got {value!r}.")
+        try:
+            parsed[name] = json.loads(raw)
+        except ValueError:
+            parsed[name] = raw
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Manages reprocessing campaigns, which re-encode the existing videos with new encoding options "
+        "in throttled, checkpointed batches: create, run, pause, resume or list them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["create", "run", "pause", "resume", "list"])
+        parser.add_argument("campaigns", nargs="*", type=int, help="Campaign ids (run, pause, resume).")
+        parser.add_argument("--name", help="Name of the new campaign (create).")
+        parser.add_argument(
+            "--filter",
+            action="append",
+            metavar="LOOKUP=VALUE",
+            help="Lookup of the video queryset, e.g. created_at__lt=2024-01-01 (create, repeatable).",
+        )
+        parser.add_argument(
+            "--param",
+            action="append",
+            metavar="NAME=VALUE",
+            help="Encoding option overriding CONTENTOR_VIDEO_PROCESSING_CONFIG, e.g. crf=28 (create, repeatable).",
+        )
+        parser.add_argument(
+            "--resolutions", nargs="+", help="Qualities to re-encode, all the processed ones by default (create)."
+        )
+        parser.add_argument("--max-in-flight", type=int, default=20, help="Unfinished jobs allowed at a time (create).")
+        parser.add_argument("--batch-size", type=int, default=50, help="Videos per checkpointed batch (create).")
+        parser.add_argument("--paused", action="store_true", help="Create the campaign paused.")
+        parser.add_argument("--loop", action="store_true", help="Keep running the campaigns (run).")
+        parser.add_argument(
+            "--interval", type=float, default=60.0, help="Seconds to sleep between runs (run with --loop)."
+        )
+
+    def handle(self, *args, **options):
+        campaign_model = get_reprocessing_campaign_model()
+        action = options["action"]
+        if action == "create":
+            self.create(campaign_model, options)
+        elif action == "run":
+            self.run(options)
+        elif action in ("pause", "resume"):
+            if not options["campaigns"]:
+                raise CommandError(f"Give the ids of the campaigns to {action}.")
+            campaigns = campaign_model.objects.filter(pk__in=options["campaigns"])
+            if action == "pause":
+                updated = campaigns.filter(status="active").update(status="paused")
+            else:
+                updated = campaigns.filter(status="paused").update(status="active")
+            self.stdout.write(f"{action.capitalize()}d {updated} campaigns")
+        else:
+            for campaign in campaign_model.objects.order_by("pk"):
+                self.stdout.write(
+                    f"{campaign.pk:>5} {campaign.name:<30} {campaign.status:<10} "
+                    f"videos {campaign.videos_done}, jobs {campaign.jobs_submitted} submitted, "
+                    f"{campaign.jobs_skipped} skipped, {get_in_flight(campaign)} in flight"
+                )
+
+    def create(self, campaign_model, options):
+        if not options["name"]:
+            raise CommandError("--name is required to create a campaign.")
+        campaign = campaign_model(
+            name=options["name"],
+            video_filter=parse_assignments(options["filter"], "--filter"),
+            encoding_params=parse_assignments(options["param"], "--param"),
+            resolutions=options["resolutions"] or [],
+            max_in_flight=options["max_in_flight"],
+            batch_size=options["batch_size"],
+            status="paused" if options["paused"] else "active",
+        )
+        try:
+            videos = get_campaign_videos(campaign).count()
+        except Exception as e:
+            raise CommandError(f"Invalid --filter: {e}")
+        campaign.save()
+        self.stdout.write(f"Created campaign {campaign.pk} ({campaign.status}) over {videos} videos")
+
+    def run(self, options):
+        while True:
+            for campaign, submitted in run_campaigns(options["campaigns"]).items():
+                if submitted:
+                    self.stdout.write(f"{campaign}: submitted {submitted} jobs")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
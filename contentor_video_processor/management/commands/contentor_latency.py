@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from contentor_video_processor.analytics import (
+    PERCENTILES,
+    backfill_transition_timestamps,
+    format_duration,
+    get_latency_report,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reports the processing pipeline latencies (submit -> processing, processing -> completed, "
+        "created -> completed per resolution, and upload -> playable) of the jobs created in a time window."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=float, default=7, help="Window of job creation, in days.")
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First fill the transition timestamps of older jobs from their processing events.",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON, durations in seconds.")
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            updated = backfill_transition_timestamps()
+            summary = ", ".join(f"{field}: {count}" for field, count in updated.items())
+            self.stderr.write(f"Backfilled transition timestamps ({summary})")
+
+        report = get_latency_report(days=options["days"])
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2, default=self.to_json))
+            return
+
+        self.stdout.write(f"Jobs created from {report['start']:%Y-%m-%d %H:%M} to {report['end']:%Y-%m-%d %H:%M}")
+        columns = ["mean", *(f"p{p}" for p in PERCENTILES), "max"]
+        header = f"{'resolution':<12} {'jobs':>6} " + " ".join(f"{column:>8}" for column in columns)
+        for stage in report["stages"].values():
+            self.stdout.write("")
+            self.stdout.write(stage["label"])
+            self.stdout.write(header)
+            for row in stage["resolutions"]:
+                values = " ".join(f"{format_duration(row[column]):>8}" for column in columns)
+                self.stdout.write(f"{row['resolution']:<12} {row['count']:>6} {values}")
+
+        self.stdout.write("")
+        self.stdout.write("Upload → playable")
+        row = report["playable"]
+        if row["count"]:
+            values = " ".join(f"{format_duration(row[column]):>8}" for column in columns)
+            self.stdout.write(f"{'videos':<12} {row['count']:>6} {values}")
+
+    @staticmethod
+    def to_json(value):
+        if hasattr(value, "total_seconds"):
+            return value.total_seconds()
+        return value.isoformat()
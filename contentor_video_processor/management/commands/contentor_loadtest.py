@@ -0,0 +1,462 @@
+import json
+import re
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.models import ContentorVideoField, get_video_processing_webhook_event_model
+from contentor_video_processor.storage import ResumableStorage
+from contentor_video_processor.webhooks import sign_webhook_batch, sign_webhook_payload
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+# Request kinds reported, in this order
+REQUEST_KINDS = ("file_exists", "test_chunk", "chunk", "finalize", "webhook")
+LOADTEST_USERNAME = "contentor-loadtest"
+
+
+def parse_size(value):
+    """
+    Parses "512KB", "25MB", "1GB" or a number of bytes. Expressions like "1*1024*1024", the
+    format of ADMIN_RESUMABLE_CHUNKSIZE, are accepted too.
+    """
+    value = str(value).strip().upper()
+    if re.fullmatch(r"\d+(\s*\*\s*\d+)*", value):
+        size = 1
+        for factor in value.split("*"):
+            size *= int(factor)
+        return size
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?B?)", value)
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).rstrip("B")])
+
+
+def build_upload_content(size):
+    """
+    Content of a simulated upload: an MP4 `ftyp` box, so the first chunk passes content sniffing,
+    followed by an `mdat` box of filler.
+    """
+    ftyp = struct.pack(">I4s", 24, b"ftyp") + b"isom" + struct.pack(">I", 512) + b"isomavc1"
+    mdat_size = max(size - len(ftyp), 8)
+    filler = bytes((i * 7) % 251 for i in range(min(mdat_size - 8, 1024 * 1024)))
+    content = bytearray(ftyp + struct.pack(">I4s", mdat_size, b"mdat"))
+    while len(content) < len(ftyp) + mdat_size:
+        content += filler[:len(ftyp) + mdat_size - len(content)]
+    return bytes(content)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    """
+    Latency summary in milliseconds of a list of durations in seconds.
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class DjangoTransport:
+    """
+    Sends the requests through the Django test client, in this process, as a logged in user.
+    """
+
+    def __init__(self, user, host):
+        from django.test import Client
+
+        self.local = threading.local()
+        self.user = user
+        self.host = host
+        self.client_class = Client
+
+    @property
+    def client(self):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.client_class(raise_request_exception=False, SERVER_NAME=self.host)
+            if self.user is not None:
+                client.force_login(self.user)
+        return client
+
+    def get(self, path, params):
+        response = self.client.get(path, params)
+        return response.status_code, response.content
+
+    def post(self, path, data=None, body=None, headers=None):
+        if body is not None:
+            extra = {"HTTP_" + name.upper().replace("-", "_"): value for name, value in (headers or {}).items()}
+            response = self.client.post(path, body, content_type="application/json", **extra)
+        else:
+            response = self.client.post(path, data)
+        return response.status_code, response.content
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """
+    Sends the requests over HTTP to a running server, with the given cookies (e.g. a session id).
+    """
+
+    def __init__(self, base_url, cookies):
+        import requests
+
+        self.local = threading.local()
+        self.base_url = base_url
+        self.cookies = cookies
+        self.session_class = requests.Session
+
+    @property
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = self.session_class()
+            session.cookies.update(self.cookies)
+        return session
+
+    def get(self, path, params):
+        response = self.session.get(urljoin(self.base_url, path), params=params)
+        return response.status_code, response.content
+
+    def post(self, path, data=None, body=None, headers=None):
+        url = urljoin(self.base_url, path)
+        if body is not None:
+            response = self.session.post(url, data=body, headers={"Content-Type": "application/json", **(headers or {})})
+        else:
+            files = {key: (value.name, value.read()) for key, value in data.items() if hasattr(value, "read")}
+            fields = {key: value for key, value in data.items() if key not in files}
+            response = self.session.post(url, data=fields, files=files)
+        return response.status_code, response.content
+
+    def close(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests the upload and webhook endpoints: simulated resumable.js clients upload files "
+        "concurrently through the chunk protocol, then signed webhooks are sent. Reports throughput "
+        "and p50/p95/p99 latencies per request kind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=4, help="Concurrent simulated clients.")
+        parser.add_argument("--uploads", type=int, default=1, help="Files uploaded by each client.")
+        parser.add_argument("--file-size", default="20MB", help="Size of each uploaded file, e.g. 512KB, 20MB.")
+        parser.add_argument(
+            "--chunk-size", help="Chunk size, e.g. 1MB. Defaults to ADMIN_RESUMABLE_CHUNKSIZE, as the widget."
+        )
+        parser.add_argument(
+            "--test-chunks",
+            action="store_true",
+            help="Check whether each chunk exists (GET) before sending it, as resumable.js does with testChunks.",
+        )
+        parser.add_argument("--model", help="Model of the upload field (app_label.Model), defaults to the video model.")
+        parser.add_argument("--field", help="Upload field name, defaults to the model's first ContentorVideoField.")
+        parser.add_argument("--webhooks", type=int, default=200, help="Webhook events to send, 0 to skip.")
+        parser.add_argument(
+            "--webhook-batch-size",
+            type=int,
+            default=0,
+            help="Send the events to the batch endpoint in batches of this size instead of one per request.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server to test over HTTP. The requests are handled in this process otherwise.",
+        )
+        parser.add_argument(
+            "--cookie",
+            action="append",
+            default=[],
+            help="name=value cookie sent with --url, e.g. the sessionid of a logged in user. Repeatable.",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the uploaded files and recorded webhook events.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["uploads"] < 0 or options["webhooks"] < 0:
+            raise CommandError("--clients must be positive, --uploads and --webhooks can't be negative")
+        try:
+            file_size = parse_size(options["file_size"])
+            chunk_size = parse_size(options["chunk_size"] or get_config().chunk_size)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if chunk_size < 1 or file_size < 1:
+            raise CommandError("Sizes must be positive")
+
+        model, field = self.get_upload_field(options["model"], options["field"])
+        self.run_id = uuid.uuid4().hex[:8]
+        self.query = {
+            "content_type_id": str(ContentType.objects.get_for_model(model).pk),
+            "field_name": field.name,
+        }
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.test_chunks = options["test_chunks"]
+        self.samples = {kind: [] for kind in REQUEST_KINDS}
+        self.failures = {kind: 0 for kind in REQUEST_KINDS}
+        self.errors = []
+        self.lock = threading.Lock()
+
+        created_user = None
+        if options["url"]:
+            cookies = dict(cookie.split("=", 1) for cookie in options["cookie"] if "=" in cookie)
+            self.transport = HttpTransport(options["url"], cookies)
+        else:
+            user, created = get_user_model().objects.get_or_create(
+                **{get_user_model().USERNAME_FIELD: LOADTEST_USERNAME}
+            )
+            created_user = user if created else None
+            self.transport = DjangoTransport(user, self.get_host())
+
+        try:
+            results = {
+                "clients": options["clients"],
+                "file_size": file_size,
+                "chunk_size": chunk_size,
+                "target": options["url"] or "in-process",
+            }
+            results["uploads"], stored_names = self.run_uploads(options["clients"], options["uploads"])
+            results["webhooks"], job_uuids = self.run_webhooks(
+                options["clients"], options["webhooks"], options["webhook_batch_size"]
+            )
+            results["requests"] = {
+                kind: dict(summarize(self.samples[kind]), failures=self.failures[kind])
+                for kind in REQUEST_KINDS
+                if self.samples[kind]
+            }
+            results["errors"] = self.errors[:10]
+        finally:
+            self.transport.close()
+            if created_user is not None:
+                created_user.delete()
+
+        if not options["keep"]:
+            self.cleanup(stored_names, job_uuids, remote=bool(options["url"]))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_report(results)
+
+    def get_upload_field(self, model_label, field_name):
+        try:
+            model = apps.get_model(model_label or get_config().video_model)
+        except (LookupError, ValueError) as e:
+            raise CommandError(f"Unknown model: {e}")
+        if field_name:
+            try:
+                return model, model._meta.get_field(field_name)
+            except Exception:
+                raise CommandError(f"{model._meta.label} has no field {field_name}")
+        for field in model._meta.get_fields():
+            if isinstance(field, ContentorVideoField):
+                return model, field
+        raise CommandError(f"{model._meta.label} has no ContentorVideoField, pass --field")
+
+    def get_host(self):
+        # The test client's default "testserver" host is only allowed in tests
+        for host in settings.ALLOWED_HOSTS:
+            if host != "*" and "*" not in host:
+                return host.lstrip(".")
+        return "localhost"
+
+    def timed(self, kind, send, *args, expected=(200,), **kwargs):
+        """
+        Sends a request, recording its latency and whether it failed (a status not in `expected`).
+        Returns the response status and content, the status is None when the request couldn't be sent.
+        """
+        started_at = time.perf_counter()
+        try:
+            status, content = send(*args, **kwargs)
+        except Exception as e:
+            status, content = None, str(e).encode("utf-8")
+        elapsed = time.perf_counter() - started_at
+        with self.lock:
+            self.samples[kind].append(elapsed)
+            if status not in expected:
+                self.failures[kind] += 1
+                self.errors.append(f"{kind}: {status} {content[:200].decode('utf-8', 'replace')}")
+        return status, content
+
+    def upload_file(self, content, filename):
+        """
+        Uploads a file the way the widget does: a file-exists check, then the chunks in order,
+        resumable.js style (the last chunk holds the remainder), the last one merging the upload.
+        Returns the stored name, or None when the upload failed.
+        """
+        total_size = len(content)
+        total_chunks = max(total_size // self.chunk_size, 1)
+        common = dict(self.query, resumableFilename=filename, resumableTotalSize=str(total_size))
+
+        status, _ = self.timed("file_exists", self.transport.get, reverse("contentor_file_exists"), common)
+        if status != 200:
+            return None
+
+        upload_url = reverse("contentor_video_processor")
+        for number in range(1, total_chunks + 1):
+            start = (number - 1) * self.chunk_size
+            end = total_size if number == total_chunks else start + self.chunk_size
+            params = dict(
+                common,
+                resumableChunkNumber=str(number),
+                resumableChunkSize=str(self.chunk_size),
+                resumableCurrentChunkSize=str(end - start),
+                resumableTotalChunks=str(total_chunks),
+                resumableType="video/mp4",
+                resumableIdentifier=f"{total_size}-{filename}",
+                resumableRelativePath=filename,
+            )
+            if self.test_chunks:
+                # 404 tells the chunk has to be sent
+                status, _ = self.timed("test_chunk", self.transport.get, upload_url, params, expected=(200, 404))
+                if status == 200:
+                    continue
+
+            kind = "finalize" if number == total_chunks else "chunk"
+            data = dict(params, file=SimpleUploadedFile("blob", content[start:end]))
+            status, response = self.timed(kind, self.transport.post, upload_url, data=data)
+            if status != 200:
+                return None
+        return response.decode("utf-8")
+
+    def run_uploads(self, clients, uploads_per_client):
+        if not uploads_per_client:
+            return {"count": 0}, []
+        content = build_upload_content(self.file_size)
+
+        def client(index):
+            try:
+                names = []
+                for upload in range(uploads_per_client):
+                    names.append(self.upload_file(content, f"loadtest-{self.run_id}-{index}-{upload}.mp4"))
+                return names
+            finally:
+                self.transport.close()
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            names = [name for client_names in executor.map(client, range(clients)) for name in client_names]
+        elapsed = time.perf_counter() - started_at
+
+        stored_names = [name for name in names if name]
+        return {
+            "count": len(names),
+            "failures": len(names) - len(stored_names),
+            "seconds": elapsed,
+            "uploads_per_s": len(stored_names) / elapsed,
+            "throughput_mb_per_s": len(stored_names) * self.file_size / elapsed / 1024 ** 2,
+        }, stored_names
+
+    def run_webhooks(self, clients, event_count, batch_size):
+        """
+        Sends `event_count` signed events ("processing" then "completed" for made up jobs).
+        The jobs don't exist, so the events are recorded and applied as orphaned.
+        """
+        if not event_count:
+            return {"count": 0}, []
+        job_uuids = [str(uuid.uuid4()) for _ in range((event_count + 1) // 2)]
+        timestamp = int(time.time())
+        payloads = [
+            {"uuid": job_uuid, "status": status, "timestamp": timestamp + offset}
+            for job_uuid in job_uuids
+            for offset, status in enumerate(["processing", "completed"])
+        ][:event_count]
+
+        if batch_size:
+            url = reverse("webhook_batch_receiver")
+            deliveries = []
+            for index in range(0, len(payloads), batch_size):
+                body, signature = sign_webhook_batch(payloads[index:index + batch_size])
+                deliveries.append((body, {"X-Contentor-Signature": signature}))
+        else:
+            url = reverse("webhook_receiver")
+            deliveries = [(sign_webhook_payload(payload), None) for payload in payloads]
+
+        def client(index):
+            try:
+                for body, headers in deliveries[index::clients]:
+                    self.timed("webhook", self.transport.post, url, body=body, headers=headers)
+            finally:
+                self.transport.close()
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            list(executor.map(client, range(clients)))
+        elapsed = time.perf_counter() - started_at
+
+        return {
+            "count": len(payloads),
+            "deliveries": len(deliveries),
+            "seconds": elapsed,
+            "events_per_s": len(payloads) / elapsed,
+        }, job_uuids
+
+    def cleanup(self, stored_names, job_uuids, remote):
+        if remote:
+            if stored_names or job_uuids:
+                self.stderr.write(
+                    "The uploaded files and webhook events of a remote run are left on the server: "
+                    f"files named loadtest-{self.run_id}-*, events of {len(job_uuids)} made up jobs."
+                )
+            return
+        storage = ResumableStorage().get_persistent_storage()
+        for name in stored_names:
+            try:
+                storage.delete(name)
+            except Exception as e:
+                self.stderr.write(f"Could not delete {name}: {e}")
+        if job_uuids:
+            get_video_processing_webhook_event_model().objects.filter(uuid__in=job_uuids).delete()
+
+    def write_report(self, results):
+        self.stdout.write(
+            f"Target: {results['target']}, {results['clients']} clients, "
+            f"{results['file_size']} byte files in {results['chunk_size']} byte chunks"
+        )
+        uploads = results["uploads"]
+        if uploads["count"]:
+            self.stdout.write(
+                f"Uploads: {uploads['count'] - uploads['failures']}/{uploads['count']} in {uploads['seconds']:.2f}s, "
+                f"{uploads['uploads_per_s']:.2f} uploads/s, {uploads['throughput_mb_per_s']:.2f} MB/s"
+            )
+        webhooks = results["webhooks"]
+        if webhooks["count"]:
+            self.stdout.write(
+                f"Webhooks: {webhooks['count']} events in {webhooks['deliveries']} requests, "
+                f"{webhooks['seconds']:.2f}s, {webhooks['events_per_s']:.1f} events/s"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(f"{'request':<12} {'count':>7} {'fail':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for kind, stats in results["requests"].items():
+            self.stdout.write(
+                f"{kind:<12} {stats['count']:>7} {stats['failures']:>5} {stats['p50_ms']:>9.1f} "
+                f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}"
+            )
+        for error in results["errors"]:
+            self.stderr.write(error)
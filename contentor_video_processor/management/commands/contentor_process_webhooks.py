@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contentor_video_processor.webhooks import apply_orphaned_events, apply_pending_webhook_events
+
+
+class Command(BaseCommand):
+    help = "Applies recorded Contentor webhook events to their video processing requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Events applied per transaction.")
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new events instead of exiting when idle."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds to sleep between polls when idle (with --loop)."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            outcomes = apply_pending_webhook_events(batch_size=options["batch_size"])
+            if not outcomes:
+                # Events that arrived before their job's uuid was saved
+                outcomes = apply_orphaned_events(batch_size=options["batch_size"])
+            if outcomes:
+                summary = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(outcomes.items()))
+                self.stdout.write(f"Processed {sum(outcomes.values())} webhook events ({summary})")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
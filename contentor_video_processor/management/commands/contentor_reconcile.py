@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contentor_video_processor.reconcile import reconcile_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Polls the status of processing jobs whose webhooks didn't arrive, applies their changes "
+        "and retries failed submissions. Run it periodically, one instance at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=1000, help="Jobs retried and polled per pass.")
+        parser.add_argument("--loop", action="store_true", help="Keep running passes instead of exiting.")
+        parser.add_argument(
+            "--interval", type=float, default=60.0, help="Seconds to sleep between passes (with --loop)."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            actions = reconcile_requests(limit=options["limit"])
+            if actions:
+                summary = ", ".join(f"{action}: {count}" for action, count in sorted(actions.items()))
+                self.stdout.write(f"Reconciled processing jobs ({summary})")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
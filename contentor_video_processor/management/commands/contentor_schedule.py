@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contentor_video_processor.models import get_video_processing_request_model
+from contentor_video_processor.scheduling import submit_scheduled_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Submits the processing jobs queued with CONTENTOR_SCHEDULER by priority, "
+        "keeping at most CONTENTOR_SCHEDULER_MAX_IN_FLIGHT of them unfinished."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep submitting jobs instead of exiting.")
+        parser.add_argument(
+            "--interval", type=float, default=5.0, help="Seconds to sleep between passes (with --loop)."
+        )
+
+    def handle(self, *args, **options):
+        priorities = dict(get_video_processing_request_model().PRIORITY_CHOICES)
+        while True:
+            submitted = submit_scheduled_requests()
+            if submitted:
+                summary = ", ".join(
+                    f"{priorities.get(priority, priority).lower()}: {count}" for priority, count in sorted(submitted.items())
+                )
+                self.stdout.write(f"Submitted {sum(submitted.values())} jobs ({summary})")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,41 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contentor_video_processor.webhooks import sign_webhook_batch, sign_webhook_payload
+
+
+class Command(BaseCommand):
+    help = (
+        "Signs webhook payloads with CONTENTOR_VIDEO_PROCESSING_ACCESS_TOKEN so the webhook endpoints "
+        "can be exercised without the remote service. Reads a JSON payload (or a list of payloads with --batch)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="JSON file to sign, defaults to stdin.")
+        parser.add_argument(
+            "--batch", action="store_true", help="Sign a list of payloads for the batch webhook endpoint."
+        )
+        parser.add_argument("--token", help="Token to sign with instead of the configured access token.")
+
+    def handle(self, *args, **options):
+        if options["path"]:
+            with open(options["path"]) as f:
+                content = f.read()
+        else:
+            content = sys.stdin.read()
+
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise CommandError(f"Invalid JSON: {e}")
+
+        if options["batch"]:
+            if not isinstance(data, list):
+                raise CommandError("--batch expects a JSON list of payloads")
+            body, signature = sign_webhook_batch(data, token=options["token"])
+            self.stderr.write(f"X-Contentor-Signature: {signature}")
+        else:
+            body = sign_webhook_payload(data, token=options["token"])
+        self.stdout.write(body.decode("utf-8"))
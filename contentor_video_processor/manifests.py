@@ -0,0 +1,126 @@
+import logging
+import math
+
+from django.core.cache import caches
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.mp4 import MP4Error, open_range_reader, read_segment_index
+from contentor_video_processor.renditions import get_rendition_state, get_video_quality_file
+
+logger = logging.getLogger(__name__)
+
+HLS_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+
+
+def get_manifest_cache():
+    alias = get_config().manifest_cache
+    if not alias:
+        return None
+    return caches[alias]
+
+
+def make_variants_cache_key(video_id):
+    return f"contentor:manifest-variants:{video_id}"
+
+
+def invalidate_manifests(video_ids):
+    """
+    Drops the cached manifests of videos whose renditions changed.
+    """
+    cache = get_manifest_cache()
+    if cache is not None:
+        cache.delete_many([make_variants_cache_key(video_id) for video_id in video_ids])
+
+
+def read_variant(field_file):
+    """
+    Reads the segment index of a rendition, or returns None when it can't be streamed over HLS.
+    """
+    try:
+        reader = open_range_reader(field_file.storage, field_file.name)
+        try:
+            index = read_segment_index(reader)
+        finally:
+            reader.close()
+    except (MP4Error, OSError) as e:
+        logger.info("Rendition %s is not streamable over HLS: %s", field_file.name, e)
+        return None
+
+    segments = index["segments"]
+    duration = sum(segment[2] for segment in segments)
+    if not duration:
+        return None
+    return {
+        "name": field_file.name,
+        "init_size": index["init_size"],
+        "segments": segments,
+        "duration": duration,
+        "bandwidth": int(math.ceil(max(size * 8 / (seconds or duration) for _, size, seconds in segments))),
+        "average_bandwidth": int(math.ceil(sum(segment[1] for segment in segments) * 8 / duration)),
+        "width": index["width"],
+        "height": index["height"],
+    }
+
+
+def get_rendition_variants(video):
+    """
+    Returns the ready renditions of a video that can be streamed over HLS, ordered by bandwidth.
+
+    Only fragmented MP4 renditions with a segment index (`sidx`) qualify: their fragments are
+    served as byte ranges of the rendition file. Each variant is a dict with the quality, storage
+    name, initialization segment size, segments, peak and average bandwidth (bits per second),
+    dimensions and duration. Variants are cached per video until one of its renditions completes.
+    """
+    cache = get_manifest_cache()
+    key = make_variants_cache_key(video.pk)
+    if cache is not None:
+        variants = cache.get(key)
+        if variants is not None:
+            return variants
+
+    variants = []
+    for quality in get_rendition_state(video)["ready"]:
+        variant = read_variant(get_video_quality_file(video, quality))
+        if variant is not None:
+            variants.append({"quality": quality, **variant})
+
+    variants.sort(key=lambda variant: variant["bandwidth"])
+    if cache is not None:
+        cache.set(key, variants, get_config().manifest_cache_timeout)
+    return variants
+
+
+def build_master_playlist(variants, media_playlist_url):
+    """
+    Builds an HLS master playlist. `media_playlist_url` maps a quality to the URL of its media playlist.
+    """
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for variant in variants:
+        attributes = f"BANDWIDTH={variant['bandwidth']},AVERAGE-BANDWIDTH={variant['average_bandwidth']}"
+        if variant["width"] and variant["height"]:
+            attributes += f",RESOLUTION={variant['width']}x{variant['height']}"
+        lines.append(f"#EXT-X-STREAM-INF:{attributes}")
+        lines.append(media_playlist_url(variant["quality"]))
+    return "\n".join(lines) + "\n"
+
+
+def build_media_playlist(variant, url):
+    """
+    Builds an HLS media playlist of a fragmented rendition. The initialization segment
+    (`ftyp` and `moov`) and each fragment are byte ranges of the single rendition file.
+    """
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{int(math.ceil(max(segment[2] for segment in variant['segments'])))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        f'#EXT-X-MAP:URI="{url}",BYTERANGE="{variant["init_size"]}@0"',
+    ]
+    for offset, size, duration in variant["segments"]:
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(f"#EXT-X-BYTERANGE:{size}@{offset}")
+        lines.append(url)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+from contentor_video_processor.conf import get_config
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range_header(header, size):
+    """
+    Parses a single-range `Range` header against a file of `size` bytes.
+
+    Returns (start, end) with an inclusive end, None when the header is absent or should
+    be ignored (multiple ranges, other units), or False when the range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffix range: the last `end` bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of a file starting at `start`.
+
+    It keeps `fileno()` so WSGI servers with a `wsgi.file_wrapper` (gunicorn, uWSGI)
+    can hand the transfer to os.sendfile, bounded by the Content-Length of the response.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        self.file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def has_media_permission(request, video, quality):
+    """
+    Runs the check configured in CONTENTOR_MEDIA_PERMISSION, a dotted path to a callable
+    taking (request, video, quality). Without it any authenticated user may watch.
+    """
+    path = get_config().media_permission
+    if not path:
+        return True
+    return import_string(path)(request, video, quality)
+
+
+def get_storage_path(field_file):
+    try:
+        return field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return None
+
+
+def serve_media_file(request, field_file):
+    """
+    Serves a file of a local storage once the request has been authorized.
+
+    Depending on CONTENTOR_MEDIA_SERVER the transfer is handed to nginx ("nginx", X-Accel-Redirect
+    to CONTENTOR_MEDIA_ACCEL_PREFIX) or Apache/lighttpd ("sendfile", X-Sendfile); by default it is
+    served by Django with support for byte ranges. Files of remote storages, which the web server can't
+    read, are always redirected to their (signed) URL.
+    """
+    config = get_config()
+    server = config.media_server
+    content_type = mimetypes.guess_type(field_file.name)[0] or "application/octet-stream"
+
+    path = get_storage_path(field_file)
+    if path is None:
+        return HttpResponseRedirect(field_file.url)
+
+    if server == "nginx":
+        prefix = config.media_accel_prefix
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(field_file.name.lstrip("/"))
+        patch_cache_control(response, private=True)
+        return response
+
+    if server == "sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        patch_cache_control(response, private=True)
+        return response
+
+    if not os.path.exists(path):
+        return HttpResponse("File not found", status=404)
+
+    size = os.path.getsize(path)
+    byte_range = parse_range_header(request.headers.get("Range"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(file, start, length), status=206, content_type=content_type)
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    patch_cache_control(response, private=True)
+    return response
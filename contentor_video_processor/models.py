@@ -1,17 +1,30 @@
+import datetime
+import logging
 from urllib.parse import urlparse, unquote
 
 import boto3
 import requests
 from django.apps import apps
-from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
 from contentor_video_processor.fields import FormResumableFileField
-from contentor_video_processor.functions import process_video, get_webhook_url, replace_file_format
+from contentor_video_processor.functions import (
+    get_encoding_params,
+    get_processing_priority,
+    get_submit_retry_delay,
+    get_webhook_url,
+    process_video,
+    replace_file_format,
+)
 from contentor_video_processor.widgets import ResumableAdminWidget
 
+logger = logging.getLogger(__name__)
+
 
 def get_s3_client(access_key, secret_key, endpoint_url=None):
     s3_args = {
@@ -23,7 +36,7 @@ def get_s3_client(access_key, secret_key, endpoint_url=None):
     if endpoint_url:
         s3_args["endpoint_url"] = endpoint_url
 
-    return boto3.client("s3", **s3_args)
+    return instrumentation.instrument_s3_client(boto3.client("s3", **s3_args))
 
 
 class AsyncFileField(models.FileField):
@@ -41,7 +54,7 @@ class AsyncFileField(models.FileField):
 class ContentorVideoField(AsyncFileField):
     def __init__(self, *args, allowed_formats=None, resolutions=None, **kwargs):
         self.allowed_formats = allowed_formats or []  # Empty = allow anything
-        self.resolutions = resolutions or settings.CONTENTOR_VIDEO_PROCESSING_CONFIG.get("resolutions", ["original"])
+        self.resolutions = resolutions or get_config().resolutions
         super().__init__(*args, **kwargs)
 
     def clean(self, value, model_instance):
@@ -56,6 +69,10 @@ class ContentorVideoField(AsyncFileField):
 
 
 class ContentorVideoModelMixin(models.Model):
+    # Container metadata of the uploaded original and the resolutions chosen for it, see plan_rendition_ladder
+    source_metadata = models.JSONField(default=dict, blank=True, editable=False)
+    rendition_ladder = models.JSONField(default=list, blank=True, editable=False)
+
     class Meta:
         abstract = True
 
@@ -77,13 +94,12 @@ class ContentorVideoModelMixin(models.Model):
         video_url = video_field.url
         video_parsed = urlparse(video_url)
 
-        aws_location = getattr(settings, "AWS_LOCATION", None)
+        contentor_config = get_config()
+        aws_location = contentor_config.aws_location
         original_path = f"{aws_location}/{video_field.name}" if aws_location else video_field.name
 
-
-        # Get configuration
-        contentor_config = getattr(settings, "CONTENTOR_VIDEO_PROCESSING_CONFIG", {})
-        resolutions = contentor_config.get("resolutions", ["original"])
+        # Only the resolutions planned for this source, when it was planned
+        resolutions = self.rendition_ladder or contentor_config.resolutions
 
         video_processing_request_model = get_video_processing_request_model()
 
@@ -118,15 +134,14 @@ class ContentorVideoModelMixin(models.Model):
                             resolution_field.name = video_field.name.replace("original", resolution)
                             self.save(update_fields=[resolution_field_name], skip_processing=True)
 
-                resolution = contentor_config.get("original_resolution",
-                                                  "1080p") if resolution == "original" else resolution
+                resolution = contentor_config.quality_resolutions.get(resolution, resolution)
 
                 # Create or update processing request with skip_process=True
                 if existing_request:
                     # Update existing request if needed
                     if existing_request.status != "completed":
                         existing_request.status = "completed"
-                        existing_request.save(skip_process=True)
+                        existing_request.save(update_fields=["status", "updated_at"], skip_process=True)
                 else:
                     # First create the instance without saving
                     video_processing_request = video_processing_request_model(
@@ -135,10 +150,9 @@ class ContentorVideoModelMixin(models.Model):
                         download_url=download_url,
                         upload_url=upload_url,
                         output_file_size_mb=output_file_size_mb,
-                        download_provider=contentor_config.get("download_provider", "aws"),
-                        upload_provider=contentor_config.get("upload_provider", "aws"),
-                        webhook_url=getattr(settings, "CONTENTOR_WEBHOOK_URL", get_webhook_url()),
-                        history={},
+                        download_provider=contentor_config.download_provider,
+                        upload_provider=contentor_config.upload_provider,
+                        webhook_url=get_webhook_url(),
                         status="completed",
                     )
                     # Then save it with skip_process=True
@@ -153,12 +167,16 @@ class ContentorVideoModelMixin(models.Model):
                         resolution=resolution,
                         download_url=download_url,
                         upload_url=upload_url,
-                        download_provider=contentor_config.get("download_provider", "aws"),
-                        upload_provider=contentor_config.get("upload_provider", "aws"),
-                        webhook_url=getattr(settings, "CONTENTOR_WEBHOOK_URL", get_webhook_url()),
-                        history={},
+                        download_provider=contentor_config.download_provider,
+                        upload_provider=contentor_config.upload_provider,
+                        webhook_url=get_webhook_url(),
+                        priority=video_processing_request_model.PRIORITY_SYNC,
                     )
 
+        from contentor_video_processor.manifests import invalidate_manifests
+
+        invalidate_manifests([self.pk])
+
     def _check_file_exists(self, path):
         """
         Check if a file exists in S3 using direct boto3 client
@@ -170,10 +188,11 @@ class ContentorVideoModelMixin(models.Model):
             s3_key = path.lstrip("/")
 
             # Get AWS credentials from settings
-            aws_access_key = getattr(settings, 'AWS_ACCESS_KEY_ID', None)
-            aws_secret_key = getattr(settings, 'AWS_SECRET_ACCESS_KEY', None)
-            aws_bucket_name = getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None)
-            aws_endpoint = getattr(settings, 'AWS_S3_ENDPOINT_URL', None)
+            config = get_config()
+            aws_access_key = config.aws_access_key_id
+            aws_secret_key = config.aws_secret_access_key
+            aws_bucket_name = config.aws_storage_bucket_name
+            aws_endpoint = config.aws_s3_endpoint_url
 
             if not all([aws_access_key, aws_secret_key, aws_bucket_name]):
                 return False
@@ -200,11 +219,10 @@ class ContentorVideoModelMixin(models.Model):
             if e.response['Error']['Code'] == '404':
                 return False
             # For other errors, log and return False
-            print(f"Error checking file existence: {e}")
+            logger.warning("Error checking file existence: %s", e)
             return False
         except Exception as e:
-            # Log the error if needed
-            print(f"Error checking file existence: {e}")
+            logger.warning("Error checking file existence: %s", e)
             return False
 
     def sync_selected_videos(self, video_queryset=None):
@@ -225,6 +243,37 @@ class ContentorVideoModelMixin(models.Model):
                 return field.name
         return None
 
+    def plan_rendition_ladder(self, video_field):
+        """
+        Probes the uploaded original (reading only its moov atom, unless it was probed while
+        it was uploaded) and records its metadata
+        and the resolutions worth processing for it on the instance.
+        """
+        from contentor_video_processor.renditions import get_source_metadata, plan_rendition_ladder
+
+        source_metadata = {}
+        if get_config().ladder_planning:
+            try:
+                source_metadata = get_source_metadata(video_field)
+            except Exception as e:
+                logger.warning("Could not probe %s, processing every resolution: %s", video_field.name, e)
+
+        self.source_metadata = source_metadata
+        self.rendition_ladder = plan_rendition_ladder(source_metadata)
+        # Saving through the queryset doesn't trigger processing again
+        type(self).objects.filter(pk=self.pk).update(
+            source_metadata=self.source_metadata, rendition_ladder=self.rendition_ladder
+        )
+        return self.rendition_ladder
+
+    def get_download_url(self, video_field):
+        """
+        URL the processor downloads the original from, without any signature.
+        """
+        video_parsed = urlparse(video_field.url)
+        original_path = unquote(video_parsed.path)
+        return f"{video_parsed.scheme}://{video_parsed.netloc}{original_path}"
+
     def create_video_processing_objects(self):
         video_field_name = self.get_video_file_field()
         if not video_field_name:
@@ -233,50 +282,56 @@ class ContentorVideoModelMixin(models.Model):
         video_field = getattr(self, video_field_name)
         if not video_field:
             return
-        video_url = video_field.url
+        download_url = self.get_download_url(video_field)
 
-        video_parsed = urlparse(video_url)
-        original_path = unquote(video_parsed.path)
-        download_url = f"{video_parsed.scheme}://{video_parsed.netloc}{original_path}"
+        from contentor_video_processor.renditions import sort_qualities
 
-        contentor_config = getattr(settings, "CONTENTOR_VIDEO_PROCESSING_CONFIG", {})
-        resolutions = contentor_config.get("resolutions", ["original"])
+        contentor_config = get_config()
+        # Lowest resolutions first, they finish soonest and make the video playable early
+        resolutions = sort_qualities(self.plan_rendition_ladder(video_field))
+        # Known before the processor reports back, the webhook overwrites them on completion
+        source_duration = self.source_metadata.get("duration")
+        source_metadata = {"source": self.source_metadata} if self.source_metadata else {}
+        encoding_params = get_encoding_params()
+        video_processing_request_model = get_video_processing_request_model()
+        priority = get_processing_priority()
 
-        for resolution in resolutions:
+        for index, resolution in enumerate(resolutions):
             # If resolution is not 'original', modify the upload URL
             if resolution == "original":
                 upload_url = download_url
-                resolution = contentor_config.get("original_resolution", "1080p")
+                resolution = contentor_config.original_resolution
             else:
                 upload_url = download_url.replace("original", resolution)
 
             upload_url = replace_file_format(upload_url, "mp4")
 
-            video_processing_request_model = get_video_processing_request_model()
-            object = video_processing_request_model.objects.create(
+            video_processing_request_model.objects.create(
                 video=self,
                 resolution=resolution,
                 download_url=download_url,
                 upload_url=upload_url,
-                download_provider=contentor_config.get("download_provider", "aws"),
-                upload_provider=contentor_config.get("upload_provider", "aws"),
-                webhook_url=getattr(settings, "CONTENTOR_WEBHOOK_URL", get_webhook_url()),
-                history={},
+                download_provider=contentor_config.download_provider,
+                upload_provider=contentor_config.upload_provider,
+                webhook_url=get_webhook_url(),
+                video_duration=source_duration,
+                metadata=source_metadata,
+                encoding_params=encoding_params,
+                priority=priority if priority is not None else (
+                    # The lowest resolution of an upload makes it playable, it goes first
+                    video_processing_request_model.PRIORITY_PLAYABLE
+                    if index == 0
+                    else video_processing_request_model.PRIORITY_INTERACTIVE
+                ),
             )
 
-            if resolution:
-                object.resolution = resolution
-                object.save(update_fields=["resolution"])
-
     def get_video_resolution_table_html(self):
-        resolutions = ["original", "720p", "480p", "360p"]
+        contentor_config = get_config()
+        resolutions = contentor_config.resolutions
         cells = []
 
-        contentor_config = getattr(settings, "CONTENTOR_VIDEO_PROCESSING_CONFIG", {})
-
         for res in resolutions:
-            # Map 'original' to None if your model stores it that way
-            resolution_key = contentor_config.get("original_resolution", "1080p") if res == "original" else res
+            resolution_key = contentor_config.quality_resolutions[res]
 
             request = (
                 VideoProcessingRequest.objects
@@ -298,10 +353,7 @@ class ContentorVideoModelMixin(models.Model):
         html = f"""
         <table border="1" style="border-collapse: collapse;">
             <tr>
-                <th>Original</th>
-                <th>720p</th>
-                <th>480p</th>
-                <th>360p</th>
+                {''.join(f"<th>{'Original' if res == 'original' else res}</th>" for res in resolutions)}
             </tr>
             <tr>
                 {''.join(cells)}
@@ -315,7 +367,8 @@ class ContentorVideoModelMixin(models.Model):
         video_field = self.get_video_file_field()
         file_has_changed = False
 
-        if self.pk and video_field:
+        # Saves that never trigger processing don't need to know whether the file changed
+        if self.pk and video_field and not skip_processing:
             old = self.__class__.objects.get(pk=self.pk)
             file_has_changed = getattr(old, video_field) != getattr(self, video_field)
 
@@ -374,13 +427,22 @@ class ContentorVideoModel(ContentorVideoModelMixin, models.Model, metaclass=Cont
 
 
 class AbstractVideoProcessingRequest(models.Model):
-    uuid = models.UUIDField(blank=True, null=True, editable=False)
+    uuid = models.UUIDField(blank=True, null=True, editable=False, db_index=True)
     video = models.ForeignKey(
-        settings.CONTENTOR_VIDEO_MODEL, related_name="processing_jobs", on_delete=models.CASCADE
+        get_config().video_model, related_name="processing_jobs", on_delete=models.CASCADE
     )
     output_file_size_mb = models.FloatField(verbose_name="Output File Size (MB)", null=True, blank=True)
     video_duration = models.FloatField(verbose_name="Duration (seconds)", null=True, blank=True)
     metadata = models.JSONField(default=dict)
+    # Encoding options the job was submitted with, see get_encoding_params
+    encoding_params = models.JSONField(default=dict, blank=True, editable=False)
+    campaign = models.ForeignKey(
+        get_config().requests_app + ".ReprocessingCampaign",
+        related_name="processing_requests",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
 
     RESOLUTION_CHOICES = [
         ("2160p", "2160p (4K)"),
@@ -401,41 +463,259 @@ class AbstractVideoProcessingRequest(models.Model):
 
     webhook_url = models.URLField(max_length=500, blank=True, null=True)
 
-    history = models.JSONField(default=dict, blank=True)
+    # Status history written before events were stored in their own table, see `history`
+    legacy_history = models.JSONField(default=dict, blank=True, db_column="history")
     status = models.CharField(max_length=50, default="pending")
+    last_event_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # When the job was submitted and first reported in each status, for the latency analytics
+    submitted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    processing_at = models.DateTimeField(null=True, blank=True, editable=False)
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    failed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Status -> field holding when the job reached it
+    TRANSITION_FIELDS = {
+        "processing": "processing_at",
+        "completed": "completed_at",
+        "failed": "failed_at",
+    }
+
+    # Position of each status in the job lifecycle, used to drop out-of-order webhooks
+    STATUS_ORDER = {
+        "pending": 0,
+        "queued": 0,
+        "processing": 1,
+        "completed": 2,
+        "failed": 2,
+    }
+
+    # Lower is sooner. Jobs are submitted in `scheduled_for` order, their creation time delayed by
+    # CONTENTOR_SCHEDULER_AGING seconds per priority point, so waiting jobs overtake newer urgent ones
+    # after a while and are never starved. See scheduling.py
+    PRIORITY_PLAYABLE = 0
+    PRIORITY_INTERACTIVE = 10
+    PRIORITY_SYNC = 20
+    PRIORITY_BACKFILL = 30
+    PRIORITY_CHOICES = [
+        (PRIORITY_PLAYABLE, "Playable"),
+        (PRIORITY_INTERACTIVE, "Interactive"),
+        (PRIORITY_SYNC, "Sync"),
+        (PRIORITY_BACKFILL, "Backfill"),
+    ]
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_INTERACTIVE)
+    scheduled_for = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Submissions made so far and when a failed one is retried, see reconcile.py
+    submit_attempts = models.PositiveIntegerField(default=0, editable=False)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        verbose_name = settings.CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME
-        verbose_name_plural = settings.CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME_PLURAL
+        verbose_name = get_config().request_verbose_name
+        verbose_name_plural = get_config().request_verbose_name_plural
         abstract = True
+        indexes = [
+            models.Index(fields=["resolution", "completed_at"], name="%(app_label)s_vpr_res_completed"),
+            models.Index(fields=["video", "created_at"], name="%(app_label)s_vpr_video_created"),
+            models.Index(fields=["status", "updated_at"], name="%(app_label)s_vpr_status_updated"),
+            models.Index(fields=["status", "scheduled_for"], name="%(app_label)s_vpr_status_sched"),
+        ]
 
     def __str__(self):
         return f"Processing Job for Video {self.video_id} [{self.id}]"
 
+    @property
+    def history(self):
+        """
+        Status history as a {timestamp: status} mapping, built from the processing events.
+        Use `prefetch_related("events")` when reading it for many requests.
+        """
+        history = dict(self.legacy_history or {})
+        if self.pk:
+            # Sorted in Python so prefetched events are used as they are
+            events = sorted(self.events.all(), key=lambda event: (event.occurred_at is not None, event.occurred_at, event.pk))
+            for event in events:
+                history[event.timestamp] = event.status
+        return history
+
     def process_video(self):
         self.uuid = process_video(
             download_url=self.download_url,
             upload_url=self.upload_url,
             resolution=self.resolution,
+            encoding_params=self.encoding_params or None,
         )
-        self.save(update_fields=["uuid"], skip_process=True)  # Only updates the uuid field
+        self.submit_attempts += 1
+        if self.uuid:
+            self.submitted_at = timezone.now()
+            self.next_attempt_at = None
+        else:
+            # Retried by the `contentor_reconcile` command
+            self.next_attempt_at = timezone.now() + get_submit_retry_delay(self.submit_attempts)
+        self.save(
+            update_fields=["uuid", "submitted_at", "submit_attempts", "next_attempt_at"], skip_process=True
+        )  # Only updates these fields
+        if self.uuid:
+            from contentor_video_processor.webhooks import apply_orphaned_events
+
+            # Webhooks may arrive before the uuid is saved, they wait as orphaned events
+            job_uuid = self.uuid
+            transaction.on_commit(lambda: apply_orphaned_events(uuids={job_uuid}))
 
     def save(self, skip_process=False, *args, **kwargs):
+        if self.scheduled_for is None:
+            aging = datetime.timedelta(seconds=self.priority * get_config().scheduler_aging)
+            self.scheduled_for = (self.created_at or timezone.now()) + aging
         super().save(*args, **kwargs)
-        if not self.uuid and not skip_process:
+        # With CONTENTOR_SCHEDULER the job waits for the `contentor_schedule` command
+        if not self.uuid and not skip_process and not get_config().scheduler:
             self.process_video()
 
 
+class AbstractReprocessingCampaign(models.Model):
+    """
+    Re-encoding of the existing videos matching `video_filter` with new encoding options.
+
+    Videos are submitted in batches, in primary key order from the `cursor` of the last batch,
+    with at most `max_in_flight` of the campaign's jobs unfinished at a time. See campaigns.py.
+    """
+    name = models.CharField(max_length=100)
+    # Lookups of the video queryset, e.g. {"created_at__lt": "2024-01-01"}
+    video_filter = models.JSONField(default=dict, blank=True)
+    # Qualities to re-encode ('original', '720p', ...), all the processed ones when empty
+    resolutions = models.JSONField(default=list, blank=True)
+    # Overrides of the encoding options of CONTENTOR_VIDEO_PROCESSING_CONFIG
+    encoding_params = models.JSONField(default=dict, blank=True)
+    max_in_flight = models.PositiveIntegerField(default=20)
+    batch_size = models.PositiveIntegerField(default=50)
+
+    STATUS_CHOICES = [
+        ("active", "Active"),
+        ("paused", "Paused"),
+        ("completed", "Completed"),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    # Primary key of the last video submitted
+    cursor = models.CharField(max_length=255, blank=True, default="", editable=False)
+    videos_done = models.PositiveIntegerField(default=0, editable=False)
+    jobs_submitted = models.PositiveIntegerField(default=0, editable=False)
+    jobs_skipped = models.PositiveIntegerField(default=0, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"Reprocessing campaign {self.name} [{self.id}]"
+
+
+class AbstractVideoProcessingWebhookEvent(models.Model):
+    """
+    A webhook delivery exactly as received from Contentor.
+
+    The webhook endpoint only verifies the signature and stores the event here,
+    applying it to its processing request happens afterwards in batches.
+    A delivery is identified by (uuid, timestamp, status) so retried deliveries are stored once.
+    """
+    uuid = models.UUIDField(db_index=True)
+    status = models.CharField(max_length=50)
+    timestamp = models.CharField(max_length=64)
+    occurred_at = models.DateTimeField(null=True, blank=True)
+    payload = models.JSONField(default=dict)
+
+    OUTCOME_CHOICES = [
+        ("applied", "Applied"),
+        ("stale", "Stale"),
+        ("orphaned", "Orphaned"),
+    ]
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, blank=True, default="")
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=["uuid", "timestamp", "status"],
+                name="%(app_label)s_%(class)s_unique_delivery",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Webhook {self.status} for job {self.uuid} at {self.timestamp}"
+
+
+class AbstractVideoProcessingEvent(models.Model):
+    """
+    A status change applied to a processing request. Rows are only ever inserted.
+    """
+    request = models.ForeignKey(
+        get_config().requests_app + ".VideoProcessingRequest",
+        related_name="events",
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(max_length=50)
+    timestamp = models.CharField(max_length=64)
+    occurred_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(fields=["request", "occurred_at"], name="%(app_label)s_vpe_request_occ"),
+            models.Index(fields=["status", "occurred_at"], name="%(app_label)s_vpe_status_occ"),
+        ]
+
+    def __str__(self):
+        return f"{self.status} for request {self.request_id} at {self.timestamp}"
+
+
+def get_video_model():
+    return apps.get_model(get_config().video_model)
+
+
 def get_video_processing_request_model():
-    app_label = settings.CONTENTOR_VIDEO_PROCESSING_REQUESTS_APP
+    app_label = get_config().requests_app
     return apps.get_model(app_label, "VideoProcessingRequest")
 
 
+def get_video_processing_event_model():
+    app_label = get_config().requests_app
+    return apps.get_model(app_label, "VideoProcessingEvent")
+
+
+def get_video_processing_webhook_event_model():
+    app_label = get_config().requests_app
+    return apps.get_model(app_label, "VideoProcessingWebhookEvent")
+
+
+def get_reprocessing_campaign_model():
+    app_label = get_config().requests_app
+    return apps.get_model(app_label, "ReprocessingCampaign")
+
+
 class VideoProcessingRequest(AbstractVideoProcessingRequest):
-    class Meta:
-        app_label = settings.CONTENTOR_VIDEO_PROCESSING_REQUESTS_APP
-        verbose_name = settings.CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME
-        verbose_name_plural = settings.CONTENTOR_PROCESSING_REQUEST_MODEL_VERBOSE_NAME_PLURAL
+    class Meta(AbstractVideoProcessingRequest.Meta):
+        app_label = get_config().requests_app
+        verbose_name = get_config().request_verbose_name
+        verbose_name_plural = get_config().request_verbose_name_plural
+
+
+class VideoProcessingEvent(AbstractVideoProcessingEvent):
+    class Meta(AbstractVideoProcessingEvent.Meta):
+        app_label = get_config().requests_app
+
+
+class VideoProcessingWebhookEvent(AbstractVideoProcessingWebhookEvent):
+    class Meta(AbstractVideoProcessingWebhookEvent.Meta):
+        app_label = get_config().requests_app
+
+
+class ReprocessingCampaign(AbstractReprocessingCampaign):
+    class Meta(AbstractReprocessingCampaign.Meta):
+        app_label = get_config().requests_app
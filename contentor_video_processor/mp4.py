@@ -0,0 +1,520 @@
+"""
+Minimal MP4/MOV (ISO BMFF / QuickTime) box parser.
+
+Only the box headers at the top level and the `moov` atom are read, through ranged reads,
+so the metadata of a large file is available after a few small requests without ffmpeg.
+"""
+import struct
+
+# moov atoms larger than this are not read, a sane file never gets close
+MAX_MOOV_SIZE = 256 * 1024 * 1024
+READ_AHEAD = 64 * 1024
+
+
+class MP4Error(Exception):
+    pass
+
+
+class RangeReader:
+    """
+    Reads byte ranges of a file of known size. Small reads are served from read-ahead
+    blocks, so walking the top-level box headers and reading `ftyp` and `moov` typically
+    costs one request for the head of the file and one for its tail.
+    """
+
+    max_blocks = 2
+
+    def __init__(self, size):
+        self.size = size
+        self._blocks = []
+
+    def read_range(self, offset, length):
+        raise NotImplementedError
+
+    def read(self, offset, length):
+        length = min(length, self.size - offset)
+        if length <= 0:
+            return b""
+        for block_start, block in self._blocks:
+            if block_start <= offset and offset + length <= block_start + len(block):
+                return block[offset - block_start:offset - block_start + length]
+        if length >= READ_AHEAD:
+            return self.read_range(offset, length)
+        block = self.read_range(offset, min(READ_AHEAD, self.size - offset))
+        self._blocks = [(offset, block)] + self._blocks[:self.max_blocks - 1]
+        return block[:length]
+
+    def close(self):
+        pass
+
+
+class FileRangeReader(RangeReader):
+    """
+    Reads ranges of a local or otherwise seekable file object.
+    """
+
+    def __init__(self, file, size=None, close=False):
+        if size is None:
+            file.seek(0, 2)
+            size = file.tell()
+        super().__init__(size)
+        self.file = file
+        self._close = close
+
+    def read_range(self, offset, length):
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def close(self):
+        if self._close:
+            self.file.close()
+
+
+class S3RangeReader(RangeReader):
+    """
+    Reads ranges of an S3 object with `get_object(Range=...)`.
+    """
+
+    def __init__(self, client, bucket, key, size=None):
+        if size is None:
+            size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        super().__init__(size)
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+
+    def read_range(self, offset, length):
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.key, Range=f"bytes={offset}-{offset + length - 1}"
+        )
+        return response["Body"].read()
+
+
+def open_range_reader(storage, name, size=None):
+    """
+    Returns a RangeReader for a file of a storage: a local file when the storage has paths,
+    ranged GETs for django-storages' S3 storage, the storage's file object otherwise.
+    The file's `size` is looked up unless given.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path:
+        return FileRangeReader(open(path, "rb"), size=size, close=True)
+
+    bucket = getattr(storage, "bucket", None)
+    if bucket is not None and hasattr(storage, "_normalize_name"):
+        from storages.utils import clean_name
+
+        key = storage._normalize_name(clean_name(name))
+        return S3RangeReader(storage.connection.meta.client, bucket.name, key, size)
+
+    return FileRangeReader(storage.open(name, "rb"), size=storage.size(name) if size is None else size, close=True)
+
+
+def parse_box_header(data, offset=0, end=None):
+    """
+    Returns (type, size, header_size) of the box at `offset` of `data`.
+    A size of 0 means the box extends to `end`.
+    """
+    if len(data) < offset + 8:
+        raise MP4Error("Truncated box header")
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header_size = 8
+    if size == 1:
+        if len(data) < offset + 16:
+            raise MP4Error("Truncated box header")
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header_size = 16
+    elif size == 0:
+        if end is None:
+            raise MP4Error("Box extends to the end of an unknown length")
+        size = end - offset
+    if size < header_size:
+        raise MP4Error(f"Invalid size {size} for box {box_type!r}")
+    return box_type, size, header_size
+
+
+def iter_boxes(data, start=0, end=None):
+    """
+    Yields (type, offset, size, header_size) of the boxes of `data` between `start` and `end`.
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        box_type, size, header_size = parse_box_header(data, offset, end)
+        if offset + size > end:
+            raise MP4Error(f"Box {box_type!r} overruns its parent")
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def read_top_level_boxes(reader):
+    """
+    Returns the top-level boxes of a file as a list of (type, offset, size, header_size),
+    reading only their headers.
+    """
+    boxes = []
+    offset = 0
+    while offset + 8 <= reader.size:
+        header = reader.read(offset, 16)
+        box_type, size, header_size = parse_box_header(header, 0, reader.size - offset)
+        boxes.append((box_type, offset, size, header_size))
+        offset += size
+    return boxes
+
+
+def find_box(data, path, start=0, end=None):
+    """
+    Returns (offset, size, header_size) of the first box matching `path` (e.g. [b"trak", b"tkhd"]).
+    """
+    for box_type, offset, size, header_size in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return offset, size, header_size
+            found = find_box(data, path[1:], offset + header_size, offset + size)
+            if found:
+                return found
+    return None
+
+
+def _fixed_16_16(value):
+    return value / 65536
+
+
+def parse_mvhd(data, offset):
+    version = data[offset]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, offset + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, offset + 12)
+    return timescale, duration
+
+
+def parse_tkhd(data, offset):
+    """
+    Returns (width, height, rotation) of a track header.
+    """
+    version = data[offset]
+    matrix_offset = offset + (52 if version == 1 else 40)
+    a, b, _, c, d = struct.unpack_from(">iiiii", data, matrix_offset)
+    width, height = struct.unpack_from(">II", data, matrix_offset + 36)
+
+    rotation = 0
+    if a == 0 and b == 65536 and c == -65536:
+        rotation = 90
+    elif a == 0 and b == -65536 and c == 65536:
+        rotation = 270
+    elif a == -65536 and d == -65536:
+        rotation = 180
+    return int(_fixed_16_16(width)), int(_fixed_16_16(height)), rotation
+
+
+def parse_trak(data, offset, size, header_size):
+    """
+    Returns the handler type, codec, dimensions and duration of a track.
+    """
+    start, end = offset + header_size, offset + size
+    track = {}
+
+    tkhd = find_box(data, [b"tkhd"], start, end)
+    if tkhd:
+        track["width"], track["height"], track["rotation"] = parse_tkhd(data, tkhd[0] + tkhd[2])
+
+    mdhd = find_box(data, [b"mdia", b"mdhd"], start, end)
+    if mdhd:
+        timescale, duration = parse_mvhd(data, mdhd[0] + mdhd[2])
+        if timescale:
+            track["duration"] = duration / timescale
+
+    hdlr = find_box(data, [b"mdia", b"hdlr"], start, end)
+    if hdlr:
+        track["handler"] = data[hdlr[0] + hdlr[2] + 8:hdlr[0] + hdlr[2] + 12].decode("latin-1")
+
+    stsd = find_box(data, [b"mdia", b"minf", b"stbl", b"stsd"], start, end)
+    if stsd:
+        entries_offset = stsd[0] + stsd[2] + 8
+        if entries_offset + 8 <= stsd[0] + stsd[1]:
+            entry_type, entry_size, entry_header = parse_box_header(data, entries_offset)
+            track["codec"] = entry_type.decode("latin-1").strip()
+            if track.get("handler") == "vide" and entry_size >= entry_header + 28:
+                coded_width, coded_height = struct.unpack_from(">HH", data, entries_offset + entry_header + 24)
+                if not track.get("width") or not track.get("height"):
+                    track["width"], track["height"] = coded_width, coded_height
+    return track
+
+
+def parse_moov(data):
+    """
+    Parses the payload of a `moov` box (header excluded) into a dict with the duration and tracks.
+    """
+    info = {"tracks": []}
+    mvhd = find_box(data, [b"mvhd"])
+    if mvhd:
+        timescale, duration = parse_mvhd(data, mvhd[0] + mvhd[2])
+        if timescale:
+            info["duration"] = duration / timescale
+    for box_type, offset, size, header_size in iter_boxes(data):
+        if box_type == b"trak":
+            info["tracks"].append(parse_trak(data, offset, size, header_size))
+    return info
+
+
+def probe(reader):
+    """
+    Reads the container metadata of an MP4/MOV file.
+
+    Returns a dict with the duration (seconds), display width and height (rotation applied),
+    rotation, video and audio codecs, overall bitrate (bits per second), the major brand,
+    the file size and whether the file is faststart (`moov` before `mdat`).
+    Raises MP4Error when the file isn't an MP4/MOV file or its `moov` can't be read.
+    """
+    boxes = read_top_level_boxes(reader)
+    by_type = {}
+    for box_type, offset, size, header_size in boxes:
+        by_type.setdefault(box_type, (offset, size, header_size))
+
+    if b"moov" not in by_type:
+        raise MP4Error("No moov box found")
+    moov_offset, moov_size, moov_header = by_type[b"moov"]
+    if moov_size > MAX_MOOV_SIZE:
+        raise MP4Error(f"moov box too large ({moov_size} bytes)")
+
+    metadata = {"size": reader.size, "brand": None}
+    if b"ftyp" in by_type:
+        ftyp_offset, _, ftyp_header = by_type[b"ftyp"]
+        metadata["brand"] = reader.read(ftyp_offset + ftyp_header, 4).decode("latin-1").strip() or None
+
+    moov = parse_moov(reader.read(moov_offset + moov_header, moov_size - moov_header))
+    video = next((track for track in moov["tracks"] if track.get("handler") == "vide"), None)
+    audio = next((track for track in moov["tracks"] if track.get("handler") == "soun"), None)
+
+    duration = moov.get("duration") or (video or {}).get("duration")
+    metadata["duration"] = round(duration, 3) if duration else None
+    metadata["video_codec"] = video.get("codec") if video else None
+    metadata["audio_codec"] = audio.get("codec") if audio else None
+
+    width = height = None
+    rotation = 0
+    if video:
+        width, height, rotation = video.get("width"), video.get("height"), video.get("rotation", 0)
+        if rotation in (90, 270):
+            width, height = height, width
+    metadata.update({"width": width, "height": height, "rotation": rotation})
+
+    metadata["bitrate"] = int(reader.size * 8 / duration) if duration else None
+    mdat = by_type.get(b"mdat")
+    metadata["faststart"] = bool(mdat) and moov_offset < mdat[0]
+    return metadata
+
+
+def probe_file(storage, name):
+    """
+    Probes a file of a storage, see `probe`.
+    """
+    reader = open_range_reader(storage, name)
+    try:
+        return probe(reader)
+    finally:
+        reader.close()
+
+
+def parse_sidx(payload, anchor):
+    """
+    Returns the (offset, size, duration in seconds) of the subsegments indexed by a `sidx` box,
+    from its payload (header excluded). `anchor` is the offset of the first byte after the box,
+    which the subsegment offsets are relative to.
+    """
+    if len(payload) < 24:
+        raise MP4Error("Truncated sidx box")
+    version = payload[0]
+    timescale = struct.unpack_from(">I", payload, 8)[0]
+    if version == 1:
+        first_offset = struct.unpack_from(">Q", payload, 20)[0]
+        position = 28
+    else:
+        first_offset = struct.unpack_from(">I", payload, 16)[0]
+        position = 20
+    reference_count = struct.unpack_from(">H", payload, position + 2)[0]
+    position += 4
+    if not timescale:
+        raise MP4Error("sidx box without a timescale")
+    if len(payload) < position + 12 * reference_count:
+        raise MP4Error("Truncated sidx box")
+
+    segments = []
+    offset = anchor + first_offset
+    for index in range(reference_count):
+        reference, duration = struct.unpack_from(">II", payload, position + 12 * index)
+        if reference >> 31:
+            raise MP4Error("Hierarchical segment indexes are not supported")
+        size = reference & 0x7FFFFFFF
+        segments.append((offset, size, duration / timescale))
+        offset += size
+    return segments
+
+
+def read_segment_index(reader):
+    """
+    Reads the layout of a fragmented MP4 whose fragments are indexed by a `sidx` box, as DASH
+    on-demand and HLS fMP4 files are. Only the box headers up to the index, the `moov` box and
+    the index itself are read.
+
+    Returns a dict with `init_size`, the bytes in front of the index (the initialization segment,
+    holding `ftyp` and `moov`), `segments`, the (offset, size, duration in seconds) of the media
+    segments, and the display `width` and `height`. Raises MP4Error for other files: the samples
+    of a progressive MP4 can't be served as segments.
+    """
+    offset = 0
+    moov = None
+    while True:
+        if offset + 8 > reader.size:
+            raise MP4Error("No segment index (sidx) found")
+        box_type, size, header_size = parse_box_header(reader.read(offset, 16), 0, reader.size - offset)
+        if box_type == b"sidx":
+            break
+        if box_type in (b"moof", b"mdat"):
+            raise MP4Error("No segment index (sidx) in front of the media")
+        if box_type == b"moov":
+            moov = (offset, size, header_size)
+        offset += size
+
+    if moov is None:
+        raise MP4Error("No moov box found")
+    if moov[1] > MAX_MOOV_SIZE:
+        raise MP4Error(f"moov box too large ({moov[1]} bytes)")
+    moov_payload = reader.read(moov[0] + moov[2], moov[1] - moov[2])
+    if find_box(moov_payload, [b"mvex"]) is None:
+        raise MP4Error("Not a fragmented MP4")
+
+    segments = parse_sidx(reader.read(offset + header_size, size - header_size), offset + size)
+    if not segments or segments[-1][0] + segments[-1][1] > reader.size:
+        raise MP4Error("sidx box doesn't match the file")
+
+    video = next((track for track in parse_moov(moov_payload)["tracks"] if track.get("handler") == "vide"), {})
+    width, height = video.get("width"), video.get("height")
+    if video.get("rotation") in (90, 270):
+        width, height = height, width
+    return {"init_size": offset, "segments": segments, "width": width, "height": height}
+
+
+# Boxes on the path from moov to the chunk offset tables
+STBL_PATH_BOXES = {b"trak", b"mdia", b"minf", b"stbl"}
+MAX_UINT32 = 0xFFFFFFFF
+
+
+def _make_box(box_type, payload):
+    size = 8 + len(payload)
+    if size > MAX_UINT32:
+        return struct.pack(">I4sQ", 1, box_type, size + 8) + payload
+    return struct.pack(">I4s", size, box_type) + payload
+
+
+def _rewrite_chunk_offsets(data, start, end, shift, to_co64):
+    """
+    Rebuilds the boxes of `data` between `start` and `end` with every stco/co64 entry passed
+    through `shift`, converting stco tables to co64 when `to_co64` is set. Containers on the
+    way to the tables are rebuilt with their new size, anything else is copied as is.
+    """
+    out = []
+    for box_type, offset, size, header_size in iter_boxes(data, start, end):
+        payload_start = offset + header_size
+        if box_type in STBL_PATH_BOXES:
+            out.append(_make_box(box_type, _rewrite_chunk_offsets(data, payload_start, offset + size, shift, to_co64)))
+        elif box_type in (b"stco", b"co64"):
+            version_flags = data[payload_start:payload_start + 4]
+            count = struct.unpack_from(">I", data, payload_start + 4)[0]
+            entry_format = "I" if box_type == b"stco" else "Q"
+            entries = [shift(entry) for entry in struct.unpack_from(f">{count}{entry_format}", data, payload_start + 8)]
+            if box_type == b"stco" and not to_co64:
+                table = struct.pack(f">I{count}I", count, *entries)
+            else:
+                box_type = b"co64"
+                table = struct.pack(f">I{count}Q", count, *entries)
+            out.append(_make_box(box_type, version_flags + table))
+        elif box_type == b"cmov":
+            raise MP4Error("Compressed moov boxes are not supported")
+        else:
+            out.append(data[offset:offset + size])
+    return b"".join(out)
+
+
+def _max_chunk_offset(data, start=0, end=None):
+    highest = 0
+    for box_type, offset, size, header_size in iter_boxes(data, start, end):
+        if box_type in STBL_PATH_BOXES:
+            highest = max(highest, _max_chunk_offset(data, offset + header_size, offset + size))
+        elif box_type in (b"stco", b"co64"):
+            count = struct.unpack_from(">I", data, offset + header_size + 4)[0]
+            entry_format = "I" if box_type == b"stco" else "Q"
+            if count:
+                highest = max(highest, max(struct.unpack_from(f">{count}{entry_format}", data, offset + header_size + 8)))
+    return highest
+
+
+def relocate_moov(moov_payload, insert_at, moov_offset, moov_size):
+    """
+    Returns a `moov` box (header included) for a file whose moov moves from `moov_offset`
+    to `insert_at`: chunk offsets of the media between the two grow by the size of the new box.
+    stco tables are converted to co64 when an offset would no longer fit in 32 bits.
+    """
+    def build(to_co64):
+        new_size = len(_make_box(b"moov", _rewrite_chunk_offsets(moov_payload, 0, len(moov_payload), lambda o: o, to_co64)))
+
+        def shift(chunk_offset):
+            if insert_at <= chunk_offset < moov_offset:
+                return chunk_offset + new_size
+            if chunk_offset >= moov_offset + moov_size:
+                return chunk_offset + new_size - moov_size
+            return chunk_offset
+
+        return _make_box(b"moov", _rewrite_chunk_offsets(moov_payload, 0, len(moov_payload), shift, to_co64))
+
+    to_co64 = _max_chunk_offset(moov_payload) + len(moov_payload) + 16 > MAX_UINT32
+    return build(to_co64)
+
+
+def copy_range(reader, outfile, offset, length, buffer_size=8 * 1024 * 1024):
+    while length > 0:
+        data = reader.read(offset, min(buffer_size, length))
+        if not data:
+            raise MP4Error("Unexpected end of file")
+        outfile.write(data)
+        offset += len(data)
+        length -= len(data)
+
+
+def write_faststart(reader, outfile, buffer_size=8 * 1024 * 1024):
+    """
+    Writes the file of `reader` to `outfile` with its `moov` box moved in front of the media data,
+    so it can be played while it downloads. The media data is streamed through `buffer_size`
+    buffers and never held in memory, only the moov box is.
+
+    Returns False (writing nothing) when the file is already faststart.
+    Raises MP4Error for files that can't be remuxed (no moov/mdat, fragmented, compressed moov).
+    """
+    boxes = read_top_level_boxes(reader)
+    types = [box[0] for box in boxes]
+    if b"moov" not in types or b"mdat" not in types:
+        raise MP4Error("No moov or mdat box found")
+    if b"moof" in types:
+        raise MP4Error("Fragmented files are not remuxed")
+
+    moov_index = types.index(b"moov")
+    mdat_index = types.index(b"mdat")
+    if moov_index < mdat_index:
+        return False
+
+    _, moov_offset, moov_size, moov_header = boxes[moov_index]
+    if moov_size > MAX_MOOV_SIZE:
+        raise MP4Error(f"moov box too large ({moov_size} bytes)")
+    insert_at = boxes[mdat_index][1]
+    moov = relocate_moov(reader.read(moov_offset + moov_header, moov_size - moov_header), insert_at, moov_offset, moov_size)
+
+    for index, (box_type, offset, size, header_size) in enumerate(boxes):
+        if index == mdat_index:
+            outfile.write(moov)
+        if index != moov_index:
+            copy_range(reader, outfile, offset, size, buffer_size)
+    return True
@@ -0,0 +1,355 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import connections
+
+from contentor_video_processor.conf import get_config
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two stack samples of the requests that may turn out slow
+STACK_SAMPLE_INTERVAL = 0.01
+# Storage methods timed while a request is profiled, see `instrument_storage`
+STORAGE_METHODS = ("exists", "size", "listdir", "open", "save", "delete", "url")
+
+_active_profile = contextvars.ContextVar("contentor_profile", default=None)
+
+
+class CallStats:
+    """
+    Count and total time of calls, per name.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def record(self, name, seconds):
+        count, total = self.calls.get(name, (0, 0.0))
+        self.calls[name] = (count + 1, total + seconds)
+
+    def as_dict(self):
+        return {
+            "count": sum(count for count, _ in self.calls.values()),
+            "time_ms": sum(total for _, total in self.calls.values()) * 1000,
+            "calls": {
+                name: {"count": count, "time_ms": total * 1000} for name, (count, total) in sorted(self.calls.items())
+            },
+        }
+
+
+class RequestProfile:
+    """
+    What a profiled request spent its time on: database queries, storage and S3 calls,
+    and either a cProfile of the whole request or samples of its stack.
+    """
+
+    def __init__(self, view_name, request, sampled):
+        self.view_name = view_name
+        self.request = request
+        self.sampled = sampled
+        self.queries = []
+        self.storage = CallStats()
+        self.s3 = CallStats()
+        self.profiler = cProfile.Profile() if sampled else None
+        self.thread_id = threading.get_ident()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started_at, sql))
+
+    def build_record(self, response, duration, stacks, top):
+        queries = sorted(self.queries, key=lambda query: query[0], reverse=True)
+        record = {
+            "id": uuid.uuid4().hex,
+            "view": self.view_name,
+            "method": self.request.method,
+            "path": self.request.path,
+            "status": getattr(response, "status_code", None),
+            "reason": "sampled" if self.sampled else "slow",
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - duration)),
+            "duration_ms": duration * 1000,
+            "queries": {
+                "count": len(queries),
+                "time_ms": sum(seconds for seconds, _ in queries) * 1000,
+                "slowest": [{"time_ms": seconds * 1000, "sql": sql} for seconds, sql in queries[:5]],
+            },
+            "storage": self.storage.as_dict(),
+            "s3": self.s3.as_dict(),
+            "profile": None,
+            "stacks": None,
+        }
+        if self.profiler is not None:
+            record["profile"] = summarize_profile(self.profiler, top)
+        elif stacks:
+            record["stacks"] = [
+                {"stack": stack, "samples": samples} for stack, samples in stacks.most_common(top)
+            ]
+        return record
+
+
+class StackSampler:
+    """
+    Samples the stacks of the registered threads from a background thread, every
+    STACK_SAMPLE_INTERVAL seconds while at least one thread is registered.
+    Costs far less than cProfile, so it can run for every request to explain the slow ones.
+    """
+
+    def __init__(self, interval=STACK_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stacks = {}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def register(self, thread_id):
+        with self.lock:
+            self.stacks[thread_id] = Counter()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="contentor-stack-sampler", daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def unregister(self, thread_id):
+        with self.lock:
+            return self.stacks.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            with self.lock:
+                thread_ids = list(self.stacks)
+            if not thread_ids:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = format_stack(frame)
+                with self.lock:
+                    if thread_id in self.stacks:
+                        self.stacks[thread_id][stack] += 1
+            time.sleep(self.interval)
+
+
+def format_stack(frame, limit=40):
+    """
+    Collapses a stack into "outer;...;inner" function names, the format of flame graph tools.
+    """
+    names = []
+    while frame is not None and len(names) < limit:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def summarize_profile(profiler, top):
+    """
+    The `top` functions of a cProfile run by cumulative time.
+    """
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "total_ms": total * 1000,
+            "cumulative_ms": cumulative * 1000,
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_stack_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler()
+    return _sampler
+
+
+def write_record(record, profile):
+    """
+    Writes a profile to CONTENTOR_PROFILE_DIR (a JSON summary, plus the raw cProfile data
+    for sampled requests, to open with pstats or snakeviz), or logs it as JSON.
+    """
+    directory = get_config().profile_dir
+    if not directory:
+        logger.info("%s", json.dumps(record))
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    started_at = record["started_at"].replace("-", "").replace(":", "")
+    base_name = os.path.join(directory, f"{started_at}-{record['view']}-{record['id']}")
+    with open(base_name + ".json", "w") as f:
+        json.dump(record, f, indent=2)
+    if profile.profiler is not None:
+        profile.profiler.dump_stats(base_name + ".prof")
+
+
+def is_profiling_enabled():
+    config = get_config()
+    return bool(config.profile_sample_rate or config.profile_slow_threshold is not None)
+
+
+def profiled(view):
+    """
+    Decorator profiling a sample of the requests of a view (CONTENTOR_PROFILE_SAMPLE_RATE) and
+    the requests slower than CONTENTOR_PROFILE_SLOW_THRESHOLD seconds. Sampled requests run under
+    cProfile; the others only have their queries and storage calls counted and their stack sampled,
+    and are reported when they turn out slow.
+
+    Async views share the event loop's thread with other requests, so they are never run under
+    cProfile nor stack sampled: only their queries and storage calls are recorded.
+    """
+    view_name = getattr(view, "view_class", view).__name__
+
+    def get_mode():
+        # (sampled, slow_threshold) of a request, or None when it isn't profiled
+        config = get_config()
+        sample_rate = config.profile_sample_rate
+        slow_threshold = config.profile_slow_threshold
+        if not sample_rate and slow_threshold is None:
+            return None
+        sampled = bool(sample_rate) and random.random() < sample_rate
+        if not sampled and slow_threshold is None:
+            return None
+        return sampled, slow_threshold
+
+    if iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            mode = get_mode()
+            if mode is None:
+                return await view(request, *args, **kwargs)
+            return await _aprofile_request(view, view_name, request, args, kwargs, *mode)
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        mode = get_mode()
+        if mode is None:
+            return view(request, *args, **kwargs)
+        return _profile_request(view, view_name, request, args, kwargs, *mode)
+
+    return wrapper
+
+
+def _wrap_queries(stack, profile):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile))
+
+
+def _report_request(profile, response, duration, stacks, slow_threshold):
+    if profile.sampled or (slow_threshold is not None and duration >= slow_threshold):
+        try:
+            write_record(profile.build_record(response, duration, stacks, get_config().profile_top), profile)
+        except Exception:
+            logger.exception("Could not write the profile of %s", profile.view_name)
+
+
+def _profile_request(view, view_name, request, args, kwargs, sampled, slow_threshold):
+    profile = RequestProfile(view_name, request, sampled)
+    sampler = None if sampled else get_stack_sampler()
+    token = _active_profile.set(profile)
+    response = None
+    started_at = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            _wrap_queries(stack, profile)
+            if sampler is not None:
+                sampler.register(profile.thread_id)
+            if profile.profiler is not None:
+                try:
+                    profile.profiler.enable()
+                except ValueError:
+                    # Another profiler is running (Python 3.12+ allows one at a time), go without
+                    profile.profiler = None
+            response = view(request, *args, **kwargs)
+            return response
+    finally:
+        if profile.profiler is not None:
+            profile.profiler.disable()
+        stacks = sampler.unregister(profile.thread_id) if sampler is not None else None
+        duration = time.perf_counter() - started_at
+        _active_profile.reset(token)
+        _report_request(profile, response, duration, stacks, slow_threshold)
+
+
+async def _aprofile_request(view, view_name, request, args, kwargs, sampled, slow_threshold):
+    profile = RequestProfile(view_name, request, sampled)
+    profile.profiler = None
+    token = _active_profile.set(profile)
+    response = None
+    started_at = time.perf_counter()
+    # The async ORM runs queries in the request's sync thread, whose connections are wrapped
+    stack = contextlib.ExitStack()
+    await sync_to_async(_wrap_queries)(stack, profile)
+    try:
+        response = await view(request, *args, **kwargs)
+        return response
+    finally:
+        await sync_to_async(stack.close)()
+        duration = time.perf_counter() - started_at
+        _active_profile.reset(token)
+        _report_request(profile, response, duration, None, slow_threshold)
+
+
+def record_s3_call(operation, seconds):
+    """
+    Adds an S3 API call to the profile of the current request, if it is profiled.
+    """
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.s3.record(operation, seconds)
+
+
+def _timed_storage_method(method, profile, name):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.storage.record(name, time.perf_counter() - started_at)
+
+    return wrapper
+
+
+def instrument_storage(storage):
+    """
+    Times the calls of a storage instance created for the current request, if it is profiled.
+    """
+    profile = _active_profile.get()
+    if profile is not None:
+        for name in STORAGE_METHODS:
+            method = getattr(storage, name, None)
+            if method is not None:
+                setattr(storage, name, _timed_storage_method(method, profile, name))
+    return storage
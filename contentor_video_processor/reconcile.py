@@ -0,0 +1,191 @@
+import datetime
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.functions import fetch_job_statuses
+from contentor_video_processor.models import get_video_processing_event_model, get_video_processing_request_model
+from contentor_video_processor.webhooks import (
+    apply_orphaned_events,
+    apply_pending_webhook_events,
+    build_webhook_event,
+    record_webhook_events,
+)
+
+logger = logging.getLogger(__name__)
+
+# Statuses of jobs that haven't finished yet
+ACTIVE_STATUSES = ("pending", "queued", "processing")
+
+
+def get_stalled_requests(now=None):
+    """
+    Submitted jobs without news for CONTENTOR_RECONCILE_AFTER seconds, longest silent first.
+    Served by the (status, updated_at) index.
+    """
+    now = now or timezone.now()
+    cutoff = now - datetime.timedelta(seconds=get_config().reconcile_after)
+    return (
+        get_video_processing_request_model().objects
+        .filter(status__in=ACTIVE_STATUSES, updated_at__lt=cutoff, uuid__isnull=False)
+        .order_by("updated_at")
+    )
+
+
+def get_unsubmitted_requests(now=None):
+    """
+    Jobs whose submission failed and is due for a retry, or that were left unsubmitted
+    before retries were scheduled, longest waiting first.
+    """
+    now = now or timezone.now()
+    config = get_config()
+    cutoff = now - datetime.timedelta(seconds=config.reconcile_after)
+    return (
+        get_video_processing_request_model().objects
+        .filter(status="pending", uuid__isnull=True, submit_attempts__lt=config.submit_max_attempts)
+        .filter(Q(next_attempt_at__lte=now) | Q(next_attempt_at__isnull=True, updated_at__lt=cutoff))
+        .order_by("updated_at")
+    )
+
+
+def fail_requests(processing_requests, now=None):
+    """
+    Marks jobs that can't be submitted any more as failed, with a "failed" processing event.
+    """
+    if not processing_requests:
+        return 0
+    now = now or timezone.now()
+    request_model = get_video_processing_request_model()
+    event_model = get_video_processing_event_model()
+    with transaction.atomic():
+        ids = list(
+            request_model.objects.select_for_update()
+            .filter(pk__in=[processing_request.pk for processing_request in processing_requests])
+            .filter(status__in=ACTIVE_STATUSES)
+            .values_list("pk", flat=True)
+        )
+        request_model.objects.filter(pk__in=ids).update(
+            status="failed", failed_at=now, last_event_at=now, next_attempt_at=None, updated_at=now
+        )
+        event_model.objects.bulk_create(
+            event_model(request_id=pk, status="failed", timestamp=now.isoformat(), occurred_at=now) for pk in ids
+        )
+    return len(ids)
+
+
+def fail_abandoned_requests(now=None):
+    """
+    Fails the jobs whose submission failed CONTENTOR_SUBMIT_MAX_ATTEMPTS times.
+    """
+    abandoned = get_video_processing_request_model().objects.filter(
+        status="pending", uuid__isnull=True, submit_attempts__gt=0, submit_attempts__gte=get_config().submit_max_attempts
+    )
+    return fail_requests(list(abandoned.only("pk")), now)
+
+
+def submit_request(processing_request):
+    """
+    Submits a job (again), or fails it when it ran out of attempts. Returns the action taken:
+    "resubmitted", "submit_failed" or "abandoned", or "requeued" when CONTENTOR_SCHEDULER
+    submits the jobs.
+    """
+    if processing_request.submit_attempts >= get_config().submit_max_attempts:
+        fail_requests([processing_request])
+        return "abandoned"
+    if processing_request.uuid:
+        # A lost job starts over under a new uuid, the events of the old one are orphaned
+        processing_request.uuid = None
+        processing_request.status = "pending"
+        processing_request.last_event_at = None
+        processing_request.save(update_fields=["uuid", "status", "last_event_at", "updated_at"], skip_process=True)
+    if get_config().scheduler:
+        return "requeued"
+    processing_request.process_video()
+    return "resubmitted" if processing_request.uuid else "submit_failed"
+
+
+def poll_requests(processing_requests):
+    """
+    Queries the status of jobs with one request and applies their changes the way webhooks are:
+    recorded as webhook events, so a late delivery of the same event is ignored, then applied.
+
+    Returns a tuple of (outcome counts, jobs Contentor reported as not found), or None when the
+    query failed. Jobs the answer doesn't mention are left alone.
+    """
+    result = fetch_job_statuses([processing_request.uuid for processing_request in processing_requests])
+    if result is None:
+        return None
+    statuses, not_found = result
+
+    events = []
+    unknown = []
+    for processing_request in processing_requests:
+        payload = statuses.get(processing_request.uuid)
+        if payload is None:
+            if processing_request.uuid in not_found:
+                unknown.append(processing_request)
+        elif payload["status"] != processing_request.status:
+            event = build_webhook_event(payload)
+            if event is not None:
+                events.append(event)
+    record_webhook_events(events)
+
+    outcomes = Counter()
+    uuids = {event.uuid for event in events}
+    while uuids:
+        applied = apply_pending_webhook_events(batch_size=len(uuids) * 10, uuids=uuids)
+        if not applied:
+            break
+        outcomes.update(applied)
+    return outcomes, unknown
+
+
+def reconcile_requests(limit=1000, now=None):
+    """
+    One reconciler pass, returns the number of jobs per action:
+
+    - jobs out of submission attempts are failed ("abandoned");
+    - webhooks that arrived before their job's uuid was saved are applied ("applied", "stale");
+    - failed submissions that are due are retried ("resubmitted" or "submit_failed"), unless
+      CONTENTOR_SCHEDULER submits the jobs;
+    - when a `status_url` is configured, stalled jobs are polled ("polled", or "poll_failed" when
+      the query fails) and their changes applied ("applied", "stale", ...); the jobs Contentor reports
+      as not found are submitted again ("lost", then as above, or "requeued").
+
+    At most `limit` jobs are retried and polled per pass.
+    """
+    now = now or timezone.now()
+    batch_size = get_config().reconcile_batch_size
+    actions = Counter()
+
+    actions["abandoned"] += fail_abandoned_requests(now)
+    actions.update(apply_orphaned_events(batch_size=limit))
+
+    if not get_config().scheduler:
+        for processing_request in get_unsubmitted_requests(now)[:limit]:
+            actions[submit_request(processing_request)] += 1
+
+    stalled = list(get_stalled_requests(now)[:limit]) if get_config().status_url else []
+    for start in range(0, len(stalled), batch_size):
+        batch = stalled[start:start + batch_size]
+        result = poll_requests(batch)
+        if result is None:
+            actions["poll_failed"] += len(batch)
+            continue
+        outcomes, unknown = result
+        actions["polled"] += len(batch)
+        actions.update(outcomes)
+        for processing_request in unknown:
+            logger.warning("Job %s of request %s is unknown to Contentor", processing_request.uuid, processing_request.pk)
+            actions["lost"] += 1
+            actions[submit_request(processing_request)] += 1
+
+    actions = {action: count for action, count in actions.items() if count}
+    for action, count in actions.items():
+        instrumentation.increment("reconciled_jobs", count, action=action)
+    return actions
@@ -0,0 +1,197 @@
+import hashlib
+
+from django.core.cache import caches
+from django.db.models import Q
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.models import get_video_processing_request_model
+from contentor_video_processor.mp4 import probe_file
+
+# Probe results of finished uploads are kept until the video is saved and its jobs dispatched
+PROBE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_quality_resolution(quality):
+    """
+    Maps a quality string ('original', '720p', ...) to the resolution of its processing request.
+    """
+    return get_config().quality_resolutions.get(quality, quality)
+
+
+def get_resolution_height(resolution):
+    try:
+        return int(resolution.rstrip("p"))
+    except ValueError:
+        return None
+
+
+def get_quality_height(quality):
+    return get_resolution_height(get_quality_resolution(quality)) or 0
+
+
+def sort_qualities(qualities, reverse=False):
+    """
+    Orders qualities from the lowest to the highest resolution, or the other way round.
+    """
+    return sorted(qualities, key=get_quality_height, reverse=reverse)
+
+
+def get_video_quality_file(video, quality):
+    """
+    Returns the file of a video for a quality string ('original', '720p', ...),
+    or None if the quality isn't configured or not available for this video.
+    """
+    config = get_config()
+    if quality not in config.qualities:
+        return None
+    return getattr(video, config.quality_fields[quality], None) or None
+
+
+def get_probe_cache():
+    alias = get_config().probe_cache
+    if not alias:
+        return None
+    return caches[alias]
+
+
+def make_probe_cache_key(name):
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"contentor:probe:{digest}"
+
+
+def cache_source_metadata(name, metadata):
+    """
+    Keeps the metadata probed while an upload was collected, keyed by its storage name.
+    """
+    cache = get_probe_cache()
+    if cache is not None:
+        cache.set(make_probe_cache_key(name), metadata, PROBE_CACHE_TIMEOUT)
+
+
+def get_source_metadata(field_file):
+    """
+    Returns the container metadata of an uploaded original: the result cached when the upload
+    was collected, or a ranged probe of the stored file.
+    """
+    cache = get_probe_cache()
+    if cache is not None:
+        metadata = cache.get(make_probe_cache_key(field_file.name))
+        if metadata is not None:
+            return metadata
+    return probe_file(field_file.storage, field_file.name)
+
+
+def plan_rendition_ladder(source_metadata, resolutions=None):
+    """
+    Returns the resolutions worth processing for a source, given its probed metadata.
+
+    'original' is always kept. Other renditions are skipped when they would be as large as the
+    source or the original rendition (upscales and duplicates), or when the source's bitrate is
+    already below the rendition's expected bitrate, so the rendition wouldn't be any lighter.
+    Without dimensions every resolution is kept.
+    """
+    config = get_config()
+    resolutions = config.resolutions if resolutions is None else resolutions
+    width, height = source_metadata.get("width"), source_metadata.get("height")
+    if not width or not height:
+        return list(resolutions)
+
+    # Portrait videos are compared by their short side too
+    ceiling = min(width, height, get_resolution_height(config.original_resolution) or min(width, height))
+    bitrate = source_metadata.get("bitrate")
+
+    ladder = []
+    for quality in resolutions:
+        if quality != "original":
+            if get_quality_height(quality) >= ceiling:
+                continue
+            expected_bitrate = config.ladder_bitrates.get(quality)
+            if bitrate and expected_bitrate and expected_bitrate >= bitrate:
+                continue
+        ladder.append(quality)
+    return ladder
+
+
+def get_rendition_statuses(video):
+    """
+    Returns the status of the most recent processing request of each resolution of a video.
+    Reprocessing campaign jobs only count once completed, the rendition they replace is served until then.
+    """
+    statuses = {}
+    for resolution, status in _get_rendition_status_rows(video):
+        statuses.setdefault(resolution, status)
+    return statuses
+
+
+async def aget_rendition_statuses(video):
+    """
+    Async version of `get_rendition_statuses`.
+    """
+    statuses = {}
+    async for resolution, status in _get_rendition_status_rows(video):
+        statuses.setdefault(resolution, status)
+    return statuses
+
+
+def _get_rendition_status_rows(video):
+    request_model = get_video_processing_request_model()
+    return (
+        request_model.objects
+        .filter(video=video)
+        .filter(Q(campaign__isnull=True) | Q(status="completed"))
+        .order_by("resolution", "-id")
+        .values_list("resolution", "status")
+    )
+
+
+def get_rendition_state(video):
+    """
+    Returns which qualities of a video can be played now and which are still being processed.
+
+    A quality is ready when its file exists and its latest processing request completed
+    (or it was never processed). Both lists are ordered from the highest resolution down and
+    `best` is the highest ready quality. Until anything is processed the uploaded original is used.
+    """
+    return build_rendition_state(video, get_rendition_statuses(video))
+
+
+async def aget_rendition_state(video):
+    """
+    Async version of `get_rendition_state`.
+    """
+    return build_rendition_state(video, await aget_rendition_statuses(video))
+
+
+def build_rendition_state(video, statuses):
+    """
+    The rendition state of a video (see `get_rendition_state`) from the statuses of its resolutions.
+    """
+    ready = []
+    pending = []
+    for quality in get_config().qualities:
+        status = statuses.get(get_quality_resolution(quality))
+        if status in ("pending", "queued", "processing"):
+            pending.append(quality)
+        elif get_video_quality_file(video, quality) and status in (None, "completed"):
+            ready.append(quality)
+
+    ready = sort_qualities(ready, reverse=True)
+    pending = sort_qualities(pending, reverse=True)
+    best = ready[0] if ready else None
+    if best is None and get_video_quality_file(video, "original"):
+        best = "original"
+    return {"ready": ready, "pending": pending, "best": best}
+
+
+def pick_quality(state, requested):
+    """
+    Returns the quality to serve for a requested one: the requested quality when it's ready,
+    otherwise the best ready quality below it, or the best ready quality at all.
+    """
+    if requested in state["ready"]:
+        return requested
+    requested_height = get_quality_height(requested)
+    lower = [quality for quality in state["ready"] if get_quality_height(quality) <= requested_height]
+    if lower:
+        return lower[0]
+    return state["best"]
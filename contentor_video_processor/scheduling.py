@@ -0,0 +1,103 @@
+import datetime
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.functions import API_TIMEOUT
+from contentor_video_processor.models import get_video_processing_request_model
+from contentor_video_processor.reconcile import ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed job is hidden from other schedulers while it's submitted. A scheduler that dies
+# mid-submission releases it when this runs out.
+CLAIM_TIMEOUT = datetime.timedelta(seconds=2 * API_TIMEOUT)
+
+
+def get_submitted_in_flight():
+    """
+    Number of submitted jobs that haven't finished yet.
+    """
+    return (
+        get_video_processing_request_model().objects
+        .filter(status__in=ACTIVE_STATUSES, uuid__isnull=False)
+        .count()
+    )
+
+
+def get_queued_requests(now=None):
+    """
+    Jobs waiting for their submission, or for the retry of a failed one, in submission order.
+    Served by the (status, scheduled_for) index.
+    """
+    now = now or timezone.now()
+    return (
+        get_video_processing_request_model().objects
+        .filter(status="pending", uuid__isnull=True, submit_attempts__lt=get_config().submit_max_attempts)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        .order_by("scheduled_for", "id")
+    )
+
+
+def claim_request(pk, now=None):
+    """
+    Takes a queued job for submission, hiding it from the other schedulers for CLAIM_TIMEOUT.
+    Returns None when it's no longer queued.
+    """
+    with transaction.atomic():
+        locked = get_queued_requests(now).filter(pk=pk)
+        if connection.features.has_select_for_update_skip_locked:
+            locked = locked.select_for_update(skip_locked=True)
+        processing_request = locked.first()
+        if processing_request is None:
+            return None
+        processing_request.next_attempt_at = timezone.now() + CLAIM_TIMEOUT
+        processing_request.save(update_fields=["next_attempt_at"], skip_process=True)
+    return processing_request
+
+
+def submit_scheduled_requests(now=None):
+    """
+    Submits queued jobs in `scheduled_for` order until CONTENTOR_SCHEDULER_MAX_IN_FLIGHT submitted
+    jobs are unfinished. The last CONTENTOR_SCHEDULER_RESERVED slots only take interactive jobs,
+    so an upload never waits behind a full backfill. Returns the number of jobs submitted per priority.
+
+    Each job is claimed in a short transaction, by pushing its `next_attempt_at`, and submitted once
+    that's committed, so several schedulers can run side by side without holding locks during
+    the API call.
+    """
+    config = get_config()
+    request_model = get_video_processing_request_model()
+    queued = get_queued_requests(now)
+    free = config.scheduler_max_in_flight - get_submitted_in_flight()
+    # Slots sync and backfill jobs may take
+    shared = free - config.scheduler_reserved
+    submitted = {}
+    seen = []
+
+    # The head of the queue, then the interactive jobs behind background ones that didn't fit
+    for candidates in (queued, queued.filter(priority__lt=request_model.PRIORITY_SYNC)):
+        if free <= 0:
+            break
+        for pk, priority in candidates.exclude(pk__in=seen).values_list("pk", "priority")[:free]:
+            seen.append(pk)
+            if priority >= request_model.PRIORITY_SYNC and shared <= 0:
+                continue
+            processing_request = claim_request(pk, now)
+            if processing_request is None:
+                continue  # Claimed by another scheduler
+            processing_request.process_video()
+            if not processing_request.uuid:
+                continue  # Retried after a backoff, see process_video
+            submitted[priority] = submitted.get(priority, 0) + 1
+            free -= 1
+            shared -= 1
+            if free <= 0:
+                break
+
+    if submitted:
+        logger.info("Submitted %s scheduled jobs", sum(submitted.values()))
+    return submitted
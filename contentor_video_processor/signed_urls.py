@@ -0,0 +1,135 @@
+import hashlib
+import time
+
+from django.core.cache import caches
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.signers import sign_url
+
+
+def get_signed_url_cache():
+    """
+    Returns the cache configured in CONTENTOR_SIGNED_URL_CACHE (defaults to "default"),
+    or None when caching of signed URLs is disabled.
+    """
+    alias = get_config().signed_url_cache
+    if not alias:
+        return None
+    return caches[alias]
+
+
+def get_expiry_margin():
+    """
+    Seconds before expiry at which a cached URL stops being handed out,
+    so clients always get a URL that stays valid for at least this long.
+    """
+    return get_config().signed_url_expiry_margin
+
+
+def get_url_lifetime(storage):
+    """
+    Seconds a URL generated by `storage` stays valid.
+    S3 storages expose it as `querystring_expire`, otherwise AWS_QUERYSTRING_EXPIRE is used.
+    """
+    return getattr(storage, "querystring_expire", None) or get_config().querystring_expire
+
+
+def make_cache_key(name, quality):
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return f"contentor:signed-url:{quality}:{digest}"
+
+
+def get_signed_url(field_file, quality):
+    """
+    Returns a tuple of (url, expires_at) for a file, expires_at being a unix timestamp.
+
+    URLs are cached per storage key and quality and the same URL is returned until
+    CONTENTOR_SIGNED_URL_EXPIRY_MARGIN seconds before it expires, so browsers and CDNs can cache the media.
+    """
+    cache = get_signed_url_cache()
+    key = make_cache_key(field_file.name, quality)
+    margin = get_expiry_margin()
+
+    if cache is not None:
+        cached = cache.get(key)
+        if cached and cached[1] - margin > time.time():
+            return cached
+
+    lifetime = get_url_lifetime(field_file.storage)
+    url = sign_url(field_file, lifetime)
+    expires_at = time.time() + lifetime
+
+    timeout = int(expires_at - margin - time.time())
+    if cache is not None and timeout > 0:
+        cache.set(key, (url, expires_at), timeout)
+    return url, expires_at
+
+
+async def aget_signed_url(field_file, quality):
+    """
+    Async version of `get_signed_url`, for async views: the cache is read and written with the
+    cache's async methods. Signing itself is computed locally, without I/O.
+    """
+    cache = get_signed_url_cache()
+    key = make_cache_key(field_file.name, quality)
+    margin = get_expiry_margin()
+
+    if cache is not None:
+        cached = await cache.aget(key)
+        if cached and cached[1] - margin > time.time():
+            return cached
+
+    lifetime = get_url_lifetime(field_file.storage)
+    url = sign_url(field_file, lifetime)
+    expires_at = time.time() + lifetime
+
+    timeout = int(expires_at - margin - time.time())
+    if cache is not None and timeout > 0:
+        await cache.aset(key, (url, expires_at), timeout)
+    return url, expires_at
+
+
+def get_signed_urls(files):
+    """
+    Batch version of `get_signed_url` for a list of (field_file, quality) pairs.
+    Cached URLs are read with one `get_many` and new ones stored with `set_many`.
+    Returns a list of (url, expires_at) in the same order.
+    """
+    cache = get_signed_url_cache()
+    margin = get_expiry_margin()
+    keys = [make_cache_key(field_file.name, quality) for field_file, quality in files]
+    cached = cache.get_many(keys) if cache is not None else {}
+
+    now = time.time()
+    results = []
+    to_cache = {}
+    for key, (field_file, quality) in zip(keys, files):
+        hit = cached.get(key)
+        if hit and hit[1] - margin > now:
+            results.append(hit)
+            continue
+
+        lifetime = get_url_lifetime(field_file.storage)
+        url = sign_url(field_file, lifetime)
+        expires_at = time.time() + lifetime
+        timeout = int(expires_at - margin - time.time())
+        if timeout > 0:
+            to_cache.setdefault(timeout, {})[key] = (url, expires_at)
+        cached[key] = (url, expires_at)
+        results.append((url, expires_at))
+
+    if cache is not None:
+        for timeout, values in to_cache.items():
+            cache.set_many(values, timeout)
+    return results
+
+
+def get_url_max_age(expires_at):
+    """
+    Seconds a client may reuse a URL expiring at `expires_at`.
+    """
+    return max(int(expires_at - get_expiry_margin() - time.time()), 0)
+
+
+def get_url_etag(url):
+    return '"%s"' % hashlib.md5(url.encode("utf-8")).hexdigest()
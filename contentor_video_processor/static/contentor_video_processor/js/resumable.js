@@ -38,9 +38,17 @@
       chunkSize:1*1024*1024,
       forceChunkSize:false,
       simultaneousUploads:3,
+      // Adaptive mode: chunks are cut as the upload goes, sized and sent in parallel by the measured throughput
+      adaptiveChunkSize:false,
+      minChunkSize:256*1024,
+      maxChunkSize:64*1024*1024,
+      maxSimultaneousUploads:4,
+      targetChunkSeconds:5,
+      concurrencyHeader:null,
       fileParameterName:'file',
       chunkNumberParameterName: 'resumableChunkNumber',
       chunkSizeParameterName: 'resumableChunkSize',
+      chunkOffsetParameterName: 'resumableChunkOffset',
       currentChunkSizeParameterName: 'resumableCurrentChunkSize',
       totalSizeParameterName: 'resumableTotalSize',
       typeParameterName: 'resumableType',
@@ -64,7 +72,7 @@
       getTarget:null,
       maxChunkRetries:100,
       chunkRetryInterval:undefined,
-      permanentErrors:[400, 404, 415, 500, 501],
+      permanentErrors:[400, 404, 413, 415, 500, 501],
       maxFiles:undefined,
       withCredentials:false,
       xhrTimeout:0,
@@ -504,6 +512,14 @@
         // Rebuild stack of chunks from file
         $.chunks = [];
         $._prevProgress = 0;
+        if($.getOpt('adaptiveChunkSize')) {
+          // Chunks are created by nextChunk() as the upload goes
+          $.nextByte = 0;
+          window.setTimeout(function(){
+            $.resumableObj.fire('chunkingComplete',$);
+          },0);
+          return;
+        }
         var round = $.getOpt('forceChunkSize') ? Math.ceil : Math.floor;
         var maxOffset = Math.max(round($.file.size/$.getOpt('chunkSize')),1);
         for (var offset=0; offset<maxOffset; offset++) {(function(offset){
@@ -516,6 +532,18 @@
             $.resumableObj.fire('chunkingComplete',$);
         },0);
       };
+      $.nextChunk = function(){
+        // Adaptive mode: cuts the next chunk at the current chunk size, the last one takes a remainder
+        // smaller than minChunkSize. Returns null when the whole file is cut.
+        if(_error || $.nextByte === undefined || ($.nextByte >= $.size && $.chunks.length)) return(null);
+        var startByte = $.nextByte;
+        var endByte = Math.min($.size, startByte + $.resumableObj.chunkSize);
+        if($.size - endByte < $.getOpt('minChunkSize')) endByte = $.size;
+        $.nextByte = endByte;
+        var chunk = new ResumableChunk($.resumableObj, $, $.chunks.length, chunkEvent, startByte, endByte);
+        $.chunks.push(chunk);
+        return(chunk);
+      };
       $.progress = function(){
         if(_error) return(1);
         // Sum up progress across everything
@@ -541,6 +569,7 @@
         return(uploading);
       };
       $.isComplete = function(){
+        if($.nextByte !== undefined && ($.nextByte < $.size || !$.chunks.length)) return(false);
         var outstanding = false;
         $h.each($.chunks, function(chunk){
           var status = chunk.status();
@@ -570,7 +599,7 @@
     }
 
 
-    function ResumableChunk(resumableObj, fileObj, offset, callback){
+    function ResumableChunk(resumableObj, fileObj, offset, callback, startByte, endByte){
       var $ = this;
       $.opts = {};
       $.getOpt = resumableObj.getOpt;
@@ -595,6 +624,11 @@
         // The last chunk will be bigger than the chunk size, but less than 2*chunkSize
         $.endByte = $.fileObjSize;
       }
+      if (startByte !== undefined) {
+        // Adaptive mode: chunks have their own size
+        $.startByte = startByte;
+        $.endByte = endByte;
+      }
       $.xhr = null;
 
       // test() makes a GET request without any data to see if the chunk has already been uploaded in a previous session
@@ -607,7 +641,7 @@
           var status = $.status();
           if(status=='success') {
             $.callback(status, $.message());
-            $.resumableObj.uploadNextChunk();
+            $.resumableObj.chunkDone($);
           } else {
             $.send();
           }
@@ -629,7 +663,8 @@
           [
             // define key/value pairs for additional parameters
             ['chunkNumberParameterName', $.offset + 1],
-            ['chunkSizeParameterName', $.getOpt('chunkSize')],
+            ['chunkSizeParameterName', $.getOpt('adaptiveChunkSize') ? $.endByte - $.startByte : $.getOpt('chunkSize')],
+            ['chunkOffsetParameterName', $.startByte],
             ['currentChunkSizeParameterName', $.endByte - $.startByte],
             ['totalSizeParameterName', $.fileObjSize],
             ['typeParameterName', $.fileObjType],
@@ -685,7 +720,9 @@
           return;
         }
 
-        // Set up request and listen for event
+        // Set up request and listen for event, timed to measure the throughput
+        $.parallel = $.resumableObj.uploadingChunks() + 1;
+        $.sentAt = Date.now();
         $.xhr = new XMLHttpRequest();
 
         // Progress
@@ -705,7 +742,7 @@
           var status = $.status();
           if(status=='success'||status=='error') {
             $.callback(status, $.message());
-            $.resumableObj.uploadNextChunk();
+            $.resumableObj.chunkDone($);
           } else {
             $.callback('retry', $.message());
             $.abort();
@@ -726,7 +763,8 @@
         // Set up the basic query data from Resumable
         var query = [
           ['chunkNumberParameterName', $.offset + 1],
-          ['chunkSizeParameterName', $.getOpt('chunkSize')],
+          ['chunkSizeParameterName', $.getOpt('adaptiveChunkSize') ? $.endByte - $.startByte : $.getOpt('chunkSize')],
+          ['chunkOffsetParameterName', $.startByte],
           ['currentChunkSizeParameterName', $.endByte - $.startByte],
           ['totalSizeParameterName', $.fileObjSize],
           ['typeParameterName', $.fileObjType],
@@ -859,6 +897,55 @@
       return(this);
     }
 
+    // ADAPTIVE CHUNK SIZE AND PARALLELISM
+    $.chunkSize = $.getOpt('chunkSize');
+    $.simultaneousUploads = $.getOpt('simultaneousUploads');
+    $.bestThroughput = 0;
+    $.uploadingChunks = function(){
+      var count = 0;
+      $h.each($.files, function(file){
+        $h.each(file.chunks, function(chunk){
+          if(chunk.status()=='uploading') count++;
+        });
+      });
+      return(count);
+    };
+    $.adapt = function(chunk){
+      // Chunk size: what the connection uploads in about targetChunkSeconds, smoothed.
+      // Parallelism: one more chunk while the total throughput grows, one less when it drops,
+      // never above maxSimultaneousUploads nor the server's concurrency header.
+      var maxParallel = $.getOpt('maxSimultaneousUploads');
+      var header = $.getOpt('concurrencyHeader');
+      var hint = (header && chunk.xhr) ? parseInt(chunk.xhr.getResponseHeader(header), 10) : NaN;
+      if(hint > 0) maxParallel = Math.min(maxParallel, hint);
+      if(chunk.sentAt && chunk.status()=='success') {
+        var seconds = Math.max(((new Date).getTime() - chunk.sentAt)/1000, 0.001);
+        var throughput = (chunk.endByte - chunk.startByte)/seconds;
+        var size = Math.round(($.chunkSize + throughput*$.getOpt('targetChunkSeconds'))/2);
+        $.chunkSize = Math.min(Math.max(size, $.getOpt('minChunkSize')), $.getOpt('maxChunkSize'));
+        var total = throughput*chunk.parallel;
+        if(total > $.bestThroughput*1.1) {
+          $.bestThroughput = total;
+          $.simultaneousUploads++;
+        } else if(total < $.bestThroughput*0.7) {
+          $.bestThroughput = total;
+          $.simultaneousUploads--;
+        }
+      }
+      $.simultaneousUploads = Math.min(Math.max($.simultaneousUploads, 1), maxParallel);
+    };
+    $.chunkDone = function(chunk){
+      if(!$.getOpt('adaptiveChunkSize')) {
+        $.uploadNextChunk();
+        return;
+      }
+      $.adapt(chunk);
+      // Fill the upload slots left, none if parallelism went down
+      for(var num=$.uploadingChunks(); num<$.simultaneousUploads; num++) {
+        if(!$.uploadNextChunk()) break;
+      }
+    };
+
     // QUEUE
     $.uploadNextChunk = function(){
       var found = false;
@@ -897,6 +984,21 @@
       });
       if(found) return(true);
 
+      // Adaptive mode: cut the next chunk
+      if($.getOpt('adaptiveChunkSize')) {
+        $h.each($.files, function(file){
+          if(file.isPaused()===false) {
+            var chunk = file.nextChunk();
+            if(chunk) {
+              chunk.send();
+              found = true;
+              return(false);
+            }
+          }
+        });
+        if(found) return(true);
+      }
+
       // The are no more outstanding chunks to upload, check is everything is done
       var outstanding = false;
       $h.each($.files, function(file){
@@ -988,7 +1090,8 @@
       if($.isUploading()) return;
       // Kick off the queue
       $.fire('uploadStart');
-      for (var num=1; num<=$.getOpt('simultaneousUploads'); num++) {
+      var slots = $.getOpt('adaptiveChunkSize') ? $.simultaneousUploads : $.getOpt('simultaneousUploads');
+      for (var num=1; num<=slots; num++) {
         $.uploadNextChunk();
       }
     };
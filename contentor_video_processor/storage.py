@@ -1,25 +1,16 @@
 import datetime
 import posixpath
 from django.core.files.storage import get_storage_class
-from django.conf import settings
 from django.utils.encoding import force_str  # Removed force_text
 
+from contentor_video_processor.conf import get_config
+
 
 class ResumableStorage:
     def __init__(self):
-        self.persistent_storage_class_name = getattr(
-            settings, "ADMIN_RESUMABLE_STORAGE", None
-        ) or getattr(
-            settings,
-            "DEFAULT_FILE_STORAGE",
-            "django.core.files.storage.FileSystemStorage",
-        )
-
-        self.chunk_storage_class_name = getattr(
-            settings,
-            "ADMIN_RESUMABLE_CHUNK_STORAGE",
-            "django.core.files.storage.FileSystemStorage",
-        )
+        config = get_config()
+        self.persistent_storage_class_name = config.persistent_storage
+        self.chunk_storage_class_name = config.chunk_storage
 
     def get_chunk_storage(self, *args, **kwargs):
         """
@@ -0,0 +1,47 @@
+import json
+from urllib.parse import urlsplit
+
+from django import template
+
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.storage import ResumableStorage
+
+register = template.Library()
+
+
+def get_storage_origin():
+    """Return the scheme and host videos are served from, for preconnect hints"""
+    storage = ResumableStorage().get_persistent_storage()
+    custom_domain = getattr(storage, "custom_domain", None)
+    if custom_domain:
+        return f"https://{custom_domain}"
+    endpoint_url = getattr(storage, "endpoint_url", None)
+    if endpoint_url:
+        parts = urlsplit(endpoint_url)
+        return f"{parts.scheme}://{parts.netloc}"
+    bucket_name = getattr(storage, "bucket_name", None)
+    if bucket_name:
+        return f"https://{bucket_name}.s3.amazonaws.com"
+    return ""
+
+
+@register.inclusion_tag("contentor_video_processor/video_player.html", takes_context=True)
+def contentor_video_player(context, video, lazy=False):
+    """
+    Render the video player. With lazy=True only a placeholder is rendered and the player,
+    its signed URL and its available qualities are loaded once it scrolls into view.
+    """
+    resolutions = list(get_config().resolutions)
+    player_context = context.flatten()
+    player_context.update({"video": video, "lazy": lazy})
+
+    if lazy:
+        # Assets shared by all lazy players are only rendered with the first one
+        render_context = context.render_context
+        player_context["include_lazy_assets"] = not render_context.get("contentor_lazy_assets")
+        render_context["contentor_lazy_assets"] = True
+        player_context["qualities_json"] = json.dumps(resolutions)
+        player_context["storage_origin"] = get_storage_origin()
+    else:
+        player_context.setdefault("AVAILABLE_VIDEO_RESOLUTIONS", resolutions)
+    return player_context
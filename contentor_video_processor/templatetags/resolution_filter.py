@@ -1,5 +1,9 @@
 from django import template
 
+from contentor_video_processor.analytics import format_duration
+from contentor_video_processor.renditions import get_rendition_state, get_video_quality_file
+from contentor_video_processor.signed_urls import get_signed_url
+
 register = template.Library()
 
 @register.filter
@@ -9,4 +13,32 @@ def has_resolution(video, resolution):
         return bool(video.video)
     else:
         field_name = f'video_{resolution}'
-        return bool(getattr(video, field_name, None))
\ No newline at end of file
+        return bool(getattr(video, field_name, None))
+
+
+@register.filter
+def signed_url(field_file, quality="original"):
+    """Return the cached signed URL of a video file"""
+    if not field_file:
+        return ""
+    return get_signed_url(field_file, quality)[0]
+
+
+@register.filter
+def quality_url(video, quality):
+    """Return the cached signed URL of a video quality"""
+    if not quality:
+        return ""
+    return signed_url(get_video_quality_file(video, quality), quality)
+
+
+@register.simple_tag
+def rendition_state(video):
+    """Return the qualities of a video that are ready and those still processing"""
+    return get_rendition_state(video)
+
+
+@register.filter
+def latency(value):
+    """Format a duration of the latency analytics, e.g. 42.1s"""
+    return format_duration(value)
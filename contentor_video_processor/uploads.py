@@ -0,0 +1,122 @@
+import contextlib
+
+from django.core.cache import caches
+
+from contentor_video_processor.conf import get_config
+
+ACTIVE_CHUNKS_KEY = "contentor:uploads:active-chunks"
+# Seconds a forgotten count (e.g. of a killed worker) lingers before it expires
+ACTIVE_CHUNKS_TIMEOUT = 10 * 60
+# Response header telling the upload widget how many chunks to send in parallel
+CONCURRENCY_HEADER = "X-Contentor-Upload-Concurrency"
+
+
+def get_load_cache():
+    """
+    Returns the cache counting the chunk requests in progress across processes
+    (CONTENTOR_UPLOAD_LOAD_CACHE), or None when CONTENTOR_UPLOAD_CAPACITY isn't set.
+    """
+    config = get_config()
+    if not config.upload_capacity or not config.upload_load_cache:
+        return None
+    return caches[config.upload_load_cache]
+
+
+def get_active_chunks():
+    cache = get_load_cache()
+    if cache is None:
+        return 0
+    return max(cache.get(ACTIVE_CHUNKS_KEY) or 0, 0)
+
+
+async def aget_active_chunks():
+    cache = get_load_cache()
+    if cache is None:
+        return 0
+    return max(await cache.aget(ACTIVE_CHUNKS_KEY) or 0, 0)
+
+
+@contextlib.contextmanager
+def track_chunk_request():
+    """
+    Counts a chunk request as in progress while the block runs, to measure the upload load.
+    """
+    cache = get_load_cache()
+    if cache is None:
+        yield
+        return
+
+    try:
+        cache.add(ACTIVE_CHUNKS_KEY, 0, ACTIVE_CHUNKS_TIMEOUT)
+        cache.incr(ACTIVE_CHUNKS_KEY)
+        counted = True
+    except ValueError:
+        # Expired in between, the request goes uncounted
+        counted = False
+    try:
+        yield
+    finally:
+        if counted:
+            try:
+                cache.decr(ACTIVE_CHUNKS_KEY)
+            except ValueError:
+                pass
+
+
+@contextlib.asynccontextmanager
+async def atrack_chunk_request():
+    """
+    Async version of `track_chunk_request`.
+    """
+    cache = get_load_cache()
+    if cache is None:
+        yield
+        return
+
+    try:
+        await cache.aadd(ACTIVE_CHUNKS_KEY, 0, ACTIVE_CHUNKS_TIMEOUT)
+        await cache.aincr(ACTIVE_CHUNKS_KEY)
+        counted = True
+    except ValueError:
+        counted = False
+    try:
+        yield
+    finally:
+        if counted:
+            try:
+                await cache.adecr(ACTIVE_CHUNKS_KEY)
+            except ValueError:
+                pass
+
+
+def get_recommended_concurrency(active_chunks=None):
+    """
+    Chunks each client should send in parallel: CONTENTOR_UPLOAD_MAX_SIMULTANEOUS while the
+    servers are idle, down to 1 as the chunk requests in progress reach CONTENTOR_UPLOAD_CAPACITY.
+    """
+    config = get_config()
+    if not config.upload_capacity:
+        return config.max_simultaneous_uploads
+    if active_chunks is None:
+        active_chunks = get_active_chunks()
+    free = max(1 - active_chunks / config.upload_capacity, 0)
+    return max(1, min(config.max_simultaneous_uploads, round(config.max_simultaneous_uploads * free)))
+
+
+def get_upload_limits():
+    """
+    The limits and current load advertised to the upload widget, which adjusts its chunk size and
+    parallelism within them.
+    """
+    config = get_config()
+    active_chunks = get_active_chunks()
+    return {
+        "adaptive": config.adaptive_uploads,
+        "chunk_size": config.chunk_size_bytes,
+        "min_chunk_size": config.min_chunk_size,
+        "max_chunk_size": config.max_chunk_size,
+        "simultaneous_uploads": config.simultaneous_uploads,
+        "max_simultaneous_uploads": config.max_simultaneous_uploads,
+        "recommended_simultaneous_uploads": get_recommended_concurrency(active_chunks),
+        "load": {"active_chunks": active_chunks, "capacity": config.upload_capacity},
+    }
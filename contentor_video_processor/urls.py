@@ -1,14 +1,26 @@
 from django.urls import re_path, path  # Use re_path for regex-based URLs
 from . import views
-from .views import get_video_signed_url, webhook_receiver
+from .views import get_video_signed_url, get_video_signed_urls, webhook_batch_receiver, webhook_receiver
 
 urlpatterns = [
     re_path(r"^upload/$", views.contentor_video, name="contentor_video_processor"),
     re_path(r"^file-exists/$", views.contentor_file_exists, name='contentor_file_exists'),
+    path("upload/config/", views.upload_config_view, name="contentor_upload_config"),
     path(
         "videos/<int:video_id>/signed-url/<str:quality>/",
         get_video_signed_url,
         name="video_signed_url",
     ),
+    path("videos/<int:video_id>/renditions/", views.get_video_renditions, name="video_renditions"),
+    path("videos/<int:video_id>/media/<str:quality>/", views.get_video_media, name="video_media"),
+    path("videos/<int:video_id>/manifest.m3u8", views.get_video_manifest, name="video_manifest"),
+    path(
+        "videos/<int:video_id>/manifest/<str:quality>.m3u8",
+        views.get_video_media_playlist,
+        name="video_media_playlist",
+    ),
+    path("videos/signed-urls/", get_video_signed_urls, name="video_signed_urls"),
     path("video-processing/webhook/", webhook_receiver, name="webhook_receiver"),
+    path("video-processing/webhook/batch/", webhook_batch_receiver, name="webhook_batch_receiver"),
+    path("metrics/", views.metrics_view, name="contentor_metrics"),
 ]
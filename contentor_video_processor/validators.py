@@ -11,6 +11,9 @@ class StorageFileValidator:
     Files uploaded using the library are passed to the application with their names only.
     Any validation must happen either on the client-side or requires upload to be completed
     and file saved in application storage.
+
+    The extension and size rules are also checked against the name and the declared total size
+    of a resumable upload before its chunks are stored, see `validate_upload`.
     """
 
     messages = {
@@ -40,7 +43,7 @@ class StorageFileValidator:
             message = self.messages["extension"].format(
                 extension=ext, allowed_extensions=", ".join(self.allowed_extensions)
             )
-            raise ValidationError(message)
+            raise ValidationError(message, code="extension")
 
     def validate_exists(self, value, storage):
         if not storage.exists(value):
@@ -48,17 +51,26 @@ class StorageFileValidator:
             raise ValidationError(message)
 
     def validate_size(self, value, storage):
-        size = storage.size(value)
+        self.check_size(value, storage.size(value))
+
+    def check_size(self, name, size):
         if self.max_size is not None and size > self.max_size:
             message = self.messages["max_size"].format(
-                name=value, size=size, max_size=self.max_size
+                name=name, size=size, max_size=self.max_size
             )
-            raise ValidationError(message)
+            raise ValidationError(message, code="max_size")
         if size < self.min_size:
             message = self.messages["min_size"].format(
-                name=value, size=size, min_size=self.min_size
+                name=name, size=size, min_size=self.min_size
             )
-            raise ValidationError(message)
+            raise ValidationError(message, code="min_size")
+
+    def validate_upload(self, name, size):
+        """
+        Checks an upload by its name and declared size, without touching storage.
+        """
+        self.validate_extension(name)
+        self.check_size(name, size)
 
     def __call__(self, value):
         assert isinstance(value, str)  # Updated for Python 3
@@ -66,3 +78,39 @@ class StorageFileValidator:
         self.validate_exists(value, storage)
         self.validate_extension(value)
         self.validate_size(value, storage)
+
+
+# Byte patterns at a known offset that identify the containers video uploads come in
+MP4_BOX_TYPES = (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot")
+TS_PACKET_SIZE = 188
+# Blu-ray/AVCHD transport streams (.m2ts, .mts) prefix each packet with a 4 byte timecode
+M2TS_PACKET_SIZE = 192
+ASF_HEADER_GUID = b"\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c"
+SNIFF_SIZE = 2 * M2TS_PACKET_SIZE + 5
+
+
+def sniff_video_container(head):
+    """
+    Identifies the container of a video file from its first bytes (SNIFF_SIZE are enough).
+    Returns "mp4", "matroska", "avi", "mpegts", "m2ts", "mpegps", "flv", "ogg", "asf" or None
+    when none of them match.
+    """
+    if head[4:8] in MP4_BOX_TYPES:
+        return "mp4"  # MP4, MOV, 3GP and other ISO base media files
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "matroska"  # MKV and WebM
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "avi"
+    if head.startswith(b"FLV"):
+        return "flv"
+    if head.startswith(b"\x00\x00\x01\xba"):
+        return "mpegps"
+    if head.startswith(b"OggS"):
+        return "ogg"  # OGG and OGV
+    if head.startswith(ASF_HEADER_GUID):
+        return "asf"  # WMV and ASF
+    if head[:1] == b"G" and all(head[i:i + 1] in (b"G", b"") for i in (TS_PACKET_SIZE, 2 * TS_PACKET_SIZE)):
+        return "mpegts"
+    if head[4:5] == b"G" and all(head[i:i + 1] in (b"G", b"") for i in (4 + M2TS_PACKET_SIZE, 4 + 2 * M2TS_PACKET_SIZE)):
+        return "m2ts"
+    return None
@@ -1,16 +1,85 @@
-from urllib.parse import urlparse
+import hmac
+import json
+import logging
 
-from django.apps import apps
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.contenttypes.models import ContentType
-from django.http import HttpResponse, JsonResponse
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.utils.functional import cached_property
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
 from contentor_video_processor.files import ResumableFile
-from contentor_video_processor.models import VideoProcessingRequest
+from contentor_video_processor.manifests import (
+    HLS_CONTENT_TYPE,
+    build_master_playlist,
+    build_media_playlist,
+    get_rendition_variants,
+)
+from contentor_video_processor.media import has_media_permission, serve_media_file
+from contentor_video_processor.models import get_video_model
+from contentor_video_processor.profiling import profiled
+from contentor_video_processor.renditions import get_rendition_state, get_video_quality_file, pick_quality
+from contentor_video_processor.signed_urls import get_signed_url, get_signed_urls, get_url_etag, get_url_max_age
+from contentor_video_processor.uploads import (
+    CONCURRENCY_HEADER,
+    get_recommended_concurrency,
+    get_upload_limits,
+    track_chunk_request,
+)
+from contentor_video_processor.webhooks import (
+    apply_pending_webhook_events,
+    apply_webhook_events,
+    build_webhook_event,
+    is_webhook_processing_queued,
+    record_webhook_event,
+    record_webhook_events,
+    verify_body_signature,
+    verify_payload_signature,
+)
+
+logger = logging.getLogger(__name__)
+
+# Status of the response rejecting an upload, by the code of the failed validation
+UPLOAD_REJECTION_STATUS = {"max_size": 413, "chunk_size": 413, "extension": 415, "content_type": 415}
+
+
+def reject_upload(error):
+    """
+    Builds the response to an upload that failed validation before being stored.
+    """
+    logger.info("Upload rejected: %s", "; ".join(error.messages))
+    return HttpResponse("; ".join(error.messages), status=UPLOAD_REJECTION_STATUS.get(error.code, 400))
+
+
+def with_upload_concurrency(response, active_chunks=None):
+    """
+    Tells the upload widget how many chunks to send in parallel under the current load.
+    """
+    response[CONCURRENCY_HEADER] = str(get_recommended_concurrency(active_chunks))
+    return response
+
+
+def store_chunk(r, chunk):
+    """
+    Stores the chunk of an upload unless it's already there, and merges the upload once all its
+    chunks are stored. Returns the body of the response: the stored file's name or "chunk uploaded".
+    """
+    if not r.chunk_exists:
+        r.process_chunk(chunk)
+    else:
+        logger.debug("Chunk already exists, skipping: %s", r.current_chunk_name)
+
+    if r.is_complete:
+        return r.collect()
+    return "chunk uploaded"
+
 
 class FileExistsView(View):
     """
@@ -37,15 +106,21 @@ class FileExistsView(View):
             self.model_upload_field, user=request.user, params=request.GET
         )
 
+        # Reject uploads the field won't accept before any chunk is sent
+        try:
+            r.validate_upload()
+        except ValidationError as e:
+            return reject_upload(e)
+
         # Check if file already exists with same size
         if r.file_already_exists():
-            print(f"File already exists with same size, skipping upload: {r.filename}")
+            logger.info("File already exists with same size, skipping upload: %s", r.filename)
             return HttpResponse(r.storage_filename)
 
         # File doesn't exist or has different size - return 200 status with message
         return JsonResponse({"exists": False, "message": "File not found"})
 
-contentor_file_exists = login_required(csrf_exempt(FileExistsView.as_view()))
+contentor_file_exists = profiled(login_required(csrf_exempt(FileExistsView.as_view())))
 
 
 class UploadView(View):
@@ -64,54 +139,58 @@ class UploadView(View):
 
     def post(self, request, *args, **kwargs):
         chunk = request.FILES.get("file")
-
-        # Log request information
-        print(f"Received chunk upload request: File size: {chunk.size if chunk else 'None'}")
-        print(f"Request POST params: {request.POST}")
+        if chunk is None:
+            return HttpResponse("Missing chunk", status=400)
 
         r = ResumableFile(
             self.model_upload_field, user=request.user, params=request.POST
         )
 
-        # Log chunk information
-        print(f"Current chunk: {r.current_chunk_name}")
-        print(f"Is chunk exists: {r.chunk_exists}")
-
-        if not r.chunk_exists:
-            print(f"Processing new chunk: {r.current_chunk_name}")
-            r.process_chunk(chunk)
-        else:
-            print(f"Chunk already exists, skipping: {r.current_chunk_name}")
-
-        # Log completion status
-        print(f"Checking completion: Current size {r.size}, Total size {request.POST.get('resumableTotalSize')}")
-        print(f"Is complete: {r.is_complete}")
-
-        if r.is_complete:
-            print(f"Upload complete, collecting chunks for file: {r.filename}")
-            filename = r.collect()
-            print(f"File saved as: {filename}")
-            return HttpResponse(filename)
+        # Check where the chunk goes, the declared size and name on every chunk and the content of
+        # the first one, before storing anything
+        try:
+            r.validate_chunk(chunk.size)
+            r.validate_upload(chunk if r.chunk_offset == 0 else None)
+        except ValidationError as e:
+            if e.code == "content_type":
+                r.delete_chunks()  # not a video, drop the chunks uploaded alongside the first one
+            return reject_upload(e)
 
-        print(f"Chunk processed, awaiting more chunks for {r.filename}")
-        return HttpResponse("chunk uploaded")
+        with track_chunk_request():
+            response = HttpResponse(store_chunk(r, chunk))
+        return with_upload_concurrency(response)
 
     def get(self, request, *args, **kwargs):
         r = ResumableFile(
             self.model_upload_field, user=request.user, params=request.GET
         )
 
+        try:
+            r.validate_upload()
+        except ValidationError as e:
+            return reject_upload(e)
+
         if not r.chunk_exists:
-            return HttpResponse("chunk not found", status=404)
+            return with_upload_concurrency(HttpResponse("chunk not found", status=404))
         if r.is_complete:
             return HttpResponse(r.collect())
-        return HttpResponse("chunk exists")
+        return with_upload_concurrency(HttpResponse("chunk exists"))
+
 
+contentor_video = profiled(login_required(csrf_exempt(UploadView.as_view())))
 
-contentor_video = login_required(csrf_exempt(UploadView.as_view()))
+
+@login_required
+def upload_config_view(request):
+    """
+    Advertises the upload limits (chunk sizes, parallel chunks) and the current upload load,
+    within which the widget adapts its chunk size and parallelism.
+    """
+    return JsonResponse(get_upload_limits())
 
 
 
+@profiled
 @login_required
 def get_video_signed_url(request, video_id, quality):
     """
@@ -120,7 +199,9 @@ def get_video_signed_url(request, video_id, quality):
         video_id: The ID of the video
         quality: The quality string ('original', '720p', '480p', '360p')
     Returns:
-        A JsonResponse with the signed URL
+        A JsonResponse with the signed URL, cacheable until the URL is about to expire.
+        While the requested quality is still being processed the best quality that is ready
+        is served instead (unless ?fallback=0 is passed), along with the qualities still pending.
     """
     # Only allow GET requests
     if request.method != "GET":
@@ -128,132 +209,378 @@ def get_video_signed_url(request, video_id, quality):
             {"success": False, "message": "Method not allowed"}, status=405
         )
 
-    VideoModel = apps.get_model(*settings.CONTENTOR_VIDEO_MODEL.split('.'))
+    VideoModel = get_video_model()
 
     video = get_object_or_404(VideoModel, id=video_id)
-
-    # Map quality string to the corresponding field
-    quality_field_map = {}
-
-    for res in settings.CONTENTOR_VIDEO_RESOLUTIONS:
-        field_name = "video" if res == "original" else f"video_{res}"
-        quality_field_map[res] = getattr(video, field_name, None)
-
-    # Get the field from the map
-    video_field = quality_field_map.get(quality)
+    state = get_rendition_state(video)
+    served_quality = quality
+    if quality in get_config().qualities and request.GET.get("fallback") != "0":
+        served_quality = pick_quality(state, quality)
+    video_field = get_video_quality_file(video, served_quality) if served_quality else None
 
     if not video_field:
         return JsonResponse(
             {
                 "success": False,
                 "message": f"Video quality {quality} not available for this video",
+                "pending": state["pending"],
             },
             status=404,
         )
 
     try:
-        url = video_field.url
-        return JsonResponse({"success": True, "url": url})
+        url, expires_at = get_signed_url(video_field, served_quality)
     except Exception as e:
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
+    return signed_url_response(request, url, expires_at, served_quality, state)
+
+
+def signed_url_response(request, url, expires_at, quality, state):
+    """
+    Answers a signed URL request, with the caching headers the URL and the rendition state allow.
+    """
+    # The same URL is served until shortly before it expires, let clients cache it until then.
+    # While renditions are pending the answer may change sooner, so it is only cached until the next poll.
+    etag = get_url_etag(url + "|" + ",".join(state["pending"]))
+    max_age = get_url_max_age(expires_at)
+    cache_max_age = max_age
+    if state["pending"]:
+        cache_max_age = min(max_age, get_config().rendition_poll_interval)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(
+            {
+                "success": True,
+                "url": url,
+                "expires_in": max_age,
+                "quality": quality,
+                "pending": state["pending"],
+            }
+        )
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=cache_max_age)
+    return response
+
+
+@login_required
+def get_video_renditions(request, video_id):
+    """
+    Lists the qualities of a video that are ready to play and those still being processed,
+    so players can upgrade as soon as a better rendition completes.
+    Returns
+        {"success": true, "ready": ["720p", "360p"], "pending": ["original"], "best": "720p",
+         "poll_interval": 15}
+    """
+    if request.method != "GET":
+        return JsonResponse(
+            {"success": False, "message": "Method not allowed"}, status=405
+        )
+
+    VideoModel = get_video_model()
+    video = get_object_or_404(VideoModel, id=video_id)
+
+    response = JsonResponse(
+        {
+            "success": True,
+            **get_rendition_state(video),
+            "poll_interval": get_config().rendition_poll_interval,
+        }
+    )
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def get_video_media(request, video_id, quality):
+    """
+    Serve a video quality after checking the viewer's permission, for local storages.
+    The transfer itself is handed to the web server when CONTENTOR_MEDIA_SERVER is set,
+    otherwise byte ranges are served by Django so seeking doesn't download the whole file.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponse("Method not allowed", status=405)
+
+    VideoModel = get_video_model()
+    video = get_object_or_404(VideoModel, id=video_id)
+
+    if not has_media_permission(request, video, quality):
+        return HttpResponse("Forbidden", status=403)
+
+    video_field = get_video_quality_file(video, quality)
+    if not video_field:
+        return HttpResponse(f"Video quality {quality} not available for this video", status=404)
+
+    return serve_media_file(request, video_field)
+
+
+@profiled
+@login_required
+def get_video_manifest(request, video_id):
+    """
+    HLS master playlist of a video, listing its ready renditions that can be streamed
+    (fragmented MP4 with a segment index) so players can switch quality on the fly.
+    Returns 404 when no rendition qualifies; players then keep serving the MP4 files.
+    """
+    if request.method != "GET":
+        return HttpResponse("Method not allowed", status=405)
+
+    VideoModel = get_video_model()
+    video = get_object_or_404(VideoModel, id=video_id)
+
+    variants = get_rendition_variants(video)
+    if not variants:
+        return HttpResponse("No streamable renditions available", status=404)
+
+    playlist = build_master_playlist(
+        variants, lambda quality: reverse("video_media_playlist", args=[video.pk, quality])
+    )
+    response = HttpResponse(playlist, content_type=HLS_CONTENT_TYPE)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@profiled
+@login_required
+def get_video_media_playlist(request, video_id, quality):
+    """
+    HLS media playlist of one rendition: byte ranges of its signed URL, cacheable until the URL
+    is about to expire.
+    """
+    if request.method != "GET":
+        return HttpResponse("Method not allowed", status=405)
+
+    VideoModel = get_video_model()
+    video = get_object_or_404(VideoModel, id=video_id)
+
+    variant = next((v for v in get_rendition_variants(video) if v["quality"] == quality), None)
+    video_field = get_video_quality_file(video, quality) if variant else None
+    if not video_field:
+        return HttpResponse(f"Video quality {quality} not streamable for this video", status=404)
+
+    url, expires_at = get_signed_url(video_field, quality)
+    response = HttpResponse(build_media_playlist(variant, url), content_type=HLS_CONTENT_TYPE)
+    patch_cache_control(response, private=True, max_age=get_url_max_age(expires_at))
+    return response
 
 
+@profiled
 @csrf_exempt
-def webhook_receiver(request):
-    try:
-        import hmac
-        import hashlib
-        import base64
-        import json
+@login_required
+def get_video_signed_urls(request):
+    """
+    Get signed URLs for many videos and qualities at once, e.g. for list and grid pages.
+    Expects a JSON body: {"items": [{"video_id": 1, "quality": "720p"}, ...]}
+    Returns
+        A JsonResponse mapping video ids to qualities:
+        {"urls": {"1": {"720p": {"success": true, "url": ..., "expires_in": ...}}}}
+        Qualities that aren't available are reported per item with "success": false.
+    """
+    if request.method != "POST":
+        return JsonResponse(
+            {"success": False, "message": "Method not allowed"}, status=405
+        )
 
-        # Get the request data
-        data = json.loads(request.body)
-        payload = data.get("data")
-        received_signature = data.get("signature")
+    try:
+        items = json.loads(request.body).get("items")
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({"success": False, "message": "Invalid JSON"}, status=400)
+
+    if not isinstance(items, list):
+        return JsonResponse({"success": False, "message": "Missing items"}, status=400)
+    max_items = get_config().signed_url_batch_max_items
+    if len(items) > max_items:
+        return JsonResponse(
+            {"success": False, "message": f"At most {max_items} items are accepted per request"}, status=413
+        )
 
-        if not payload or not received_signature:
+    pairs = []
+    for item in items:
+        try:
+            pairs.append((int(item["video_id"]), str(item["quality"])))
+        except (KeyError, TypeError, ValueError):
             return JsonResponse(
-                {"status": "error", "message": "Missing data or signature"}, status=400
+                {"success": False, "message": "Each item needs a video_id and a quality"}, status=400
             )
 
-        # For testing, use a hardcoded token
-        token = settings.CONTENTOR_VIDEO_PROCESSING_ACCESS_TOKEN
+    VideoModel = get_video_model()
+    videos = VideoModel.objects.in_bulk({video_id for video_id, _ in pairs})
+
+    urls = {}
+    to_sign = []
+    for video_id, quality in pairs:
+        video = videos.get(video_id)
+        video_field = get_video_quality_file(video, quality) if video else None
+        if video is None:
+            result = {"success": False, "message": "Video not found"}
+        elif not video_field:
+            result = {"success": False, "message": f"Video quality {quality} not available for this video"}
+        else:
+            result = None
+            to_sign.append((video_id, quality, video_field))
+        urls.setdefault(str(video_id), {})[quality] = result
+
+    try:
+        signed = get_signed_urls([(video_field, quality) for _, quality, video_field in to_sign])
+    except Exception as e:
+        return JsonResponse({"success": False, "message": str(e)}, status=500)
+
+    for (video_id, quality, _), (url, expires_at) in zip(to_sign, signed):
+        urls[str(video_id)][quality] = {"success": True, "url": url, "expires_in": get_url_max_age(expires_at)}
+
+    return JsonResponse({"success": True, "urls": urls})
 
-        # Convert payload to JSON string in the same way as the sender
-        payload_json = json.dumps(payload, sort_keys=True)
 
-        # Compute the expected signature
-        expected_signature = hmac.new(
-            key=token.encode("utf-8"),
-            msg=payload_json.encode("utf-8"),
-            digestmod=hashlib.sha256,
-        ).digest()
+@profiled
+@csrf_exempt
+@instrumentation.timed("webhook_seconds", endpoint="single")
+def webhook_receiver(request):
+    """
+    Verifies and records a Contentor webhook, then acknowledges it.
 
-        # Base64 encode for comparison
-        expected_signature_b64 = base64.b64encode(expected_signature).decode("utf-8")
+    Events are stored once per (uuid, timestamp, status), so retried deliveries are acknowledged
+    without being processed twice. Unless CONTENTOR_WEBHOOK_QUEUED is enabled the event is applied
+    right away, otherwise the `contentor_process_webhooks` worker applies it. A retried delivery applies
+    the events of its job that are still pending, e.g. when applying the first delivery failed.
+    """
+    try:
+        payload = read_webhook_payload(request.body)
+        if isinstance(payload, HttpResponse):
+            return payload
 
-        # Verify signatures match using constant-time comparison to prevent timing attacks
-        if not hmac.compare_digest(expected_signature_b64, received_signature):
+        event, created = record_webhook_event(payload)
+        if event is None:
             return JsonResponse(
-                {"status": "error", "message": "Invalid signature"}, status=403
+                {"status": "error", "message": "Missing uuid or status"}, status=400
             )
 
-        # Process the webhook data
-        request_id = payload.get(
-            "uuid"
-        )  # Updated to match the sender's payload structure
-        status = payload.get("status")
-        timestamp = payload.get("timestamp")
-
-        request = VideoProcessingRequest.objects.get(uuid=request_id)
-        if status == "completed":
-            request.video_duration = payload.get("video_duration", 0)
-            request.output_file_size_mb = payload.get("output_file_size_mb", 0)
-            request.metadata = payload.get("metadata", {})
-
-
-        # Log all received data for testing purposes
-        print("Webhook received with payload:", payload)
-        print(f"Request ID: {request_id}")
-        print(f"Status: {status}")
-        print(f"Timestamp: {timestamp}")
-
-        request.status = status
-        request.history[timestamp] = status
-        request.save()
-
-        if status == "completed":
-            video = request.video
-            res = request.resolution
-            parsed_path = urlparse(
-                request.upload_url
-            ).path  # e.g. "/media/videos/720p/clip.mp4"
-            path_parts = parsed_path.split("videos/", 1)
-            relative_path = "videos/" + path_parts[1]  # e.g. "videos/720p/clip.mp4"
-
-            if res == settings.CONTENTOR_VIDEO_PROCESSING_CONFIG.get("original_resolution", "1080p"):
-                setattr(video, "video", relative_path)
-            else:
-                # for others
-                field_name = f"video_{res}"
-                setattr(video, field_name, relative_path)
-            video.save(skip_processing=True)
-        # Return all data for verification purposes
+        if not created:
+            instrumentation.increment("webhook_events", outcome="duplicate")
+            if not is_webhook_processing_queued():
+                # The first delivery may have been recorded but not applied (it failed, or the job
+                # had no uuid yet): apply what's pending for the job
+                apply_pending_webhook_events(uuids={event.uuid}, include_orphaned=True)
+        elif not is_webhook_processing_queued():
+            apply_webhook_events([event])
+
+        return webhook_response(event, created, payload)
+
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
+    except Exception as e:
+        logger.exception("Error handling a webhook")
         return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Webhook processed for request {request_id}",
-                "received_data": payload,
-            }
+            {"status": "error", "message": f"Unexpected error: {str(e)}"}, status=500
         )
 
+
+def read_webhook_payload(body):
+    """
+    Returns the payload of a webhook body once its signature is verified, or the response
+    rejecting it. Raises json.JSONDecodeError for invalid JSON.
+    """
+    data = json.loads(body)
+    payload = data.get("data")
+    received_signature = data.get("signature")
+
+    if not payload or not received_signature:
+        return JsonResponse(
+            {"status": "error", "message": "Missing data or signature"}, status=400
+        )
+
+    if not verify_payload_signature(payload, received_signature):
+        return JsonResponse(
+            {"status": "error", "message": "Invalid signature"}, status=403
+        )
+    return payload
+
+
+def webhook_response(event, created, payload):
+    return JsonResponse(
+        {
+            "status": "success",
+            "message": f"Webhook received for request {event.uuid}",
+            "duplicate": not created,
+            "received_data": payload,
+        }
+    )
+
+
+@profiled
+@csrf_exempt
+@instrumentation.timed("webhook_seconds", endpoint="batch")
+def webhook_batch_receiver(request):
+    """
+    Receives many webhook events in one request: {"events": [payload, ...]}.
+
+    The X-Contentor-Signature header holds the base64 HMAC-SHA256 of the raw body, so the body
+    is verified as received instead of being re-serialized. All events are recorded with one INSERT
+    and, unless CONTENTOR_WEBHOOK_QUEUED is enabled, applied together.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
+
+    if not verify_body_signature(request.body, request.headers.get("X-Contentor-Signature")):
+        return JsonResponse({"status": "error", "message": "Invalid signature"}, status=403)
+
+    try:
+        data = json.loads(request.body)
     except json.JSONDecodeError:
         return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
-    except Exception as e:
-        import traceback
 
-        print(traceback.format_exc())
+    payloads = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(payloads, list) or not payloads:
+        return JsonResponse({"status": "error", "message": "Missing events"}, status=400)
+
+    max_events = get_config().webhook_batch_max_events
+    if len(payloads) > max_events:
+        return JsonResponse(
+            {"status": "error", "message": f"At most {max_events} events are accepted per batch"}, status=413
+        )
+
+    events = [build_webhook_event(payload) if isinstance(payload, dict) else None for payload in payloads]
+    invalid = [index for index, event in enumerate(events) if event is None]
+    if invalid:
+        return JsonResponse(
+            {"status": "error", "message": "Events without uuid or status", "invalid": invalid}, status=400
+        )
+
+    try:
+        record_webhook_events(events)
+        outcomes = {}
+        if not is_webhook_processing_queued():
+            uuids = {event.uuid for event in events}
+            outcomes = apply_pending_webhook_events(batch_size=len(events), uuids=uuids, include_orphaned=True)
+    except Exception as e:
+        logger.exception("Error handling a webhook batch")
         return JsonResponse(
             {"status": "error", "message": f"Unexpected error: {str(e)}"}, status=500
-        )
\ No newline at end of file
+        )
+
+    return JsonResponse({"status": "success", "received": len(events), "outcomes": outcomes})
+
+
+def metrics_view(request):
+    """
+    Serves the metrics collected by PrometheusInstrumentation in the Prometheus text format.
+
+    Scrapers authenticate with `Authorization: Bearer <CONTENTOR_METRICS_TOKEN>`; without a token
+    configured only staff users can read the metrics.
+    """
+    token = get_config().metrics_token
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("Forbidden", status=403)
+    elif not request.user.is_staff:
+        return HttpResponse("Forbidden", status=403)
+
+    exporters = [
+        hook for hook in instrumentation.get_instrumentation()
+        if isinstance(hook, instrumentation.PrometheusInstrumentation)
+    ]
+    if not exporters:
+        return HttpResponse("Metrics are disabled", status=404)
+    return HttpResponse(
+        "".join(exporter.render() for exporter in exporters), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,359 @@
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import uuid
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from contentor_video_processor import instrumentation
+from contentor_video_processor.conf import get_config
+from contentor_video_processor.functions import get_rendition_field_name, get_rendition_relative_path
+from contentor_video_processor.manifests import invalidate_manifests
+from contentor_video_processor.models import (
+    get_video_processing_event_model,
+    get_video_processing_request_model,
+    get_video_processing_webhook_event_model,
+)
+
+
+def compute_signature(message, token=None):
+    """
+    Returns the base64 encoded HMAC-SHA256 of `message` (str or bytes)
+    signed with the Contentor access token.
+    """
+    if token is None:
+        token = get_config().access_token
+    if isinstance(message, str):
+        message = message.encode("utf-8")
+    digest = hmac.new(key=token.encode("utf-8"), msg=message, digestmod=hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def verify_payload_signature(payload, signature):
+    """
+    Verifies a single event signature. Contentor signs the payload serialized with sorted keys.
+    """
+    payload_json = json.dumps(payload, sort_keys=True)
+    # Constant-time comparison to prevent timing attacks
+    return hmac.compare_digest(compute_signature(payload_json), signature)
+
+
+def verify_body_signature(body, signature):
+    """
+    Verifies a signature computed over the raw request body bytes, as used by the batch endpoint.
+    """
+    if not signature:
+        return False
+    return hmac.compare_digest(compute_signature(body), signature)
+
+
+def sign_webhook_payload(payload, token=None):
+    """
+    Builds a signed single-event webhook body, the way Contentor sends it.
+    Useful to exercise `webhook_receiver` locally or in load tests.
+    """
+    signature = compute_signature(json.dumps(payload, sort_keys=True), token=token)
+    return json.dumps({"data": payload, "signature": signature}).encode("utf-8")
+
+
+def sign_webhook_batch(payloads, token=None):
+    """
+    Builds a signed body for `webhook_batch_receiver`.
+    Returns a tuple of (body bytes, signature) where the signature goes in the
+    X-Contentor-Signature header.
+    """
+    body = json.dumps({"events": list(payloads)}).encode("utf-8")
+    return body, compute_signature(body, token=token)
+
+
+def parse_event_timestamp(value):
+    """
+    Converts a webhook timestamp (epoch seconds or ISO 8601 string) to an aware datetime.
+    Returns None when the value can't be interpreted.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return datetime.datetime.fromtimestamp(float(value), tz=datetime.timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def build_webhook_event(payload):
+    """
+    Builds an unsaved webhook event from a payload.
+    Returns None if the payload doesn't identify a job and a status.
+    """
+    try:
+        job_uuid = uuid.UUID(str(payload.get("uuid")))
+    except ValueError:
+        return None
+    status = payload.get("status")
+    if not status:
+        return None
+
+    timestamp = payload.get("timestamp")
+    event_model = get_video_processing_webhook_event_model()
+    return event_model(
+        uuid=job_uuid,
+        status=status,
+        timestamp="" if timestamp is None else str(timestamp),
+        occurred_at=parse_event_timestamp(timestamp),
+        payload=payload,
+    )
+
+
+def record_webhook_event(payload):
+    """
+    Stores a webhook payload once per (uuid, timestamp, status).
+    Returns a tuple of (event, created); event is None for payloads that can't be recorded.
+    """
+    event = build_webhook_event(payload)
+    if event is None:
+        return None, False
+
+    try:
+        with transaction.atomic():
+            event.save()
+    except IntegrityError:
+        # Retried delivery of an event we already have
+        return event, False
+    return event, True
+
+
+async def arecord_webhook_event(payload):
+    """
+    Async version of `record_webhook_event`. Async views never run in a transaction
+    (ATOMIC_REQUESTS doesn't apply to them), so a duplicate is detected without a savepoint.
+    """
+    event = build_webhook_event(payload)
+    if event is None:
+        return None, False
+
+    try:
+        await event.asave()
+    except IntegrityError:
+        # Retried delivery of an event we already have
+        return event, False
+    return event, True
+
+
+def record_webhook_events(events):
+    """
+    Stores many unsaved webhook events with a single INSERT, skipping deliveries that are already stored.
+    """
+    event_model = get_video_processing_webhook_event_model()
+    event_model.objects.bulk_create(events, ignore_conflicts=True)
+
+
+def is_webhook_processing_queued():
+    """
+    When CONTENTOR_WEBHOOK_QUEUED is enabled events are only recorded by the endpoint
+    and applied by the `contentor_process_webhooks` worker.
+    """
+    return get_config().webhook_queued
+
+
+def update_video_renditions(processing_requests):
+    """
+    Points the videos' rendition fields to the files produced by completed requests.
+    Written with one bulk UPDATE per rendition field, so video rows aren't fetched and no processing is triggered.
+    """
+    videos_by_field = {}
+    for processing_request in processing_requests:
+        video_model = processing_request._meta.get_field("video").related_model
+        field_name = get_rendition_field_name(processing_request.resolution)
+        try:
+            video_model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            continue
+
+        relative_path = get_rendition_relative_path(processing_request.upload_url)
+        if not relative_path:
+            continue
+        video = video_model(pk=processing_request.video_id, **{field_name: relative_path})
+        videos_by_field.setdefault((video_model, field_name), []).append(video)
+
+    for (video_model, field_name), videos in videos_by_field.items():
+        video_model.objects.bulk_update(videos, [field_name])
+
+
+def apply_webhook_event(processing_request, event):
+    """
+    Applies a recorded event to an in-memory processing request.
+    Returns a tuple of (outcome, changed field names); nothing is written to the database.
+
+    Events older than the last applied one, or moving the job backwards in its lifecycle,
+    are ignored as stale.
+    """
+    status_order = processing_request.STATUS_ORDER
+    current_rank = status_order.get(processing_request.status, 1)
+    new_rank = status_order.get(event.status, 1)
+
+    if (
+        processing_request.last_event_at
+        and event.occurred_at
+        and event.occurred_at < processing_request.last_event_at
+    ):
+        return "stale", []
+    if new_rank < current_rank:
+        return "stale", []
+    if current_rank == max(status_order.values()) and event.status != processing_request.status:
+        # Completed and failed jobs are final
+        return "stale", []
+
+    payload = event.payload
+    changed_fields = ["status"]
+    if event.status == "completed":
+        processing_request.video_duration = payload.get("video_duration", 0)
+        processing_request.output_file_size_mb = payload.get("output_file_size_mb", 0)
+        processing_request.metadata = payload.get("metadata", {})
+        changed_fields += ["video_duration", "output_file_size_mb", "metadata"]
+    if event.occurred_at:
+        processing_request.last_event_at = event.occurred_at
+        changed_fields.append("last_event_at")
+    transition_field = processing_request.TRANSITION_FIELDS.get(event.status)
+    if transition_field and getattr(processing_request, transition_field) is None:
+        # Senders without timestamps are timed by when the event was received
+        setattr(processing_request, transition_field, event.occurred_at or event.received_at or timezone.now())
+        changed_fields.append(transition_field)
+
+    processing_request.status = event.status
+    return "applied", changed_fields
+
+
+def _event_sort_key(event):
+    occurred_at = event.occurred_at or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+    return occurred_at, event.pk or 0
+
+
+def apply_webhook_events(events):
+    """
+    Applies the given events and marks them as processed. Returns a dict of outcome counts.
+    Events of jobs whose uuid isn't saved yet are marked as orphaned but left unprocessed,
+    see `apply_orphaned_events`.
+
+    The affected processing requests are locked and loaded with one query, applied events are
+    appended to the processing event table in bulk and only the fields that changed are written,
+    with bulk updates, so concurrent deliveries for one job can't overwrite each other.
+    """
+    request_model = get_video_processing_request_model()
+    processing_event_model = get_video_processing_event_model()
+    webhook_event_model = get_video_processing_webhook_event_model()
+
+    events = sorted(events, key=_event_sort_key)
+    ids_by_outcome = {}
+
+    with transaction.atomic():
+        requests_by_uuid = {
+            processing_request.uuid: processing_request
+            for processing_request in request_model.objects.select_for_update().filter(
+                uuid__in={event.uuid for event in events}
+            )
+        }
+
+        changed_fields_by_request = {}
+        processing_events = []
+        for event in events:
+            processing_request = requests_by_uuid.get(event.uuid)
+            if processing_request is None:
+                outcome = "orphaned"
+            else:
+                outcome, changed_fields = apply_webhook_event(processing_request, event)
+                if outcome == "applied":
+                    changed_fields_by_request.setdefault(processing_request, set()).update(changed_fields)
+                    processing_events.append(
+                        processing_event_model(
+                            request=processing_request,
+                            status=event.status,
+                            timestamp=event.timestamp,
+                            occurred_at=event.occurred_at,
+                        )
+                    )
+            event.outcome = outcome
+            ids_by_outcome.setdefault(outcome, []).append(event.pk)
+
+        processing_event_model.objects.bulk_create(processing_events)
+
+        now = timezone.now()
+        requests_by_fields = {}
+        for processing_request, changed_fields in changed_fields_by_request.items():
+            processing_request.updated_at = now
+            requests_by_fields.setdefault(frozenset(changed_fields), []).append(processing_request)
+        for changed_fields, processing_requests in requests_by_fields.items():
+            request_model.objects.bulk_update(processing_requests, [*changed_fields, "updated_at"])
+
+        completed_requests = [
+            processing_request
+            for processing_request in changed_fields_by_request
+            if processing_request.status == "completed"
+        ]
+        update_video_renditions(completed_requests)
+        invalidate_manifests({processing_request.video_id for processing_request in completed_requests})
+
+        for outcome, ids in ids_by_outcome.items():
+            processed_at = None if outcome == "orphaned" else now
+            webhook_event_model.objects.filter(pk__in=ids).update(outcome=outcome, processed_at=processed_at)
+            instrumentation.increment("webhook_events", len(ids), outcome=outcome)
+
+    return {outcome: len(ids) for outcome, ids in ids_by_outcome.items()}
+
+
+def apply_pending_webhook_events(batch_size=100, uuids=None, include_orphaned=False):
+    """
+    Applies up to `batch_size` recorded events that haven't been processed yet,
+    optionally only those of the jobs in `uuids`. Orphaned events are skipped unless
+    `include_orphaned`, so they don't hold up the queue while their job has no uuid.
+    Rows are locked while they are applied so several workers can run side by side.
+    """
+    event_model = get_video_processing_webhook_event_model()
+
+    with transaction.atomic():
+        queryset = event_model.objects.filter(processed_at__isnull=True).order_by("id")
+        if uuids is not None:
+            queryset = queryset.filter(uuid__in=uuids)
+        if not include_orphaned:
+            queryset = queryset.exclude(outcome="orphaned")
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        events = list(queryset[:batch_size])
+        if not events:
+            return {}
+        return apply_webhook_events(events)
+
+
+def apply_orphaned_events(batch_size=100, uuids=None):
+    """
+    Applies the orphaned events whose job now has its uuid saved, e.g. webhooks that arrived while
+    the job was being submitted. Optionally only those of the jobs in `uuids`.
+    """
+    request_model = get_video_processing_request_model()
+    submitted = request_model.objects.filter(uuid__isnull=False)
+    if uuids is not None:
+        submitted = submitted.filter(uuid__in=uuids)
+    event_model = get_video_processing_webhook_event_model()
+
+    with transaction.atomic():
+        queryset = (
+            event_model.objects
+            .filter(processed_at__isnull=True, outcome="orphaned", uuid__in=submitted.values("uuid"))
+            .order_by("id")
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        events = list(queryset[:batch_size])
+        if not events:
+            return {}
+        return apply_webhook_events(events)
@@ -1,4 +1,3 @@
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db.models.fields.files import FieldFile
 from django.forms import FileInput, CheckboxInput, forms
@@ -7,7 +6,9 @@ from django.templatetags.static import static
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy
 
+from contentor_video_processor.conf import get_config
 from contentor_video_processor.storage import ResumableStorage
+from contentor_video_processor.uploads import CONCURRENCY_HEADER, get_upload_limits
 
 
 class ResumableBaseWidget(FileInput):
@@ -28,9 +29,11 @@ class ResumableBaseWidget(FileInput):
             file_name = ""
             file_url = ""
 
-        chunk_size = getattr(settings, "ADMIN_RESUMABLE_CHUNKSIZE", "1*1024*1024")
-        show_thumb = getattr(settings, "ADMIN_RESUMABLE_SHOW_THUMB", False)
-        simultaneous_uploads = getattr(settings, "ADMIN_SIMULTANEOUS_UPLOADS", 1)
+        config = get_config()
+        chunk_size = config.chunk_size
+        show_thumb = config.show_thumb
+        simultaneous_uploads = config.simultaneous_uploads
+        upload_limits = get_upload_limits()
 
         content_type_id = ContentType.objects.get_for_model(self.attrs["model"]).id
 
@@ -44,7 +47,9 @@ class ResumableBaseWidget(FileInput):
             "content_type_id": content_type_id,
             "file_url": file_url,
             "file_name": file_name,
-            "simultaneous_uploads": simultaneous_uploads,
+            "simultaneous_uploads": min(simultaneous_uploads, upload_limits["recommended_simultaneous_uploads"]),
+            "upload_limits": upload_limits,
+            "concurrency_header": CONCURRENCY_HEADER,
         }
 
         if not self.is_required:
@@ -0,0 +1,13 @@
+"""
+The tests run against the benchmark project (benchmarks/benchapp), on FileSystemStorage and SQLite.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+
+def pytest_configure(config):
+    import harness
+
+    harness.setup_django("fs")
@@ -0,0 +1,88 @@
+import io
+
+import harness
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+
+from contentor_video_processor.files import ChunkRangeReader
+from contentor_video_processor.mp4 import READ_AHEAD, copy_range, probe
+
+
+class RemoteStorage(Storage):
+    """
+    A storage without local paths, whose files are only read through `open`, counted.
+    """
+
+    def __init__(self, location):
+        self.local = FileSystemStorage(location=location)
+        self.opened = []
+
+    def _open(self, name, mode="rb"):
+        self.opened.append(name)
+        return self.local.open(name, mode)
+
+    def _save(self, name, content):
+        return self.local.save(name, content)
+
+    def exists(self, name):
+        return self.local.exists(name)
+
+    def size(self, name):
+        return self.local.size(name)
+
+
+def store_chunks(storage, data, chunk_size):
+    layout = []
+    for offset in range(0, len(data), chunk_size):
+        chunk = data[offset:offset + chunk_size]
+        layout.append((offset, storage.save("upload_part_%012d" % offset, ContentFile(chunk)), len(chunk)))
+    return layout
+
+
+def test_streaming_opens_each_chunk_once(tmp_path):
+    storage = RemoteStorage(location=str(tmp_path))
+    data = bytes(i % 251 for i in range(10 * READ_AHEAD + 123))
+    layout = store_chunks(storage, data, 4 * READ_AHEAD)
+
+    reader = ChunkRangeReader(storage, layout)
+    out = io.BytesIO()
+    try:
+        copy_range(reader, out, 0, len(data), buffer_size=READ_AHEAD)
+    finally:
+        reader.close()
+
+    assert out.getvalue() == data
+    assert storage.opened == [name for _, name, _ in layout]
+
+
+def test_probe_reads_s3_chunks_by_range(tmp_path, monkeypatch):
+    S3Storage = pytest.importorskip("storages.backends.s3").S3Storage
+
+    path = tmp_path / "source.mp4"
+    harness.write_mp4(str(path), 4 * 1024 * 1024)
+    data = path.read_bytes()
+    chunk_size = 1024 * 1024
+    objects = {
+        "upload_part_%012d" % offset: data[offset:offset + chunk_size] for offset in range(0, len(data), chunk_size)
+    }
+    layout = [(int(name[-12:]), name, len(chunk)) for name, chunk in sorted(objects.items())]
+
+    storage = S3Storage(bucket_name="chunks", access_key="key", secret_key="secret", region_name="us-east-1")
+    downloaded = []
+
+    def get_object(Bucket, Key, Range):
+        start, end = map(int, Range[len("bytes="):].split("-"))
+        downloaded.append(end + 1 - start)
+        return {"Body": io.BytesIO(objects[Key][start:end + 1])}
+
+    monkeypatch.setattr(storage.connection.meta.client, "get_object", get_object)
+
+    reader = ChunkRangeReader(storage, layout)
+    try:
+        metadata = probe(reader)
+    finally:
+        reader.close()
+
+    assert (metadata["width"], metadata["height"]) == (1920, 1080)
+    assert sum(downloaded) < chunk_size
@@ -0,0 +1,102 @@
+import io
+import struct
+
+import harness
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.test import RequestFactory
+
+from benchapp.models import Video
+from contentor_video_processor import views
+from contentor_video_processor.mp4 import FileRangeReader, MP4Error, read_segment_index
+
+TIMESCALE = 1000
+FRAGMENT_DURATIONS = [4000, 4000, 2500]
+
+
+class User(AnonymousUser):
+    is_authenticated = True
+
+
+def box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def full_box(box_type, payload, version=0):
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+
+def fragmented_mp4(width=1280, height=720):
+    """
+    A fragmented MP4 laid out like DASH on-demand / HLS fMP4 renditions: ftyp and moov (with mvex),
+    a sidx indexing every fragment, then the moof + mdat fragments.
+    Returns the file and the (offset, size) of each fragment.
+    """
+    ftyp = box(b"ftyp", b"iso6" + struct.pack(">I", 0) + b"iso6dashavc1")
+    matrix = struct.pack(">9i", 65536, 0, 0, 0, 65536, 0, 0, 0, 1 << 30)
+    tkhd = full_box(b"tkhd", struct.pack(">IIIII", 0, 0, 1, 0, 0) + b"\0" * 16 + matrix + struct.pack(">II", width << 16, height << 16))
+    mdhd = full_box(b"mdhd", struct.pack(">IIII", 0, 0, TIMESCALE, 0) + b"\0" * 4)
+    hdlr = full_box(b"hdlr", b"\0" * 4 + b"vide" + b"\0" * 12 + b"test\0")
+    trak = box(b"trak", tkhd + box(b"mdia", mdhd + hdlr + box(b"minf", box(b"stbl", b""))))
+    mvex = box(b"mvex", full_box(b"trex", struct.pack(">IIIII", 1, 1, 0, 0, 0)))
+    moov = box(b"moov", full_box(b"mvhd", struct.pack(">IIII", 0, 0, TIMESCALE, 0) + b"\0" * 80) + trak + mvex)
+
+    fragments = [
+        box(b"moof", full_box(b"mfhd", struct.pack(">I", number + 1))) + box(b"mdat", bytes([number]) * (1000 * (number + 1)))
+        for number in range(len(FRAGMENT_DURATIONS))
+    ]
+    references = b"".join(
+        struct.pack(">III", len(fragment), duration, 0x90000000) for fragment, duration in zip(fragments, FRAGMENT_DURATIONS)
+    )
+    sidx = full_box(b"sidx", struct.pack(">IIIIHH", 1, TIMESCALE, 0, 0, 0, len(fragments)) + references)
+
+    data = ftyp + moov + sidx
+    layout = []
+    for fragment in fragments:
+        layout.append((len(data), len(fragment)))
+        data += fragment
+    return data, layout
+
+
+def test_reads_segment_index():
+    data, layout = fragmented_mp4()
+    index = read_segment_index(FileRangeReader(io.BytesIO(data), size=len(data)))
+    assert index["init_size"] == data.index(b"sidx") - 4
+    assert [(offset, size) for offset, size, _ in index["segments"]] == layout
+    assert [duration for _, _, duration in index["segments"]] == [d / TIMESCALE for d in FRAGMENT_DURATIONS]
+    assert (index["width"], index["height"]) == (1280, 720)
+
+
+def test_progressive_mp4_has_no_segment_index(tmp_path):
+    harness.write_mp4(tmp_path / "progressive.mp4", 256 * 1024, faststart=True)
+    with open(tmp_path / "progressive.mp4", "rb") as f, pytest.raises(MP4Error):
+        read_segment_index(FileRangeReader(f))
+
+
+def test_manifest_serves_byte_ranges_of_fragmented_renditions(tmp_path):
+    data, layout = fragmented_mp4()
+    video = Video.objects.create(title="streamable")
+    video.video_720p.save("streamable_720p.mp4", ContentFile(data), save=False)
+    harness.write_mp4(tmp_path / "progressive.mp4", 256 * 1024, faststart=True)
+    video.video_360p.save("progressive_360p.mp4", ContentFile((tmp_path / "progressive.mp4").read_bytes()), save=False)
+    Video.objects.filter(pk=video.pk).update(video_720p=video.video_720p.name, video_360p=video.video_360p.name)
+
+    request = RequestFactory().get("/")
+    request.user = User()
+    master = views.get_video_manifest(request, video.pk)
+    assert master.status_code == 200
+    assert master["Content-Type"] == "application/vnd.apple.mpegurl"
+    playlists = [line for line in master.content.decode().splitlines() if not line.startswith("#")]
+    # The progressive rendition isn't listed
+    assert playlists == [f"/contentor/videos/{video.pk}/manifest/720p.m3u8"]
+    assert "RESOLUTION=1280x720" in master.content.decode()
+
+    lines = views.get_video_media_playlist(request, video.pk, "720p").content.decode().splitlines()
+    init_size = data.index(b"sidx") - 4
+    assert lines[lines.index("#EXT-X-PLAYLIST-TYPE:VOD") + 2].endswith(f'BYTERANGE="{init_size}@0"')
+    assert [line for line in lines if line.startswith("#EXT-X-BYTERANGE")] == [
+        f"#EXT-X-BYTERANGE:{size}@{offset}" for offset, size in layout
+    ]
+    assert lines[-1] == "#EXT-X-ENDLIST"
+    assert views.get_video_media_playlist(request, video.pk, "360p").status_code == 404
@@ -0,0 +1,55 @@
+from django.apps import apps
+from django.db import connection, models
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.operations import AlterField, RenameField
+from django.db.migrations.questioner import MigrationQuestioner
+from django.db.migrations.state import ProjectState
+
+from contentor_video_processor.models import get_video_model, get_video_processing_request_model
+
+
+def detect_history_upgrade():
+    """
+    The operations `makemigrations` generates for the request model when upgrading from the
+    version storing the status history in a `history` JSON field, answering "yes" to renames.
+    """
+    request_model = get_video_processing_request_model()
+    app_label, model_name = request_model._meta.app_label, request_model._meta.model_name
+    to_state = ProjectState.from_apps(apps)
+    from_state = to_state.clone()
+    fields = from_state.models[app_label, model_name].fields
+    del fields["legacy_history"]
+    fields["history"] = models.JSONField(default=dict, blank=True)
+    autodetector = MigrationAutodetector(from_state, to_state, MigrationQuestioner(defaults={"ask_rename": True}))
+    changes = autodetector._detect_changes()
+    return from_state, [operation for migration in changes[app_label] for operation in migration.operations]
+
+
+def test_history_upgrade_is_a_rename():
+    _, operations = detect_history_upgrade()
+    assert {type(operation) for operation in operations} == {AlterField, RenameField}
+    rename = next(operation for operation in operations if isinstance(operation, RenameField))
+    assert (rename.old_name, rename.new_name) == ("history", "legacy_history")
+
+
+def test_history_survives_upgrade():
+    from_state, operations = detect_history_upgrade()
+    request_model = get_video_processing_request_model()
+    video = get_video_model().objects.bulk_create([get_video_model()(title="upgraded")])[0]
+    history = {"2024-01-01T00:00:00+00:00": "processing", "2024-01-01T00:05:00+00:00": "completed"}
+    request = request_model.objects.bulk_create(
+        [request_model(video=video, resolution="720p", status="completed", legacy_history=history)]
+    )[0]
+
+    app_label = request_model._meta.app_label
+    state = from_state
+    with connection.schema_editor() as schema_editor:
+        for operation in operations:
+            new_state = state.clone()
+            operation.state_forwards(app_label, new_state)
+            operation.database_forwards(app_label, schema_editor, state, new_state)
+            state = new_state
+
+    request = request_model.objects.get(pk=request.pk)
+    assert request.legacy_history == history
+    assert request.history == history
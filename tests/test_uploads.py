@@ -0,0 +1,82 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, override_settings
+
+from benchapp.models import Video
+from contentor_video_processor.files import ResumableFile
+from contentor_video_processor.storage import ResumableStorage
+from contentor_video_processor.views import contentor_video
+
+CHUNK_SIZE = 256 * 1024
+
+
+class User(AnonymousUser):
+    is_authenticated = True
+
+
+def widget_params(data, number, filename="legacy.mp4"):
+    """
+    The query resumable.js sends for chunk `number` of fixed-size chunks (its default rounding:
+    the last chunk takes the remainder), with the widget's own field and content type.
+    """
+    total_chunks = max(len(data) // CHUNK_SIZE, 1)
+    start = (number - 1) * CHUNK_SIZE
+    end = len(data) if number == total_chunks else start + CHUNK_SIZE
+    return {
+        "field_name": "video",
+        "content_type_id": str(ContentType.objects.get_for_model(Video).id),
+        "resumableChunkNumber": str(number),
+        "resumableChunkSize": str(CHUNK_SIZE),
+        "resumableChunkOffset": str(start),
+        "resumableCurrentChunkSize": str(end - start),
+        "resumableTotalSize": str(len(data)),
+        "resumableType": "video/mp4",
+        "resumableIdentifier": "%d-legacymp4" % len(data),
+        "resumableFilename": filename,
+        "resumableRelativePath": filename,
+        "resumableTotalChunks": str(total_chunks),
+    }, data[start:end]
+
+
+def send(method, params, chunk=None):
+    factory = RequestFactory()
+    if method == "GET":
+        request = factory.get("/", params)
+    else:
+        request = factory.post("/", dict(params, file=SimpleUploadedFile("blob", chunk)))
+    request.user = User()
+    return contentor_video(request)
+
+
+@override_settings(ADMIN_RESUMABLE_CHUNKSIZE=str(CHUNK_SIZE))
+def test_upload_resumes_numbered_chunks_stored_before_upgrade():
+    data = bytes(i % 251 for i in range(3 * CHUNK_SIZE + 1000))
+
+    # Chunk 1 was stored under its number before chunks were named by offset
+    params, chunk = widget_params(data, 1)
+    r = ResumableFile(Video._meta.get_field("video"), None, params)
+    r.chunk_storage.save(r.get_legacy_chunk_name(1), ContentFile(chunk))
+
+    assert send("GET", params).status_code == 200
+    assert send("GET", widget_params(data, 2)[0]).status_code == 404
+
+    assert send("POST", *widget_params(data, 2)).content == b"chunk uploaded"
+    response = send("POST", *widget_params(data, 3))
+    assert response.status_code == 200
+
+    with ResumableStorage().get_persistent_storage().open(response.content.decode()) as stored:
+        assert stored.read() == data
+    assert r.chunk_names == []
+
+
+@override_settings(ADMIN_RESUMABLE_CHUNKSIZE=str(CHUNK_SIZE), CONTENTOR_ADAPTIVE_UPLOADS=True)
+def test_adaptive_uploads_ignore_numbered_chunks():
+    data = bytes(i % 251 for i in range(3 * CHUNK_SIZE + 1000))
+    params, chunk = widget_params(data, 1, filename="adaptive.mp4")
+    r = ResumableFile(Video._meta.get_field("video"), None, params)
+    name = r.chunk_storage.save(r.get_legacy_chunk_name(1), ContentFile(chunk))
+
+    assert send("GET", params).status_code == 404
+    r.chunk_storage.delete(name)
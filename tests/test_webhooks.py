@@ -0,0 +1,37 @@
+import uuid
+
+from django.test import Client
+from django.urls import reverse
+
+from contentor_video_processor.models import get_video_model, get_video_processing_request_model
+from contentor_video_processor.webhooks import get_video_processing_webhook_event_model, sign_webhook_batch
+
+
+def post_batch(payloads):
+    body, signature = sign_webhook_batch(payloads)
+    return Client().post(
+        reverse("webhook_batch_receiver"), body, content_type="application/json", HTTP_X_CONTENTOR_SIGNATURE=signature
+    )
+
+
+def test_redelivered_batch_applies_orphaned_events():
+    job_uuid = uuid.uuid4()
+    payload = {"uuid": str(job_uuid), "status": "processing", "timestamp": "2024-01-01T00:05:00+00:00"}
+
+    # Delivered before the job is known: kept pending as an orphan
+    assert post_batch([payload]).status_code == 200
+    event = get_video_processing_webhook_event_model().objects.get(uuid=job_uuid)
+    assert (event.outcome, event.processed_at) == ("orphaned", None)
+
+    request_model = get_video_processing_request_model()
+    video = get_video_model().objects.bulk_create([get_video_model()(title="orphaned")])[0]
+    request = request_model.objects.bulk_create(
+        [request_model(video=video, resolution="720p", status="pending", uuid=job_uuid)]
+    )[0]
+
+    response = post_batch([payload])
+    assert response.status_code == 200
+    event.refresh_from_db()
+    assert event.processed_at is not None
+    request.refresh_from_db()
+    assert request.status == "processing"